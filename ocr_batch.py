@@ -0,0 +1,543 @@
+"""无界面的批量OCR字段提取
+
+整个批次只加载一次模型；--workers大于1时每个工作进程各加载一份模型。
+本模块不导入tkinter，可直接作为工作进程或服务的入口。
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import signal
+import sys
+import time
+import traceback
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from dataclasses import replace
+from datetime import datetime
+
+import cv2
+
+from ocr_cache import DEFAULT_CACHE_DIR
+from ocr_cancel import CancelToken, OperationCancelled
+from ocr_det_scale import DET_POLICIES
+from ocr_engine import (DEFAULT_REFINE_THRESHOLD, EngineOptions, ImageReadError, OCREngine, RecognitionBatcher,
+                        read_image_bytes)
+from ocr_export import DEFAULT_FSYNC_EVERY, RecordWriter, TableWriter
+from ocr_prefetch import DEFAULT_PREFETCH_DEPTH, iter_prefetched
+from ocr_progress import CliProgressReporter, ProgressTracker
+from ocr_template import load_template
+from ocr_timing import StageTrace, TimingStats, TraceWriter, dump_profile, enable_profiling
+
+# 批量模式支持的图片扩展名
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+# 合并识别批次时，进程池每个任务包含的图片数
+BATCHED_TASK_IMAGES = 8
+
+# 进程池模式下等待结果时检查取消的间隔（秒）
+CANCEL_POLL_INTERVAL = 0.1
+
+# 命令行批量模式的退出码：全部失败、部分失败（argparse的参数错误已使用2）、被Ctrl+C取消
+EXIT_FAILED = 1
+EXIT_PARTIAL_FAILURE = 3
+EXIT_CANCELLED = 130
+
+# 限制数学库线程数的环境变量，由create_worker_pool在启动工作进程期间设置
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS")
+
+# create_worker_pool启动的工作进程，terminate_pool按进程池查找
+_pool_processes = weakref.WeakKeyDictionary()
+
+
+def _fill_record(engine, record, ocr_result, trace):
+    """根据OCR结果补全记录的状态、文本数和提取结果"""
+    if ocr_result is None:
+        record['status'] = 'empty'
+        record['error'] = "未检测到任何文本"
+        return record
+    record['status'] = 'ok'
+    record['text_count'] = len(ocr_result.texts)
+    scores = ocr_result.scores
+    record['scores'] = {'mean': round(float(sum(scores)) / len(scores), 4) if scores else None,
+                        'min': round(float(min(scores)), 4) if scores else None}
+    extracted = engine.extract(ocr_result, trace)
+    record['scores'].update(extracted.scores_dict())
+    record['extracted_data'] = extracted.to_dict()
+    return record
+
+
+def _fill_error(record, error):
+    record['status'] = 'error'
+    if isinstance(error, ImageReadError):
+        record['error'] = str(error)
+    else:
+        traceback.print_exception(type(error), error, error.__traceback__)
+        record['error'] = f"OCR处理出错: {str(error)}"
+    return record
+
+
+def process_image(engine, image_path, image_bytes=None, trace=None, image=None):
+    """对单张图片执行OCR和字段提取，返回可序列化为JSON的结果记录
+
+    image_bytes为已读取的文件内容（例如HTTP上传的图片），为None时从image_path读取；
+    image为预先解码的数组时不再解码；各阶段耗时记入trace，汇总后写入记录的timings
+    """
+    trace = trace or StageTrace(image_path)
+    record = {'image_path': image_path}
+    try:
+        if image_bytes is None:
+            with trace.stage('read'):
+                image_bytes = read_image_bytes(image_path)
+        if image is not None:
+            ocr_result = engine.recognize(image, image_path, image_bytes, trace)
+        else:
+            ocr_result = engine.recognize_bytes(image_bytes, image_path, trace)
+        _fill_record(engine, record, ocr_result, trace)
+    except Exception as e:
+        _fill_error(record, e)
+    record['timings'] = trace.totals()
+    return record
+
+
+def _prefetched_record(engine, item, trace):
+    if item.error is None:
+        return process_image(engine, item.image_path, item.image_bytes, trace, item.image)
+    record = _fill_error({'image_path': item.image_path}, item.error)
+    record['timings'] = trace.totals()
+    return record
+
+
+def _batched_records(engine, finished):
+    for image_path, ocr_result, error, trace in finished:
+        record = {'image_path': image_path}
+        if error is not None:
+            _fill_error(record, error)
+        else:
+            try:
+                _fill_record(engine, record, ocr_result, trace)
+            except Exception as e:
+                _fill_error(record, e)
+        record['timings'] = trace.totals()
+        yield record, trace
+
+
+def iter_batched_records(engine, image_paths, on_stage=None, cancel=None, prefetch=0):
+    """多张图片的文本行合并后一起识别，按输入顺序产出(记录, trace)，记录格式与process_image相同
+
+    prefetch大于0时在后台预读取并解码后面的图片，见iter_prefetched
+    """
+    batcher = RecognitionBatcher(engine)
+    if prefetch <= 0:
+        for image_path in image_paths:
+            if cancel is not None:
+                cancel.check()
+            trace = StageTrace(image_path, on_stage, cancel)
+            yield from _batched_records(engine, batcher.submit(image_path, trace=trace))
+        yield from _batched_records(engine, batcher.flush())
+        return
+
+    prefetched = iter_prefetched(image_paths, prefetch, should_decode=_needs_decode(engine))
+    try:
+        for item in prefetched:
+            if cancel is not None:
+                cancel.check()
+            trace = StageTrace(item.image_path, on_stage, cancel)
+            item.record_to(trace)
+            finished = batcher.submit(item.image_path, item.image_bytes, trace, item.image, item.error)
+            yield from _batched_records(engine, finished)
+    finally:
+        prefetched.close()
+    yield from _batched_records(engine, batcher.flush())
+
+
+def _needs_decode(engine):
+    """结果已在缓存中的图片不需要解码"""
+    if engine.cache is None:
+        return None
+    return lambda image_bytes: not engine.is_cached(image_bytes)
+
+
+def collect_image_paths(inputs):
+    """将目录、通配符或文件路径展开为排序后的图片列表"""
+    image_paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = [os.path.join(item, name) for name in sorted(os.listdir(item))]
+        elif glob.has_magic(item):
+            candidates = sorted(glob.glob(item, recursive=True))
+        else:
+            candidates = [item]
+
+        for path in candidates:
+            if os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS):
+                image_paths.append(path)
+    return image_paths
+
+
+# 进程池工作进程中的引擎，由init_pool_worker在每个进程中创建一次
+_worker_engine = None
+
+
+def resolve_parallelism(workers=1, cpu_threads=None):
+    """计算进程数和每个进程的Paddle线程数，使两者乘积不超过CPU核数
+
+    workers为0表示根据CPU核数自动选择；单进程且未指定线程数时保持库默认值
+    """
+    cpu_count = os.cpu_count() or 1
+    if workers <= 0:
+        workers = max(1, cpu_count // (cpu_threads or 1))
+    if cpu_threads is None and workers > 1:
+        cpu_threads = max(1, cpu_count // workers)
+    return workers, cpu_threads
+
+
+@contextmanager
+def thread_env(cpu_threads):
+    """在with块内设置THREAD_ENV_VARS，退出时恢复原值；cpu_threads为空时不做任何修改"""
+    saved = {name: os.environ.get(name) for name in THREAD_ENV_VARS}
+    if cpu_threads:
+        for name in THREAD_ENV_VARS:
+            os.environ[name] = str(cpu_threads)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def create_worker_pool(workers, options, warm_up=False):
+    """创建进程池并立即启动全部工作进程，每个工作进程由init_pool_worker创建一次引擎
+
+    OpenMP/MKL/OpenBLAS只在库加载时读取线程数环境变量，而spawn出的工作进程在执行初始化函数之前
+    已经重新导入了主模块和numpy，只能在启动时通过继承的环境变量传入。进程池在提交任务时才按需启动进程，
+    因此在thread_env内提交workers个任务把进程全部启动，之后恢复主进程的环境变量。
+    初始化函数先在屏障上等待，所有进程启动前没有进程空闲，每次提交都会启动一个新进程
+    """
+    context = multiprocessing.get_context('spawn')
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_pool_worker,
+                                   initargs=(options, warm_up, context.Barrier(workers)))
+    existing = set(multiprocessing.active_children())
+    with thread_env(options.cpu_threads):
+        for _ in range(workers):
+            executor.submit(worker_pid)
+    _pool_processes[executor] = [process for process in multiprocessing.active_children()
+                                 if process not in existing]
+    return executor
+
+
+def init_pool_worker(options, warm_up=False, started=None):
+    """进程池初始化函数：在当前进程中创建一次引擎
+
+    started为create_worker_pool的屏障，所有工作进程都启动后才继续；
+    warm_up为True时立即加载模型并推理一次（服务模式），否则在第一次推理时才加载
+    """
+    global _worker_engine
+    # Ctrl+C由主进程统一处理（取消并结束工作进程），工作进程自身忽略
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if started is not None:
+        started.wait()
+    cv2.setNumThreads(1)
+    _worker_engine = OCREngine(options)
+    if warm_up:
+        _worker_engine.warm_up()
+
+
+def process_in_worker(image_path, image_bytes=None):
+    """在工作进程中处理单张图片，返回(记录, trace字典)"""
+    trace = StageTrace(image_path)
+    record = process_image(_worker_engine, image_path, image_bytes, trace)
+    return record, trace.to_dict()
+
+
+def process_chunk_in_worker(image_paths):
+    """在工作进程中以合并识别批次的方式处理一组图片，返回(记录, trace字典)列表"""
+    return [(record, trace.to_dict()) for record, trace in iter_batched_records(_worker_engine, image_paths)]
+
+
+def worker_pid():
+    """返回工作进程的进程号，用于确认进程已启动并完成初始化"""
+    return os.getpid()
+
+
+def worker_ready(barrier):
+    """在barrier上等待后返回工作进程的进程号
+
+    每个工作进程同一时间只执行一个任务，N个任务都越过N方屏障时，N个不同的工作进程都已完成初始化
+    """
+    barrier.wait()
+    return os.getpid()
+
+
+def iter_batch_records(image_paths, workers=1, options=None, on_stage=None, cancel=None,
+                       prefetch=DEFAULT_PREFETCH_DEPTH):
+    """按输入顺序逐条产出(结果记录, StageTrace)，workers大于1时使用进程池并行处理
+
+    on_stage为单进程模式下每个阶段结束时的回调（见StageTrace），进程池模式下阶段在工作进程中完成，不会回调。
+    cancel为CancelToken，取消后抛出OperationCancelled；进程池模式下同时丢弃排队的任务并结束工作进程。
+    prefetch为单进程模式下预读取的图片数，0表示不预读取；进程池模式下各工作进程的读取本身已与推理并行
+    """
+    options = options or EngineOptions()
+    if workers <= 1:
+        engine = OCREngine(options)
+        if options.rec_batch_size:
+            yield from iter_batched_records(engine, image_paths, on_stage, cancel, prefetch)
+            return
+        if prefetch <= 0:
+            for image_path in image_paths:
+                if cancel is not None:
+                    cancel.check()
+                trace = StageTrace(image_path, on_stage, cancel)
+                yield process_image(engine, image_path, trace=trace), trace
+            return
+        prefetched = iter_prefetched(image_paths, prefetch, should_decode=_needs_decode(engine))
+        try:
+            for item in prefetched:
+                if cancel is not None:
+                    cancel.check()
+                trace = StageTrace(item.image_path, on_stage, cancel)
+                item.record_to(trace)
+                yield _prefetched_record(engine, item, trace), trace
+        finally:
+            prefetched.close()
+        return
+
+    # 合并识别批次时每个任务是一组图片，否则是单张图片
+    if options.rec_batch_size:
+        tasks = [image_paths[i:i + BATCHED_TASK_IMAGES]
+                 for i in range(0, len(image_paths), BATCHED_TASK_IMAGES)]
+        process_task = process_chunk_in_worker
+    else:
+        tasks = image_paths
+        process_task = process_in_worker
+
+    # 限制已提交但未取回的任务数，保证内存占用有上限
+    max_pending = workers * 2
+    pending = deque()
+    with create_worker_pool(workers, options) as executor:
+        try:
+            for task in tasks:
+                if cancel is not None:
+                    cancel.check()
+                pending.append(executor.submit(process_task, task))
+                if len(pending) >= max_pending:
+                    yield from _task_records(_wait_result(pending.popleft(), cancel))
+            while pending:
+                yield from _task_records(_wait_result(pending.popleft(), cancel))
+        except BaseException:
+            # 取消、Ctrl+C或出错时不等待正在推理的图片，否则退出with时要等所有任务完成
+            terminate_pool(executor)
+            raise
+
+
+def _wait_result(future, cancel):
+    """等待任务结果，期间每隔CANCEL_POLL_INTERVAL秒检查一次是否已取消"""
+    if cancel is None:
+        return future.result()
+    while True:
+        try:
+            return future.result(timeout=CANCEL_POLL_INTERVAL)
+        except FuturesTimeoutError:
+            cancel.check()
+
+
+def terminate_pool(executor):
+    """丢弃排队的任务并结束create_worker_pool启动的所有工作进程"""
+    processes = _pool_processes.pop(executor, [])
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join(timeout=1)
+
+
+def _task_records(result):
+    results = result if isinstance(result, list) else [result]
+    return [(record, StageTrace.from_dict(trace)) for record, trace in results]
+
+
+def run_batch(inputs, output_path, output_format="jsonl", workers=1, options=None,
+              trace_path=None, trace_format="jsonl", profile_path=None, progress_callback=None,
+              cancel=None, prefetch=DEFAULT_PREFETCH_DEPTH, table_path=None, fsync_every=DEFAULT_FSYNC_EVERY):
+    """批量处理图片，逐张写出结果，返回(成功数, 失败数)
+
+    progress_callback接收ProgressEvent，默认在终端逐张打印进度、吞吐量和预计剩余时间；
+    trace_path不为空时把每张图片的阶段耗时写入该文件；profile_path不为空时
+    对热点阶段开启cProfile并保存到该文件（仅单进程模式）；
+    cancel为CancelToken，取消后停止处理，已写出的结果保留且文件格式完整；
+    prefetch为单进程模式下在后台预读取并解码的图片数；
+    结果逐条追加写出，每fsync_every条落盘一次；table_path不为空时把表格行另存为CSV或Parquet
+    """
+    image_paths = collect_image_paths(inputs)
+    if not image_paths:
+        print("没有找到可处理的图片")
+        return 0, 0
+
+    options = options or EngineOptions()
+    # 提前编译模板，模板有误时在启动工作进程之前就报错
+    template = load_template(options.template_path)
+
+    workers, cpu_threads = resolve_parallelism(workers, options.cpu_threads)
+    options = replace(options, cpu_threads=cpu_threads)
+    print(f"共找到 {len(image_paths)} 张图片，使用 {workers} 个进程"
+          f"（每进程线程数: {cpu_threads or '默认'}）")
+
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(output_dir, exist_ok=True)
+
+    if profile_path:
+        if workers > 1:
+            print("性能分析只支持单进程模式，已忽略--profile")
+            profile_path = None
+        else:
+            enable_profiling()
+    trace_writer = TraceWriter(trace_path, trace_format) if trace_path else None
+    stats = TimingStats()
+    progress = ProgressTracker(len(image_paths), progress_callback or CliProgressReporter())
+
+    ok_count = 0
+    failed_count = 0
+    cancelled = False
+    start_time = time.time()
+    # 先创建表格文件，缺少pyarrow等问题在加载模型之前就报错
+    table_writer = TableWriter(table_path, template) if table_path else None
+    writer = RecordWriter(output_path, output_format, fsync_every)
+    records = iter_batch_records(image_paths, workers, options, progress.trace_callback, cancel, prefetch)
+    try:
+        for record, trace in records:
+            stats.add(trace)
+            if trace_writer is not None:
+                trace_writer.write(trace)
+            if record['status'] == 'ok':
+                ok_count += 1
+            else:
+                failed_count += 1
+            writer.write(record)
+            if table_writer is not None:
+                table_writer.write(record)
+            progress.image_finished(trace, record['status'])
+    except OperationCancelled:
+        cancelled = True
+    finally:
+        writer.close()
+        if table_writer is not None:
+            table_writer.close()
+
+    if trace_writer is not None:
+        trace_writer.close()
+    if profile_path:
+        dump_profile(profile_path)
+        print(f"性能分析结果已保存至 {profile_path}")
+
+    elapsed = time.time() - start_time
+    print("各阶段耗时:\n" + stats.format_table())
+    if cancelled:
+        print(f"已取消: 已处理 {ok_count + failed_count}/{len(image_paths)} 张，耗时 {elapsed:.1f}s，"
+              f"已处理的结果已保存至 {output_path}")
+        return ok_count, failed_count
+    print(f"处理完成: 成功 {ok_count}，失败 {failed_count}，耗时 {elapsed:.1f}s，结果已保存至 {output_path}")
+    if table_path:
+        print(f"表格行已保存至 {table_path}")
+    return ok_count, failed_count
+
+
+def add_recognition_arguments(parser):
+    """添加影响识别结果的引擎参数；批量处理和HTTP服务共用，相同参数下两者输出一致"""
+    parser.add_argument("--det-policy", choices=DET_POLICIES, default="fixed",
+                        help="检测分辨率策略：fixed使用PaddleOCR默认的960像素上限，adaptive按图片的字符大小选择")
+    parser.add_argument("--layout-cache", action="store_true",
+                        help="记录截图版面，已知版面跳过文本检测直接在记录的文本框位置识别（结果与处理顺序有关）")
+    parser.add_argument("--refine-threshold", type=float, default=0,
+                        help=f"字段或表格单元格的识别置信度低于该值时，对应的文本行重新检测和识别（建议{DEFAULT_REFINE_THRESHOLD}）；"
+                             "默认0不重新识别")
+
+
+def recognition_options(args):
+    """add_recognition_arguments添加的参数对应的EngineOptions字段"""
+    return {'det_policy': args.det_policy, 'layout_cache': args.layout_cache,
+            'refine_threshold': args.refine_threshold}
+
+
+def run_cli(argv=None):
+    """命令行批量模式入口，返回退出码：全部成功为0，有图片失败时为EXIT_FAILED或EXIT_PARTIAL_FAILURE"""
+    parser = argparse.ArgumentParser(description="Glory OCR 批量字段提取")
+    parser.add_argument("inputs", nargs="+", help="图片文件、目录或通配符（如 'images/*.png'）")
+    parser.add_argument("-o", "--output", help="结果文件路径，默认保存到 ~/Glory_OCR_Output")
+    parser.add_argument("--format", choices=["jsonl", "json"], default="jsonl", help="输出格式")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="并行进程数，每个进程加载一份模型；0表示按CPU核数自动选择")
+    parser.add_argument("--cpu-threads", type=int, default=None,
+                        help="每个进程的Paddle推理线程数，默认按 CPU核数/进程数 分配")
+    parser.add_argument("--template", help="表单模板文件（YAML/JSON），默认使用form_template.yaml")
+    parser.add_argument("--roi", action="store_true",
+                        help="只识别模板中声明的ROI区域，缺少锚点标签时自动回退整页识别")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help="OCR结果缓存目录，相同图片和模型配置再次处理时跳过推理")
+    parser.add_argument("--cache-size-mb", type=int, default=512, help="OCR结果缓存的容量上限（MB）")
+    parser.add_argument("--no-cache", action="store_true", help="不读写OCR结果缓存")
+    parser.add_argument("--rec-batch", type=int, default=None,
+                        help="把多张图片的文本行合并识别，每批的行数（如32）；不指定时逐张识别")
+    parser.add_argument("--rec-max-wait-ms", type=int, default=200,
+                        help="合并识别时，检测完的图片最多等待多久凑批次（毫秒）")
+    add_recognition_arguments(parser)
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH_DEPTH,
+                        help="单进程模式下在后台预读取并解码的图片数，图片在网络共享目录时可掩盖读取延迟；0表示不预读取")
+    parser.add_argument("--table-output",
+                        help="把所有图片的表格行另存为该文件，按扩展名写CSV（.csv）或Parquet（.parquet，需要pyarrow）")
+    parser.add_argument("--fsync-every", type=int, default=DEFAULT_FSYNC_EVERY,
+                        help="每写出多少条结果落盘（fsync）一次，1表示每条都落盘")
+    parser.add_argument("--trace", help="把每张图片各阶段的耗时写入该文件")
+    parser.add_argument("--trace-format", choices=["jsonl", "chrome"], default="jsonl",
+                        help="耗时文件格式，chrome格式可在chrome://tracing或Perfetto中打开")
+    parser.add_argument("--profile", help="对检测、识别和提取阶段开启cProfile，结果保存到该文件（仅单进程）")
+    args = parser.parse_args(argv)
+
+    output_path = args.output
+    if not output_path:
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        output_path = os.path.join(os.path.expanduser("~"), "Glory_OCR_Output",
+                                   f"batch_result_{timestamp}.{args.format}")
+
+    options = EngineOptions(
+        cpu_threads=args.cpu_threads,
+        template_path=args.template,
+        roi=args.roi,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        cache_max_bytes=args.cache_size_mb * 1024 * 1024,
+        rec_batch_size=args.rec_batch,
+        rec_max_wait=args.rec_max_wait_ms / 1000,
+        **recognition_options(args),
+    )
+    # 第一次Ctrl+C协作式取消：停止提交、结束工作进程并保留已写出的结果；第二次直接中断
+    cancel = CancelToken()
+
+    def handle_interrupt(signum, frame):
+        print("正在取消...")
+        cancel.cancel()
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    previous_handler = signal.signal(signal.SIGINT, handle_interrupt)
+    try:
+        ok_count, failed_count = run_batch(args.inputs, output_path, args.format, args.workers, options,
+                                           args.trace, args.trace_format, args.profile, cancel=cancel,
+                                           prefetch=args.prefetch, table_path=args.table_output,
+                                           fsync_every=args.fsync_every)
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+    if cancel.cancelled:
+        return EXIT_CANCELLED
+    if failed_count:
+        return EXIT_PARTIAL_FAILURE if ok_count else EXIT_FAILED
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(run_cli())
@@ -0,0 +1,378 @@
+"""吞吐量和延迟基准测试
+
+对example_img中的截图和按固定随机种子生成的合成表单运行完整流程
+（加载模型、解码、检测、识别、提取、绘制结果图、导出），统计各阶段的p50/p95延迟、
+每秒处理图片数和峰值内存，结果写入JSON文件，便于对比不同版本。
+--det-policy compare依次用固定和自适应的检测分辨率运行，报告各数据集的检测分辨率、延迟、
+合成表单的文字召回率以及与固定分辨率提取结果的一致率。
+只使用CPU和本地模型，不访问网络；不读写OCR结果缓存。
+
+    python ocr_benchmark.py -o benchmark.json
+    python ocr_benchmark.py --sizes 800x600,4000x3000 --boxes 20,200 --repeat 5
+    python ocr_benchmark.py --det-policy compare -o benchmark.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import replace
+
+import cv2
+import numpy as np
+
+from ocr_batch import collect_image_paths
+from ocr_det_scale import DEFAULT_DET_SCALE_POLICY, DET_POLICIES, choose_det_side_len
+from ocr_engine import (DEFAULT_REFINE_THRESHOLD, EngineOptions, OCREngine, assemble_result, decode_image,
+                        detect_text_lines, read_image_bytes, recognize_text_lines)
+from ocr_render import RENDER_FORMATS, RenderOptions, encode_image, render_preview
+
+# 流程各阶段，顺序即报告中的顺序
+STAGES = ('decode', 'det_scale', 'detect', 'recognize', 'refine', 'extract', 'render', 'export')
+
+DEFAULT_IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "example_img")
+DEFAULT_SIZES = "800x600,1218x1040,2400x2000,4000x3000"
+DEFAULT_BOXES = "20,80"
+
+# 合成表单中使用的文字，与实际界面上的标签和数值相近
+_SYNTHETIC_WORDS = ("Recipe", "BadgeNo.", "Time", "NOMAL_CR", "Min", "Max", "Count",
+                    "0.100", "0.300", "1.000", "12", "SV2-250113-0370", "20:45")
+
+
+def make_synthetic_page(width, height, box_count, rng):
+    """生成一张白底黑字的合成表单，文字按网格排布，返回(PNG编码后的文件内容, 写入的文字列表)"""
+    page = np.full((height, width, 3), 255, dtype=np.uint8)
+    # 字号随页面尺寸缩放，使大图上的文字像扫描件一样大
+    font_scale = max(0.5, width / 1600)
+    thickness = max(1, int(round(font_scale * 1.5)))
+    columns = max(1, int(np.ceil(np.sqrt(box_count * width / height))))
+    rows = int(np.ceil(box_count / columns))
+    cell_w, cell_h = width / columns, height / max(rows, 1)
+    words = []
+    for i in range(box_count):
+        row, col = divmod(i, columns)
+        text = _SYNTHETIC_WORDS[rng.integers(len(_SYNTHETIC_WORDS))]
+        x = int(col * cell_w + rng.uniform(0.05, 0.3) * cell_w)
+        y = int(row * cell_h + cell_h * 0.6)
+        cv2.putText(page, text, (x, y), cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 0, 0), thickness)
+        words.append(text)
+        if i % 3 == 0:
+            cv2.rectangle(page, (x - 4, y - int(30 * font_scale)), (x + int(cell_w * 0.6), y + 8),
+                          (128, 128, 128), 1)
+    _, encoded = cv2.imencode(".png", page)
+    return encoded.tobytes(), words
+
+
+def parse_sizes(text):
+    sizes = []
+    for item in text.split(","):
+        width, height = item.lower().split("x")
+        sizes.append((int(width), int(height)))
+    return sizes
+
+
+def build_datasets(image_dir, sizes, box_counts, seed):
+    """返回{数据集名: [(图片名, 文件内容, 期望的文字列表), ...]}，合成表单由seed决定，每次运行完全相同
+
+    真实截图没有标注，期望的文字列表为None
+    """
+    datasets = {}
+    if image_dir:
+        image_paths = collect_image_paths([image_dir])
+        if image_paths:
+            datasets['example_img'] = [(path, read_image_bytes(path), None) for path in image_paths]
+
+    rng = np.random.default_rng(seed)
+    for width, height in sizes:
+        for box_count in box_counts:
+            name = f"synthetic_{width}x{height}_{box_count}"
+            datasets[name] = [(f"{name}_{i}", *make_synthetic_page(width, height, box_count, rng))
+                              for i in range(2)]
+    return datasets
+
+
+def peak_rss_mb():
+    """返回进程的峰值常驻内存（MB），平台不支持时返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux以KB为单位，macOS以字节为单位
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize(samples):
+    """将各阶段的耗时样本（秒）汇总为毫秒单位的p50/p95/平均值"""
+    if not samples:
+        return None
+    values = np.asarray(samples) * 1000
+    return {
+        'p50_ms': round(float(np.percentile(values, 50)), 2),
+        'p95_ms': round(float(np.percentile(values, 95)), 2),
+        'mean_ms': round(float(values.mean()), 2),
+        'count': len(values),
+    }
+
+
+def text_recall(expected, texts):
+    """期望的文字中被识别出来的比例（按出现次数计），没有标注时返回None"""
+    if not expected:
+        return None
+    matched = Counter(expected) & Counter(text.strip() for text in texts)
+    return sum(matched.values()) / len(expected)
+
+
+def flatten_extracted(extracted):
+    """把extracted_data展开为{字段名或'table[行].列': 值}，用于比较两次提取结果"""
+    values = {name: value for name, value in extracted.items() if name != 'table'}
+    for row_number, row in enumerate(extracted.get('table') or []):
+        values.update({f"table[{row_number}].{name}": value for name, value in row.items()})
+    return values
+
+
+def extraction_agreement(reference, extracted):
+    """两次提取结果中取值相同的字段和单元格所占的比例"""
+    reference, extracted = flatten_extracted(reference), flatten_extracted(extracted)
+    keys = set(reference) | set(extracted)
+    if not keys:
+        return 1.0
+    return sum(reference.get(key) == extracted.get(key) for key in keys) / len(keys)
+
+
+def det_side_len(engine, image, glyph_height):
+    """这张图片检测时实际使用的长边像素数"""
+    if engine.options.det_policy == 'adaptive':
+        return choose_det_side_len(image.shape, glyph_height)
+    # PaddleOCR默认把长边限制在960像素，只缩小不放大
+    return min(max(image.shape[:2]), DEFAULT_DET_SCALE_POLICY.default_side_len)
+
+
+def run_pipeline(engine, image_name, image_bytes, export_file, render_options=None, expected=None):
+    """对一张图片运行完整流程，返回(各阶段耗时（秒）, 识别出的文本行数, 检测长边像素数, 文字召回率, 提取结果)
+
+    render阶段与界面相同：在解码后的图像上按render_options绘制预览并编码；
+    expected为合成表单中写入的文字，用于计算召回率
+    """
+    render_options = render_options or RenderOptions()
+    timings = {}
+
+    start = time.perf_counter()
+    image = decode_image(image_bytes, image_name)
+    timings['decode'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    glyph_height = engine.prepare_detection(image)
+    timings['det_scale'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    quads, crops = detect_text_lines(engine.ocr_model, image)
+    timings['detect'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rec_res = recognize_text_lines(engine.ocr_model, crops)
+    ocr_result = assemble_result(engine.ocr_model, quads, rec_res, image_name, image.shape)
+    timings['recognize'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ocr_result = engine.refine(image, ocr_result)
+    timings['refine'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    extracted = engine.extract(ocr_result).to_dict() if ocr_result is not None else {}
+    timings['extract'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if ocr_result is not None:
+        rendered = render_preview(image, ocr_result.texts, ocr_result.boxes, render_options.preview_max_side)
+        encode_image(rendered, render_options.format, render_options.quality)
+    timings['render'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    record = {'image_path': image_name, 'extracted_data': extracted}
+    export_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+    export_file.flush()
+    timings['export'] = time.perf_counter() - start
+
+    texts = ocr_result.texts if ocr_result is not None else []
+    return timings, len(texts), det_side_len(engine, image, glyph_height), text_recall(expected, texts), extracted
+
+
+def run_benchmark(datasets, options=None, repeat=3, warmup=1, render_options=None, reference=None):
+    """运行基准测试并返回报告字典
+
+    reference为{图片名: 提取结果}，用于对比不同配置：图片已在其中时统计与它一致的比例，
+    否则把本次的提取结果存入其中
+    """
+    options = options or EngineOptions()
+    render_options = render_options or RenderOptions()
+    engine = OCREngine(options)
+
+    start = time.perf_counter()
+    engine.warm_up()
+    model_load = time.perf_counter() - start
+
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+        },
+        'config': {
+            'cpu_threads': options.cpu_threads,
+            'rec_batch_size': options.rec_batch_size,
+            'det_policy': options.det_policy,
+            'refine_threshold': options.refine_threshold,
+            'render': {'preview_max_side': render_options.preview_max_side,
+                       'format': render_options.format, 'quality': render_options.quality},
+            'repeat': repeat,
+            'warmup': warmup,
+            'config_fingerprint': engine.config_fingerprint,
+        },
+        'model_load_s': round(model_load, 3),
+        'datasets': {},
+    }
+
+    all_samples = {stage: [] for stage in STAGES}
+    # 本次运行的结果在全部数据集结束后才加入reference，重复运行时不与自己比较
+    new_reference = {}
+    total_images = 0
+    total_time = 0.0
+    with tempfile.TemporaryFile('w+', encoding='utf-8') as export_file:
+        for name, images in datasets.items():
+            for _ in range(warmup):
+                for image_name, image_bytes, expected in images:
+                    run_pipeline(engine, image_name, image_bytes, export_file, render_options, expected)
+
+            samples = {stage: [] for stage in STAGES}
+            text_counts = []
+            side_lens = []
+            recalls = []
+            agreements = []
+            dataset_start = time.perf_counter()
+            for _ in range(repeat):
+                for image_name, image_bytes, expected in images:
+                    timings, text_count, side_len, recall, extracted = run_pipeline(
+                        engine, image_name, image_bytes, export_file, render_options, expected)
+                    text_counts.append(text_count)
+                    side_lens.append(side_len)
+                    if recall is not None:
+                        recalls.append(recall)
+                    if reference is not None:
+                        if image_name in reference:
+                            agreements.append(extraction_agreement(reference[image_name], extracted))
+                        else:
+                            new_reference[image_name] = extracted
+                    for stage in STAGES:
+                        samples[stage].append(timings[stage])
+            elapsed = time.perf_counter() - dataset_start
+
+            image_count = len(images) * repeat
+            total_images += image_count
+            total_time += elapsed
+            for stage in STAGES:
+                all_samples[stage].extend(samples[stage])
+            report['datasets'][name] = {
+                'images': image_count,
+                'images_per_sec': round(image_count / elapsed, 3) if elapsed else None,
+                'mean_text_count': round(float(np.mean(text_counts)), 1),
+                'mean_det_side_len': round(float(np.mean(side_lens))),
+                'text_recall': round(float(np.mean(recalls)), 4) if recalls else None,
+                'agreement_with_reference': round(float(np.mean(agreements)), 4) if agreements else None,
+                'stages': {stage: summarize(samples[stage]) for stage in STAGES},
+            }
+            print(f"{name}: {report['datasets'][name]['images_per_sec']} 张/秒")
+
+    report['overall'] = {
+        'images': total_images,
+        'images_per_sec': round(total_images / total_time, 3) if total_time else None,
+        'stages': {stage: summarize(all_samples[stage]) for stage in STAGES},
+    }
+    report['peak_rss_mb'] = peak_rss_mb()
+    if reference is not None:
+        reference.update(new_reference)
+    return report
+
+
+def compare_det_policies(reports):
+    """汇总不同检测分辨率策略在各数据集上的吞吐量、检测延迟、检测分辨率和准确率"""
+    comparison = {}
+    for policy, report in reports.items():
+        for name, dataset in report['datasets'].items():
+            detect = dataset['stages']['detect']
+            comparison.setdefault(name, {})[policy] = {
+                'images_per_sec': dataset['images_per_sec'],
+                'detect_p50_ms': detect['p50_ms'] if detect else None,
+                'mean_det_side_len': dataset['mean_det_side_len'],
+                'text_recall': dataset['text_recall'],
+                'agreement_with_reference': dataset['agreement_with_reference'],
+            }
+    return comparison
+
+
+def run_cli(argv=None):
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="Glory OCR 吞吐量和延迟基准测试")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="报告文件路径")
+    parser.add_argument("--images", default=DEFAULT_IMAGE_DIR, help="真实截图目录，传空字符串则不使用")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="合成表单的尺寸列表，如 800x600,4000x3000")
+    parser.add_argument("--boxes", default=DEFAULT_BOXES, help="合成表单的文本框数量列表，如 20,80")
+    parser.add_argument("--repeat", type=int, default=3, help="每个数据集计时的重复次数")
+    parser.add_argument("--warmup", type=int, default=1, help="每个数据集计时前的预热次数")
+    parser.add_argument("--seed", type=int, default=0, help="合成表单的随机种子")
+    parser.add_argument("--cpu-threads", type=int, default=None, help="Paddle推理线程数")
+    parser.add_argument("--template", help="表单模板文件（YAML/JSON）")
+    parser.add_argument("--refine-threshold", type=float, default=0,
+                        help=f"低于该置信度的字段和单元格重新检测和识别（建议{DEFAULT_REFINE_THRESHOLD}），默认0不重新识别")
+    parser.add_argument("--det-policy", choices=[*DET_POLICIES, "compare"], default="fixed",
+                        help="检测分辨率策略；compare依次运行fixed和adaptive，对比吞吐量和准确率")
+    parser.add_argument("--render-max-side", type=int, default=RenderOptions.preview_max_side,
+                        help="结果图预览长边的像素上限，0表示按原尺寸绘制")
+    parser.add_argument("--render-format", choices=sorted(RENDER_FORMATS), default=RenderOptions.format,
+                        help="结果图编码格式")
+    parser.add_argument("--render-quality", type=int, default=RenderOptions.quality, help="JPEG/WebP编码质量")
+    args = parser.parse_args(argv)
+
+    sizes = parse_sizes(args.sizes) if args.sizes else []
+    box_counts = [int(count) for count in args.boxes.split(",")] if args.boxes else []
+    datasets = build_datasets(args.images, sizes, box_counts, args.seed)
+    options = EngineOptions(cpu_threads=args.cpu_threads, template_path=args.template,
+                            refine_threshold=args.refine_threshold)
+
+    render_options = RenderOptions(args.render_max_side, args.render_format, args.render_quality)
+
+    if args.det_policy == "compare":
+        # fixed在前，它的提取结果作为adaptive的对比基准
+        policies = ('fixed', 'adaptive')
+    else:
+        policies = (args.det_policy,)
+    reports = {}
+    reference = {}
+    for policy in policies:
+        print(f"检测分辨率策略: {policy}")
+        reports[policy] = run_benchmark(datasets, replace(options, det_policy=policy), args.repeat, args.warmup,
+                                        render_options, reference)
+    report = reports[policies[-1]]
+    if len(policies) > 1:
+        report['det_policy_comparison'] = compare_det_policies(reports)
+        for name, results in report['det_policy_comparison'].items():
+            print(name + ": " + "；".join(
+                f"{policy} 长边{result['mean_det_side_len']} 检测p50 {result['detect_p50_ms']}ms "
+                f"召回率 {result['text_recall']} 一致率 {result['agreement_with_reference']}"
+                for policy, result in results.items()))
+    report['config']['seed'] = args.seed
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    overall = report['overall']
+    print(f"共 {overall['images']} 张，{overall['images_per_sec']} 张/秒，"
+          f"峰值内存 {report['peak_rss_mb']} MB，报告已保存至 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(run_cli())
@@ -0,0 +1,139 @@
+"""按内容寻址的OCR结果磁盘缓存
+
+键由图片文件内容的哈希和模型配置指纹组成，值为原始的rec_texts/rec_scores/rec_boxes。
+同一张截图重复处理（重跑、调整提取规则后重新导出）时直接读取缓存，跳过解码和推理。
+缓存总大小超过上限时，按最近使用时间淘汰最旧的条目。
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from ocr_extraction_core import OCRResult
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), "Glory_OCR_Output", "ocr_cache")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def entry_from_result(ocr_result):
+    """将OCRResult转换为可写入缓存的字典，None表示未检测到文本"""
+    if ocr_result is None:
+        return {'texts': [], 'scores': [], 'boxes': [], 'image_size': None}
+    return {
+        'texts': list(ocr_result.texts),
+        'scores': [float(score) for score in ocr_result.scores],
+        'boxes': ocr_result.boxes.tolist(),
+        'image_size': list(ocr_result.image_size) if ocr_result.image_size is not None else None,
+    }
+
+
+def result_from_entry(entry, image_path=None):
+    """将缓存条目还原为OCRResult，条目中没有文本时返回None"""
+    if not entry['texts']:
+        return None
+    image_size = tuple(entry['image_size']) if entry.get('image_size') else None
+    return OCRResult(entry['texts'], entry['scores'], entry['boxes'], image_path, image_size)
+
+
+class OCRResultCache:
+    """OCR结果的磁盘缓存，多个进程可共享同一目录"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        # 当前缓存大小的估计值，超过上限时才重新扫描目录并淘汰
+        self._estimated_bytes = sum(size for _, size, _ in self._scan())
+
+    @staticmethod
+    def make_key(image_bytes, config_fingerprint):
+        """由图片内容和模型配置指纹计算缓存键"""
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        return hashlib.sha256(f"{config_fingerprint}:{digest}".encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def contains(self, key):
+        """只判断条目是否存在，不读取内容也不更新使用时间"""
+        return os.path.exists(self._path(key))
+
+    def get(self, key):
+        """返回缓存条目字典，未命中时返回None"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            # 更新修改时间，作为LRU淘汰的依据
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key, entry):
+        """写入缓存条目，先写临时文件再替换，避免其他进程读到半个文件"""
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        data = json.dumps(entry, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.warning("写入OCR缓存失败: %s", path, exc_info=True)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        self._estimated_bytes += len(data)
+        if self._estimated_bytes > self.max_bytes:
+            self._evict()
+
+    def _scan(self):
+        """返回所有缓存文件的(路径, 大小, 修改时间)"""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for item in os.scandir(shard.path):
+                if item.name.endswith(".json"):
+                    try:
+                        stat = item.stat()
+                    except OSError:
+                        continue
+                    entries.append((item.path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict(self):
+        """按最近使用时间从旧到新删除条目，直到总大小降到上限的90%以下"""
+        entries = self._scan()
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in sorted(entries, key=lambda item: item[2]):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._estimated_bytes = total
+
+    def clear(self):
+        """删除所有缓存条目"""
+        for path, _, _ in self._scan():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._estimated_bytes = 0
@@ -0,0 +1,33 @@
+"""协作式取消
+
+CancelToken由界面或命令行持有，处理流程在每个阶段开始前（见StageTrace）和每张图片之间检查，
+取消后抛出OperationCancelled。进程池模式下取消会丢弃排队的任务并结束正在推理的工作进程，
+不等待当前图片处理完。
+"""
+import threading
+
+
+class OperationCancelled(BaseException):
+    """处理已被取消
+
+    与KeyboardInterrupt一样继承BaseException，避免被流程中处理单张图片错误的except Exception吞掉
+    """
+
+
+class CancelToken:
+    """可在任意线程中调用cancel()，处理线程通过check()或cancelled感知"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        """已取消时抛出OperationCancelled"""
+        if self._event.is_set():
+            raise OperationCancelled()
@@ -0,0 +1,699 @@
+"""PaddleOCR模型加载与推理
+
+paddle和PaddleOCR只在load_ocr_model中导入，导入本模块本身不会加载模型。
+"""
+import copy
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+
+import cv2
+import numpy as np
+
+from ocr_cache import DEFAULT_MAX_BYTES, OCRResultCache, entry_from_result, result_from_entry
+from ocr_det_scale import DEFAULT_DET_SCALE_POLICY, choose_det_side_len, estimate_glyph_height, set_detection_limit
+from ocr_extraction_core import OCRResult, extract_all
+from ocr_layout import LayoutCache, layout_hash, text_beyond_box, to_gray
+from ocr_models import local_model_kwargs, model_fingerprint, models_root, resolve_models
+from ocr_template import load_template
+from ocr_timing import NULL_TRACE, StageTrace
+
+logger = logging.getLogger(__name__)
+
+# PaddleOCR构造参数，同时参与OCR结果缓存键的计算；模型目录由ocr_models按lang解析
+OCR_MODEL_KWARGS = {'use_angle_cls': False, 'lang': "en"}
+
+# 提取到的字段或表格单元格置信度低于该值时，对应的文本行重新检测、识别一次
+DEFAULT_REFINE_THRESHOLD = 0.85
+
+# 重新识别时在文本行四周扩展的距离（行高的倍数），在扩展后的区域内重新检测以修正文本框
+REFINE_MARGIN = 0.5
+
+# 重新检测的框与原文本框的交并比不低于该值时才采用，避免换成与相邻文本合并的框
+REFINE_MIN_IOU = 0.5
+
+
+class ImageReadError(ValueError):
+    """图片文件不存在或无法解码"""
+
+
+def load_ocr_model(cpu_threads=None, rec_batch_num=None):
+    """加载PaddleOCR模型，paddle在此处才导入以免拖慢启动
+
+    cpu_threads用于限制Paddle推理的算子内线程数，为None时使用库默认值；
+    rec_batch_num为识别模型每次前向的行数，为None时使用库默认值
+    """
+    # PaddleOCR导入时读取模型目录，本地模型不完整时也会下载到这里
+    os.environ["PADDLE_OCR_BASE_DIR"] = models_root()
+    import paddle
+    paddle.set_device('cpu')
+    from paddleocr import PaddleOCR
+
+    kwargs = dict(OCR_MODEL_KWARGS)
+    # 直接使用本地模型目录，不再按下载地址查找
+    kwargs.update(local_model_kwargs(kwargs['lang'], kwargs['use_angle_cls']))
+    if cpu_threads:
+        kwargs['cpu_threads'] = cpu_threads
+    if rec_batch_num:
+        kwargs['rec_batch_num'] = rec_batch_num
+    return PaddleOCR(**kwargs)
+
+
+def decode_image(image_bytes, image_path=None):
+    """将图片文件内容解码为BGR数组（与cv2.imread一致），无法解码时抛出ImageReadError"""
+    image = None
+    if image_bytes:
+        try:
+            image = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), cv2.IMREAD_COLOR)
+        except cv2.error:
+            image = None
+    if image is None:
+        raise ImageReadError(f"无法读取图像: {image_path}")
+    return image
+
+
+def read_image_bytes(image_path):
+    """读取图片文件内容，文件不存在时抛出ImageReadError"""
+    try:
+        with open(image_path, 'rb') as f:
+            return f.read()
+    except OSError as e:
+        raise ImageReadError(f"无法读取图像: {image_path} ({e.strerror})") from e
+
+
+def run_ocr(ocr_model, image, image_path=None):
+    """对已解码的图像运行OCR，返回OCRResult，未检测到文本时返回None"""
+    result = ocr_model.ocr(image, cls=True)
+    return OCRResult.from_paddle(result, image_path, image.shape)
+
+
+def crop_text_line(image, quad):
+    """按检测出的四边形透视裁剪文本行，竖排的行旋转为横排（与PaddleOCR的get_rotate_crop_image一致）"""
+    quad = np.asarray(quad, dtype=np.float32)
+    width = int(max(np.linalg.norm(quad[0] - quad[1]), np.linalg.norm(quad[2] - quad[3])))
+    height = int(max(np.linalg.norm(quad[0] - quad[3]), np.linalg.norm(quad[1] - quad[2])))
+    target = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    matrix = cv2.getPerspectiveTransform(quad, target)
+    crop = cv2.warpPerspective(image, matrix, (width, height),
+                               borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC)
+    if crop.shape[0] >= crop.shape[1] * 1.5:
+        crop = np.rot90(crop)
+    return crop
+
+
+def boxes_to_quads(boxes):
+    """把(N,4)矩形框转换为(N,4,2)四边形（左上、右上、右下、左下）"""
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    x0, y0, x1, y1 = boxes.T
+    return np.stack([np.stack([x0, y0], 1), np.stack([x1, y0], 1),
+                     np.stack([x1, y1], 1), np.stack([x0, y1], 1)], axis=1)
+
+
+def detect_text_lines(ocr_model, image):
+    """只运行文本检测，返回按阅读顺序排列的四边形(N,4,2)数组和对应的行图像列表"""
+    dt_boxes, _ = ocr_model.text_detector(image)
+    if dt_boxes is None or len(dt_boxes) == 0:
+        return np.zeros((0, 4, 2), dtype=np.float32), []
+    quads = np.asarray(dt_boxes, dtype=np.float32)
+    quads = quads[reading_order(quads[:, 0, :])]
+    return quads, [crop_text_line(image, quad) for quad in quads]
+
+
+def recognize_text_lines(ocr_model, crops, cls=True):
+    """识别行图像列表，返回与crops一一对应的[(text, score), ...]"""
+    if not crops:
+        return []
+    if cls and getattr(ocr_model, 'use_angle_cls', False):
+        crops, _, _ = ocr_model.text_classifier(crops)
+    rec_res, _ = ocr_model.text_recognizer(crops)
+    return rec_res
+
+
+def load_text_classifier(ocr_model):
+    """只加载随程序打包的方向分类模型，供重新识别时使用；模型文件不完整或无法加载时返回None
+
+    PaddleOCR在use_angle_cls=False时不创建分类器。TextClassifier只需要PaddleOCR的参数对象，
+    换成本地cls模型目录即可单独创建，不需要第二个PaddleOCR实例
+    """
+    paths, _ = resolve_models(OCR_MODEL_KWARGS['lang'], use_angle_cls=True)
+    args = getattr(ocr_model, 'args', None)
+    if paths.cls is None or args is None:
+        return None
+    try:
+        # paddleocr导入时把自身目录加入sys.path，tools包既可作为paddleocr.tools也可直接导入
+        try:
+            from paddleocr.tools.infer.predict_cls import TextClassifier
+        except ImportError:
+            from tools.infer.predict_cls import TextClassifier
+        args = copy.copy(args)
+        args.use_angle_cls = True
+        args.cls_model_dir = paths.cls
+        return TextClassifier(args)
+    except Exception:
+        logger.warning("无法加载方向分类模型，重新识别时不纠正方向", exc_info=True)
+        return None
+
+
+def line_quad(ocr_result, index):
+    """第index行的检测四边形，结果中没有四边形时由矩形框构造"""
+    if ocr_result.quads is not None:
+        return ocr_result.quads[index]
+    x0, y0, x1, y1 = ocr_result.boxes[index]
+    return np.float32([[x0, y0], [x1, y0], [x1, y1], [x0, y1]])
+
+
+def refit_quad(ocr_model, region, quad):
+    """在region中重新检测，返回与quad交并比最大且不低于REFINE_MIN_IOU的四边形，没有时返回quad（region内坐标）"""
+    dt_boxes, _ = ocr_model.text_detector(region)
+    if dt_boxes is None or len(dt_boxes) == 0:
+        return quad
+    candidates = np.asarray(dt_boxes, dtype=np.float32).reshape(-1, 4, 2)
+    low, high = quad.min(axis=0), quad.max(axis=0)
+    candidate_low, candidate_high = candidates.min(axis=1), candidates.max(axis=1)
+    intersection = np.clip(np.minimum(high, candidate_high) - np.maximum(low, candidate_low), 0, None).prod(axis=1)
+    union = (high - low).prod() + (candidate_high - candidate_low).prod(axis=1) - intersection
+    iou = intersection / np.maximum(union, 1e-6)
+    best = int(np.argmax(iou))
+    return candidates[best] if iou[best] >= REFINE_MIN_IOU else quad
+
+
+def refine_lines(ocr_model, image, ocr_result, line_indices, classifier=None):
+    """重新检测、识别line_indices中的文本行，返回(新的OCRResult, 替换的行数)
+
+    第一遍的结果可能因为文本框截断了字符或框得太松而置信度低：在四周扩展REFINE_MARGIN倍行高的区域内
+    重新检测以修正四边形，再按四边形透视裁剪（与PaddleOCR一致）后识别。classifier为方向分类器
+    （见load_text_classifier），只翻转分类器判断为倒置的行。新结果的置信度更高时才替换文本，检测框不变
+    """
+    height, width = image.shape[:2]
+    indices = []
+    crops = []
+    for index in line_indices:
+        quad = line_quad(ocr_result, index)
+        (x0, y0), (x1, y1) = quad.min(axis=0), quad.max(axis=0)
+        margin = REFINE_MARGIN * (y1 - y0)
+        left, top = int(max(0, x0 - margin)), int(max(0, y0 - margin))
+        right, bottom = int(min(width, x1 + margin + 1)), int(min(height, y1 + margin + 1))
+        if right <= left or bottom <= top:
+            continue
+        offset = np.float32([left, top])
+        quad = refit_quad(ocr_model, image[top:bottom, left:right], quad - offset) + offset
+        indices.append(index)
+        crops.append(crop_text_line(image, quad))
+    if not crops:
+        return ocr_result, 0
+
+    if classifier is not None:
+        crops, _, _ = classifier(crops)
+    rec_res = recognize_text_lines(ocr_model, crops, cls=False)
+
+    texts = list(ocr_result.texts)
+    scores = list(ocr_result.scores)
+    replaced = 0
+    for index, (text, score) in zip(indices, rec_res):
+        if text and score > scores[index]:
+            logger.debug("重新识别第%d行: %s(%.3f) -> %s(%.3f)", index, texts[index], scores[index], text, score)
+            texts[index] = text
+            scores[index] = score
+            replaced += 1
+    if not replaced:
+        return ocr_result, 0
+    return OCRResult(texts, scores, ocr_result.boxes, ocr_result.image_path, ocr_result.image_size,
+                     quads=ocr_result.quads), replaced
+
+
+def assemble_result(ocr_model, quads, rec_res, image_path=None, image_size=None):
+    """将检测框和识别结果组装为OCRResult，与ocr()一样丢弃低于drop_score的行"""
+    drop_score = getattr(ocr_model, 'drop_score', 0.5)
+    lines = [[quad.tolist(), (text, score)] for quad, (text, score) in zip(quads, rec_res)
+             if score >= drop_score]
+    return OCRResult.from_paddle([lines], image_path, image_size)
+
+
+def reading_order(boxes):
+    """按PaddleOCR整页结果的顺序排列检测框：从上到下，同一行（y相差小于10像素）从左到右"""
+    order = list(np.lexsort((boxes[:, 0], boxes[:, 1])))
+    for i in range(len(order) - 1):
+        for j in range(i, -1, -1):
+            upper, lower = boxes[order[j]], boxes[order[j + 1]]
+            if abs(lower[1] - upper[1]) < 10 and lower[0] < upper[0]:
+                order[j], order[j + 1] = order[j + 1], order[j]
+            else:
+                break
+    return np.asarray(order, dtype=np.intp)
+
+
+def run_roi_ocr(ocr_model, image, roi, image_path=None, glyph_height=None):
+    """只在模板声明的ROI区域内检测和识别，坐标换算回整页
+
+    glyph_height为整页估计的字符高度，不为None时按它设置每个区域的检测分辨率；
+    没有识别到文本或缺少roi.require_labels中的标签时返回None，由调用方回退到整页识别
+    """
+    height, width = image.shape[:2]
+    texts = []
+    scores = []
+    boxes = []
+    quads = []
+    for x0, y0, x1, y1 in roi.regions:
+        # 向外扩展margin，避免贴边的文字被截断而检测不到
+        left = int(max(0, x0 - roi.margin))
+        top = int(max(0, y0 - roi.margin))
+        right = int(min(width, x1 + roi.margin))
+        bottom = int(min(height, y1 + roi.margin))
+        if right <= left or bottom <= top:
+            continue
+
+        if glyph_height is not None:
+            set_detection_limit(ocr_model, choose_det_side_len((bottom - top, right - left), glyph_height))
+        part = OCRResult.from_paddle(ocr_model.ocr(image[top:bottom, left:right], cls=True))
+        if part is None:
+            continue
+        texts.extend(part.texts)
+        scores.extend(part.scores)
+        boxes.append(part.boxes + np.array([left, top, left, top], dtype=np.float64))
+        quads.append(part.quads + np.array([left, top], dtype=np.float32))
+
+    if not texts:
+        return None
+    missing = [label for label in roi.require_labels if label not in texts]
+    if missing:
+        logger.info("ROI中缺少锚点标签%s，回退到整页识别", missing)
+        return None
+
+    boxes = np.concatenate(boxes)
+    order = reading_order(boxes)
+    return OCRResult([texts[i] for i in order], [scores[i] for i in order], boxes[order],
+                     image_path, image.shape, quads=np.concatenate(quads)[order])
+
+
+@dataclass
+class EngineOptions:
+    """OCR引擎配置，会被传给进程池的工作进程，因此只能包含可pickle的简单值
+
+    cache_dir为None时不使用OCR结果缓存
+    """
+    cpu_threads: int = None
+    template_path: str = None
+    roi: bool = False
+    cache_dir: str = None
+    cache_max_bytes: int = DEFAULT_MAX_BYTES
+    # 跨图片合并识别批次（RecognitionBatcher），为None时每张图片单独调用ocr()
+    rec_batch_size: int = None
+    rec_max_wait: float = 0.2
+    # 低置信度的字段和单元格放大后重新识别（见refine_lines），为None或0时不重新识别（默认）；
+    # 建议的阈值为DEFAULT_REFINE_THRESHOLD
+    refine_threshold: float = None
+    # 检测分辨率策略（见ocr_det_scale）：fixed使用PaddleOCR的默认设置，adaptive按图片的字符大小选择；
+    # 在example_img上用ocr_benchmark.py --det-policy compare确认提取结果一致之前默认fixed
+    det_policy: str = 'fixed'
+    # 识别已知版面（见ocr_layout），命中时在记录的文本框位置直接识别，跳过整页检测；
+    # 结果取决于之前处理过的图片，默认关闭，命中时的结果不写入OCR结果缓存
+    layout_cache: bool = False
+
+
+class OCREngine:
+    """持有模型和编译后的模板，对图像执行OCR和字段提取
+
+    模型在第一次真正需要推理时才加载，全部命中缓存的批次不会加载模型
+    """
+
+    def __init__(self, options=None, ocr_model=None):
+        self.options = options or EngineOptions()
+        self.template = load_template(self.options.template_path)
+        self._ocr_model = ocr_model
+        # 重新识别用的方向分类器，第一次用到时才加载（见refine_classifier）
+        self._text_classifier = None
+        self._text_classifier_loaded = False
+        self.cache = None
+        if self.options.cache_dir:
+            self.cache = OCRResultCache(self.options.cache_dir, self.options.cache_max_bytes)
+        self.layouts = LayoutCache() if self.options.layout_cache else None
+        self.config_fingerprint = self._config_fingerprint()
+
+    @property
+    def ocr_model(self):
+        if self._ocr_model is None:
+            self._ocr_model = load_ocr_model(self.options.cpu_threads, self.options.rec_batch_size)
+        return self._ocr_model
+
+    def warm_up(self):
+        """加载模型并对空白图像推理一次，之后的第一张图片不再承担初始化开销"""
+        blank = np.full((64, 256, 3), 255, dtype=np.uint8)
+        run_ocr(self.ocr_model, blank)
+
+    def _config_fingerprint(self):
+        """影响原始OCR结果的配置摘要：模型参数、模型文件和推理库版本以及ROI区域"""
+        # 重新识别时使用方向分类模型
+        use_cls = OCR_MODEL_KWARGS['use_angle_cls'] or bool(self.options.refine_threshold)
+        config = {'model': OCR_MODEL_KWARGS,
+                  'model_files': model_fingerprint(OCR_MODEL_KWARGS['lang'], use_cls)}
+        if self.options.rec_batch_size:
+            # 批内按最长行补齐，批次大小不同时识别结果可能有细微差别
+            config['rec_batch_size'] = self.options.rec_batch_size
+        roi = self.template.roi
+        if self.options.roi and roi is not None:
+            config['roi'] = [roi.regions.tolist(), roi.margin, list(roi.require_labels)]
+        if self.options.det_policy == 'adaptive':
+            config['det_policy'] = asdict(DEFAULT_DET_SCALE_POLICY)
+        if self.options.refine_threshold:
+            # 重新识别的行由模板决定，模板不同时缓存的结果也不同
+            config['refine'] = [self.options.refine_threshold, REFINE_MARGIN, REFINE_MIN_IOU,
+                                self.template.digest]
+        return hashlib.sha256(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def cache_key(self, image_bytes):
+        """返回图片内容对应的缓存键，未启用缓存时返回None"""
+        if self.cache is None:
+            return None
+        return self.cache.make_key(image_bytes, self.config_fingerprint)
+
+    def is_cached(self, image_bytes):
+        """图片结果是否已在缓存中，用于预读取时跳过不需要的解码"""
+        return self.cache is not None and self.cache.contains(self.cache_key(image_bytes))
+
+    def recognize_bytes(self, image_bytes, image_path=None, trace=NULL_TRACE):
+        """识别图片文件内容，命中缓存时既不解码也不推理"""
+        def get_image():
+            with trace.stage('decode'):
+                return decode_image(image_bytes, image_path)
+        return self._recognize_cached(image_bytes, image_path, get_image, trace)
+
+    def recognize(self, image, image_path=None, image_bytes=None, trace=NULL_TRACE):
+        """识别已解码的图像；提供image_bytes时先按文件内容查找缓存"""
+        if image_bytes is None or self.cache is None:
+            return self._recognize_image(image, image_path, trace)[0]
+        return self._recognize_cached(image_bytes, image_path, lambda: image, trace)
+
+    def _recognize_cached(self, image_bytes, image_path, get_image, trace):
+        if self.cache is None:
+            return self._recognize_image(get_image(), image_path, trace)[0]
+
+        with trace.stage('cache'):
+            key = self.cache_key(image_bytes)
+            entry = self.cache.get(key)
+        if entry is not None:
+            return result_from_entry(entry, image_path)
+
+        ocr_result, cacheable = self._recognize_image(get_image(), image_path, trace)
+        if cacheable:
+            self.cache.put(key, entry_from_result(ocr_result))
+        return ocr_result
+
+    def _loaded_model(self, trace):
+        """返回模型，第一次加载的耗时单独记为load_model阶段"""
+        if self._ocr_model is None:
+            with trace.stage('load_model'):
+                return self.ocr_model
+        return self._ocr_model
+
+    def _recognize_image(self, image, image_path=None, trace=NULL_TRACE):
+        """返回(OCRResult, 是否可以写入缓存)；开启ROI模式且模板声明了区域时只识别这些区域，必要时回退整页
+
+        整页识别时先查找已知版面，命中且结果可信时跳过检测；这样的结果取决于之前记录的版面，不写入缓存
+        """
+        ocr_model = self._loaded_model(trace)
+        if self.options.roi and self.template.roi is not None:
+            glyph_height = self.prepare_detection(image, trace)
+            with trace.stage('roi_ocr'):
+                ocr_result = run_roi_ocr(ocr_model, image, self.template.roi, image_path, glyph_height)
+            if ocr_result is not None:
+                return self.refine(image, ocr_result, trace), True
+            if glyph_height is not None:
+                set_detection_limit(ocr_model, choose_det_side_len(image.shape, glyph_height))
+            with trace.stage('ocr'):
+                ocr_result = run_ocr(ocr_model, image, image_path)
+            return self.refine(image, ocr_result, trace), True
+
+        image_hash, quads, crops = self.match_layout(image, trace)
+        if quads is not None:
+            with trace.stage('layout_ocr'):
+                ocr_result = assemble_result(ocr_model, quads, recognize_text_lines(ocr_model, crops),
+                                             image_path, image.shape)
+            if self.layout_result_ok(ocr_result):
+                return self.refine(image, ocr_result, trace), False
+        return self.refine(image, self._detect_page(image, image_path, image_hash, trace), trace), True
+
+    def _detect_page(self, image, image_path, image_hash, trace):
+        """整页检测和识别，并把识别结果中（按drop_score过滤后）的文本框记入版面记录"""
+        self.prepare_detection(image, trace)
+        with trace.stage('ocr'):
+            ocr_result = run_ocr(self.ocr_model, image, image_path)
+        if ocr_result is not None:
+            self.learn_layout(image_hash, image, ocr_result.boxes)
+        return ocr_result
+
+    def match_layout(self, image, trace=NULL_TRACE):
+        """返回(版面哈希, 四边形, 行图像)：版面已知时为记录的文本框及其行图像，按阅读顺序排列
+
+        未开启版面记录时三项都为None；版面未知、需要重新检测或有文本超出记录的框时后两项为None
+        """
+        if self.layouts is None:
+            return None, None, None
+        with trace.stage('layout'):
+            gray = to_gray(image)
+            image_hash = layout_hash(gray)
+            layout = self.layouts.match(image_hash, image.shape[:2])
+            if layout is None:
+                return image_hash, None, None
+            if any(text_beyond_box(gray, box) for box in layout.boxes):
+                logger.debug("文本超出记录的文本框，回退到整页检测")
+                return image_hash, None, None
+            quads = boxes_to_quads(layout.boxes)
+            quads = quads[reading_order(quads[:, 0, :])]
+            crops = [crop_text_line(image, quad) for quad in quads]
+        return image_hash, quads, crops
+
+    def learn_layout(self, image_hash, image, boxes):
+        """记录整页检测得到的文本框(N,4)，image_hash为None（未开启版面记录）时忽略"""
+        if self.layouts is not None and image_hash is not None:
+            self.layouts.learn(image_hash, image.shape[:2], boxes)
+
+    def layout_result_ok(self, ocr_result):
+        """按记录的文本框识别的结果是否可信：必须包含模板要求的标签（roi.require_labels，未声明时为各字段的锚点标签）"""
+        if ocr_result is None:
+            return False
+        if self.template.roi is not None and self.template.roi.require_labels:
+            labels = self.template.roi.require_labels
+        else:
+            labels = [spec.anchor_label for spec in self.template.fields if spec.anchor_label]
+        missing = [label for label in labels if label not in ocr_result.texts]
+        if missing:
+            logger.debug("按记录的文本框识别的结果中缺少标签%s，回退到整页检测", missing)
+        return not missing
+
+    def prepare_detection(self, image, trace=NULL_TRACE):
+        """按options.det_policy设置这张图片的检测分辨率，返回估计的字符高度
+
+        fixed策略、图中文字太少无法估计，或模型不支持修改检测分辨率时返回None（使用默认分辨率）
+        """
+        if self.options.det_policy != 'adaptive':
+            return None
+        with trace.stage('det_scale'):
+            glyph_height, _ = estimate_glyph_height(image)
+            side_len = choose_det_side_len(image.shape, glyph_height)
+            if not set_detection_limit(self.ocr_model, side_len):
+                logger.debug("检测模型不支持修改输入分辨率，使用默认设置")
+                return None
+        logger.debug("%s: 字符高度约%s像素，检测长边上限%d", image.shape, glyph_height, side_len)
+        return glyph_height
+
+    def refine(self, image, ocr_result, trace=NULL_TRACE):
+        """只对提取用到、置信度低于options.refine_threshold的文本行重新检测和识别，返回更新后的OCRResult
+
+        没有行被替换时，这次的提取结果记在OCRResult.extraction中，extract不再重复提取
+        """
+        threshold = self.options.refine_threshold
+        if not threshold or ocr_result is None:
+            return ocr_result
+        with trace.stage('refine'):
+            extracted = extract_all(ocr_result, self.template)
+            low = [index for index in extracted.line_indices if ocr_result.scores[index] < threshold]
+            replaced = 0
+            if low:
+                ocr_result, replaced = refine_lines(self.ocr_model, image, ocr_result, low, self.refine_classifier())
+            if not replaced:
+                ocr_result.extraction = extracted
+        if low:
+            logger.debug("%s: %d行低置信度文本重新识别，替换%d行", ocr_result.image_path, len(low), replaced)
+        return ocr_result
+
+    def refine_classifier(self):
+        """重新识别用的方向分类器：模型本身加载了分类器时直接使用，否则第一次用到时只加载打包的cls模型"""
+        if not self._text_classifier_loaded:
+            model = self.ocr_model
+            if getattr(model, 'use_angle_cls', False):
+                self._text_classifier = model.text_classifier
+            else:
+                self._text_classifier = load_text_classifier(model)
+            self._text_classifier_loaded = True
+        return self._text_classifier
+
+    def extract(self, ocr_result, trace=NULL_TRACE):
+        """按模板提取字段，返回ExtractionResult；refine已经提取过时直接返回其结果"""
+        with trace.stage('extract'):
+            if ocr_result.extraction is not None:
+                return ocr_result.extraction
+            return extract_all(ocr_result, self.template)
+
+
+class _PendingImage:
+    """RecognitionBatcher中等待识别或已完成的一张图片"""
+    __slots__ = ('image_path', 'trace', 'image', 'image_size', 'image_hash', 'from_layout', 'cache_key', 'quads',
+                 'crops', 'done', 'result', 'error')
+
+    def __init__(self, image_path, trace):
+        self.image_path = image_path
+        self.trace = trace
+        self.image = None
+        self.image_size = None
+        self.image_hash = None
+        self.from_layout = False
+        self.cache_key = None
+        self.quads = None
+        self.crops = None
+        self.done = False
+        self.result = None
+        self.error = None
+
+    def finish(self, result=None, error=None):
+        self.done = True
+        self.result = result
+        self.error = error
+        self.image = self.quads = self.crops = None
+
+
+class RecognitionBatcher:
+    """把多张图片检测出的文本行合并成更大的识别批次，再把结果按来源图片拆分
+
+    小截图每张只有十几行，逐张识别时每次前向都凑不满批次，调用开销占了大头。
+    待识别的行数达到options.rec_batch_size，或最早检测完的图片等待超过options.rec_max_wait秒时执行一次识别。
+    submit和flush按提交顺序返回已完成的图片，每项为(image_path, OCRResult或None, 异常或None, trace)。
+    一次合并识别的耗时按行数分摊到各图片的trace中。
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.batch_size = engine.options.rec_batch_size or 1
+        self.max_wait = engine.options.rec_max_wait
+        self._queue = deque()
+        self._pending = []
+        self._pending_lines = 0
+        self._oldest = None
+
+    def submit(self, image_path, image_bytes=None, trace=NULL_TRACE, image=None, error=None):
+        """检测一张图片并把文本行放入批次，返回此时已完成的图片
+
+        image_bytes为None时从image_path读取；image为预先解码的数组时不再解码；
+        error为预读取时的异常，该图片直接按失败返回。
+        读取、解码或检测失败的图片同样按顺序返回，异常放在第三项
+        """
+        item = _PendingImage(image_path, trace)
+        self._queue.append(item)
+        try:
+            if error is not None:
+                raise error
+            if image_bytes is None:
+                with trace.stage('read'):
+                    image_bytes = read_image_bytes(image_path)
+            self._prepare(item, image_bytes, image)
+        except Exception as e:
+            item.finish(error=e)
+
+        if self._pending and (self._pending_lines >= self.batch_size
+                              or time.monotonic() - self._oldest >= self.max_wait):
+            self._recognize_pending()
+        return self._pop_done()
+
+    def flush(self):
+        """识别所有剩余的行并返回全部未取走的图片"""
+        if self._pending:
+            self._recognize_pending()
+        return self._pop_done()
+
+    def _prepare(self, item, image_bytes, image=None):
+        engine = self.engine
+        trace = item.trace
+        if engine.cache is not None:
+            with trace.stage('cache'):
+                item.cache_key = engine.cache_key(image_bytes)
+                entry = engine.cache.get(item.cache_key)
+            if entry is not None:
+                item.finish(result_from_entry(entry, item.image_path))
+                return
+
+        if image is None:
+            with trace.stage('decode'):
+                image = decode_image(image_bytes, item.image_path)
+        if engine.options.roi and engine.template.roi is not None:
+            # ROI模式的每个区域本身就是一次小的ocr()调用，不参与合并
+            self._store(item, *engine._recognize_image(image, item.image_path, trace))
+            return
+
+        # 识别后对低置信度的行重新识别时还要用到原图
+        item.image = image
+        item.image_size = image.shape
+        ocr_model = engine._loaded_model(trace)
+        item.image_hash, item.quads, item.crops = engine.match_layout(image, trace)
+        item.from_layout = item.quads is not None
+        if not item.from_layout:
+            engine.prepare_detection(image, trace)
+            with trace.stage('detect'):
+                item.quads, item.crops = detect_text_lines(ocr_model, image)
+        if not item.crops:
+            self._store(item, None)
+            return
+        if not self._pending:
+            self._oldest = time.monotonic()
+        self._pending.append(item)
+        self._pending_lines += len(item.crops)
+
+    def _store(self, item, ocr_result, cacheable=True):
+        if cacheable and item.cache_key is not None:
+            self.engine.cache.put(item.cache_key, entry_from_result(ocr_result))
+        item.finish(ocr_result)
+
+    def _recognize_pending(self):
+        pending, self._pending, self._pending_lines = self._pending, [], 0
+        crops = [crop for item in pending for crop in item.crops]
+        ocr_model = self.engine.ocr_model
+        batch_trace = StageTrace()
+        try:
+            with batch_trace.stage('recognize'):
+                rec_res = recognize_text_lines(ocr_model, crops)
+        except Exception as e:
+            for item in pending:
+                item.finish(error=e)
+            return
+        logger.debug("合并识别%d张图片的%d行", len(pending), len(crops))
+
+        _, start_time, wall, cpu = batch_trace.spans[0]
+        start = 0
+        for item in pending:
+            end = start + len(item.crops)
+            share = len(item.crops) / len(crops)
+            item.trace.add('recognize', start_time, wall * share, cpu * share)
+            ocr_result = assemble_result(ocr_model, item.quads, rec_res[start:end], item.image_path, item.image_size)
+            try:
+                cacheable = True
+                if not item.from_layout:
+                    # 与_detect_page一样，只记录drop_score过滤后留下的文本框
+                    if ocr_result is not None:
+                        self.engine.learn_layout(item.image_hash, item.image, ocr_result.boxes)
+                elif self.engine.layout_result_ok(ocr_result):
+                    cacheable = False
+                else:
+                    ocr_result = self.engine._detect_page(item.image, item.image_path, item.image_hash, item.trace)
+                self._store(item, self.engine.refine(item.image, ocr_result, item.trace), cacheable)
+            except Exception as e:
+                item.finish(error=e)
+            start = end
+
+    def _pop_done(self):
+        finished = []
+        while self._queue and self._queue[0].done:
+            item = self._queue.popleft()
+            finished.append((item.image_path, item.result, item.error, item.trace))
+        return finished
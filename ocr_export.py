@@ -0,0 +1,159 @@
+"""批量结果的流式写出
+
+RecordWriter每处理完一张图片就追加一行紧凑的JSON记录，写入后立即flush，
+每fsync_every条或每fsync_interval秒才fsync一次，程序异常退出时最多丢失最近一批未落盘的记录。
+TableWriter把各图片的表格行按列写入CSV或Parquet，便于直接用表格工具或pandas分析；
+Parquet按行组分批写出。两者都只保留当前一批数据，内存占用与处理的图片数无关。
+"""
+import csv
+import json
+import os
+import time
+
+# 每写出多少条记录fsync一次
+DEFAULT_FSYNC_EVERY = 64
+
+# 距上次fsync超过该秒数时，即使不满一批也fsync
+DEFAULT_FSYNC_INTERVAL = 2.0
+
+# Parquet每个行组的行数
+PARQUET_ROW_GROUP_ROWS = 4096
+
+# 表格文件支持的扩展名
+TABLE_FORMATS = {'.csv': 'csv', '.parquet': 'parquet'}
+
+
+def dumps_compact(record):
+    """不带空格的单行JSON，中文不转义"""
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+
+
+class RecordWriter:
+    """逐条追加结果记录
+
+    output_format为'jsonl'时每条一行；为'json'时写JSON数组，close时补上结尾，
+    中途取消后文件仍是完整的JSON
+    """
+
+    def __init__(self, path, output_format='jsonl', fsync_every=DEFAULT_FSYNC_EVERY,
+                 fsync_interval=DEFAULT_FSYNC_INTERVAL):
+        self.output_format = output_format
+        self.fsync_every = max(1, fsync_every)
+        self.fsync_interval = fsync_interval
+        self.count = 0
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._file = open(path, 'w', encoding='utf-8')
+        if output_format == 'json':
+            self._file.write("[\n")
+
+    def write(self, record):
+        line = dumps_compact(record)
+        if self.output_format == 'json':
+            self._file.write(("  " if self.count == 0 else ",\n  ") + line)
+        else:
+            self._file.write(line + "\n")
+        self.count += 1
+        self._pending += 1
+        # 每条都交给操作系统，其他进程可以实时读取；fsync的开销较大，按批进行
+        self._file.flush()
+        if self._pending >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        """把已写出的记录落盘"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self.output_format == 'json':
+            self._file.write("\n]\n")
+        self.sync()
+        self._file.close()
+
+
+def table_columns(template):
+    """表格文件的列：图片路径、行号、模板中的字段，以及表格各列"""
+    columns = ['image_path', 'row']
+    columns += [spec.name for spec in template.fields]
+    if template.table is not None:
+        columns += [column.name for column in template.table.columns if column.name not in columns]
+    return columns
+
+
+def table_rows(record, columns):
+    """把一条结果记录展开为表格行，每行带上图片路径和各字段的值；没有表格行的记录不产生行"""
+    data = record.get('extracted_data') or {}
+    for index, table_row in enumerate(data.get('table') or []):
+        row = {name: data.get(name) for name in columns}
+        row.update(table_row)
+        row['image_path'] = record['image_path']
+        row['row'] = index
+        yield [row.get(name) for name in columns]
+
+
+class TableWriter:
+    """按列写出所有图片的表格行，格式由文件扩展名决定（.csv或.parquet）
+
+    Parquet需要安装pyarrow；行数据先在内存中攒满一个行组再写出
+    """
+
+    def __init__(self, path, template, row_group_rows=PARQUET_ROW_GROUP_ROWS):
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in TABLE_FORMATS:
+            raise ValueError(f"不支持的表格文件格式: {extension}，可用: {', '.join(TABLE_FORMATS)}")
+        self.table_format = TABLE_FORMATS[extension]
+        self.columns = table_columns(template)
+        self.row_count = 0
+        self._row_group_rows = row_group_rows
+        self._buffer = []
+
+        if self.table_format == 'parquet':
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError as e:
+                raise ImportError("写出Parquet文件需要安装pyarrow: pip install pyarrow") from e
+            self._pa = pa
+            self._schema = pa.schema([(name, pa.int32() if name == 'row' else pa.string())
+                                      for name in self.columns])
+            self._parquet = pq.ParquetWriter(path, self._schema)
+        else:
+            # newline=''由csv模块自行处理换行；utf-8-sig让Excel正确识别中文
+            self._file = open(path, 'w', encoding='utf-8-sig', newline='')
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(self.columns)
+
+    def write(self, record):
+        for row in table_rows(record, self.columns):
+            self.row_count += 1
+            if self.table_format == 'csv':
+                self._csv.writerow(row)
+                continue
+            self._buffer.append(row)
+            if len(self._buffer) >= self._row_group_rows:
+                self._write_row_group()
+
+    def _write_row_group(self):
+        if not self._buffer:
+            return
+        arrays = []
+        for field, values in zip(self._schema, zip(*self._buffer)):
+            if field.name != 'row':
+                values = [None if value is None else str(value) for value in values]
+            arrays.append(self._pa.array(values, type=field.type))
+        self._parquet.write_table(self._pa.Table.from_arrays(arrays, schema=self._schema))
+        self._buffer = []
+
+    def close(self):
+        if self.table_format == 'parquet':
+            if self._parquet is not None:
+                self._write_row_group()
+                self._parquet.close()
+                self._parquet = None
+        elif not self._file.closed:
+            self._file.close()
@@ -0,0 +1,340 @@
+"""OCR字段提取核心逻辑
+
+不依赖Tk，可在界面、批量工作进程、服务和基准测试中直接导入使用。
+所有提取函数都是无状态的：输入OCRResult，返回提取到的值。
+"""
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import numpy as np
+
+from ocr_template import load_template
+
+logger = logging.getLogger(__name__)
+
+
+def stacked_region_masks(boxes, lower, upper):
+    """一次判断所有区域：lower/upper为(K,4)，返回(K,N)布尔掩码"""
+    boxes = boxes[None, :, :]
+    return np.all((boxes >= lower[:, None, :]) & (boxes <= upper[:, None, :]), axis=2)
+
+
+def as_box_array(boxes):
+    """将矩形框列表转换为(N,4)的float数组"""
+    return np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+
+
+@dataclass
+class OCRResult:
+    """一张图片的OCR结果，boxes为(N,4)数组，每行是[x_min, y_min, x_max, y_max]
+
+    quads为检测出的原始四边形(N,4,2)，只有刚识别出的结果才有，从缓存读取的结果为None
+    """
+    texts: list
+    scores: list
+    boxes: np.ndarray
+    image_path: str = None
+    image_size: tuple = None
+    quads: np.ndarray = field(default=None, repr=False, compare=False)
+    # OCREngine.refine按引擎的模板提取过、且之后文本未被替换时的ExtractionResult，extract直接使用
+    extraction: object = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.boxes = as_box_array(self.boxes)
+        if self.quads is not None:
+            self.quads = np.asarray(self.quads, dtype=np.float32).reshape(-1, 4, 2)
+        # 对象数组便于与字符串做逐元素比较
+        self.text_array = np.array(self.texts, dtype=object).reshape(-1)
+
+    @classmethod
+    def from_paddle(cls, result, image_path=None, image_size=None):
+        """将PaddleOCR的输出转换为OCRResult，未检测到文本时返回None"""
+        if not result or len(result) == 0 or not result[0]:
+            return None
+
+        lines = result[0]
+        texts = [line[1][0] for line in lines]
+        scores = [line[1][1] for line in lines]
+        # 将四点坐标(N,4,2)转换为矩形边界框格式 [x_min, y_min, x_max, y_max]
+        quads = np.asarray([line[0] for line in lines], dtype=np.float64)
+        boxes = np.concatenate([quads.min(axis=1), quads.max(axis=1)], axis=1)
+        return cls(texts, scores, boxes, image_path, image_size, quads=quads)
+
+    @classmethod
+    def from_ocr_data(cls, ocr_data):
+        """从界面使用的ocr_data字典构造OCRResult"""
+        return cls(
+            texts=ocr_data.get('rec_texts', []),
+            scores=ocr_data.get('rec_scores', []),
+            boxes=ocr_data.get('rec_boxes', []),
+            image_path=ocr_data.get('image_path'),
+            image_size=ocr_data.get('image_size'),
+        )
+
+    def to_ocr_data(self):
+        """转换为界面使用的ocr_data字典"""
+        return {
+            'image_path': self.image_path,
+            'image_size': self.image_size,
+            'rec_texts': self.texts,
+            'rec_scores': self.scores,
+            'rec_boxes': self.boxes.tolist()
+        }
+
+    @property
+    def y_centers(self):
+        return (self.boxes[:, 1] + self.boxes[:, 3]) / 2
+
+    def label_indices(self, label):
+        """返回文本等于label且后面还有文本的所有位置"""
+        indices = np.flatnonzero(self.text_array == label)
+        return indices[indices + 1 < len(self.texts)]
+
+
+@dataclass
+class ExtractionResult:
+    """字段提取结果，fields按模板中的字段名保存提取到的值
+
+    field_scores和table_scores是各值对应文本行的识别置信度，值不是识别出来的（默认值、补全的单元格）时为None；
+    line_indices为提取用到的OCR文本行索引
+    """
+    fields: dict = field(default_factory=dict)
+    table: list = field(default_factory=list)
+    field_scores: dict = field(default_factory=dict)
+    table_scores: list = field(default_factory=list)
+    line_indices: list = field(default_factory=list)
+
+    def to_dict(self):
+        """转换为与导出JSON一致的extracted_data字典"""
+        data = dict(self.fields)
+        data['table'] = self.table
+        return data
+
+    def scores_dict(self):
+        """各字段和表格单元格的置信度，与to_dict的结构对应"""
+        return {'fields': dict(self.field_scores), 'table': [dict(row) for row in self.table_scores]}
+
+    def low_confidence(self, threshold):
+        """返回置信度低于threshold的字段名和'table[行].列'形式的单元格名"""
+        names = [name for name, score in self.field_scores.items() if score is not None and score < threshold]
+        for row_number, row in enumerate(self.table_scores):
+            names += [f"table[{row_number}].{name}" for name, score in row.items()
+                      if score is not None and score < threshold]
+        return names
+
+
+def _contains_mask(texts, substring):
+    return np.fromiter((substring in text for text in texts), dtype=bool, count=len(texts))
+
+
+def _default_value(spec):
+    if spec.default_strftime:
+        return datetime.now().strftime(spec.default_strftime)
+    return spec.default
+
+
+def _line_score(ocr_result, index):
+    if index is None or ocr_result is None or index >= len(ocr_result.scores):
+        return None
+    return round(float(ocr_result.scores[index]), 4)
+
+
+def extract_field(ocr_result, spec, region_hits=None):
+    """按字段规则提取一个值：区域 -> 固定文本 -> 锚点标签 -> 默认值
+
+    region_hits为该字段区域的(N,)命中掩码，批量提取时由extract_all一次算好传入
+    """
+    return locate_field(ocr_result, spec, region_hits)[0]
+
+
+def locate_field(ocr_result, spec, region_hits=None):
+    """与extract_field相同，返回(值, 文本行索引)，使用默认值时索引为None"""
+    try:
+        if ocr_result is not None:
+            texts = ocr_result.texts
+            candidates = _contains_mask(texts, spec.contains) if spec.contains else None
+
+            # 查找位于字段值区域内的第一个文本
+            if region_hits is not None:
+                if candidates is not None:
+                    region_hits = region_hits & candidates
+                hits = np.flatnonzero(region_hits)
+                if hits.size and texts[hits[0]]:
+                    logger.debug("找到%s值: %s, 位置: %s", spec.name, texts[hits[0]], ocr_result.boxes[hits[0]])
+                    return texts[hits[0]], int(hits[0])
+
+            # 更直接的方法：直接查找固定文本
+            if spec.literal is not None and spec.literal in texts:
+                logger.debug("直接找到%s值: %s", spec.name, spec.literal)
+                return spec.literal, texts.index(spec.literal)
+
+            # 备选方法：查找锚点标签，然后获取其后满足条件的文本
+            if spec.anchor_label is not None:
+                next_indices = ocr_result.label_indices(spec.anchor_label) + 1
+                if spec.anchor_next_x_min is not None:
+                    next_x = ocr_result.boxes[next_indices, 0]
+                    low, high = spec.anchor_next_x_min
+                    next_indices = next_indices[(next_x >= low) & (next_x <= high)]
+                if candidates is not None:
+                    next_indices = next_indices[candidates[next_indices]]
+                if next_indices.size:
+                    value = texts[next_indices[0]]
+                    logger.debug("通过标签找到%s值: %s", spec.name, value)
+                    return value, int(next_indices[0])
+    except Exception as e:
+        logger.warning("提取%s时发生错误: %s", spec.name, e)
+
+    value = _default_value(spec)
+    logger.debug("无法找到%s值，使用默认值: %s", spec.name, value)
+    return value, None
+
+
+def _extract_named_field(ocr_result, name, template):
+    template = template or load_template()
+    index = template.field_index(name)
+    region_hits = None
+    if ocr_result is not None:
+        region_hits = stacked_region_masks(ocr_result.boxes,
+                                           template.region_lower[index:index + 1],
+                                           template.region_upper[index:index + 1])[0]
+    return extract_field(ocr_result, template.fields[index], region_hits)
+
+
+def extract_recipe(ocr_result, template=None):
+    """提取Recipe字段值"""
+    return _extract_named_field(ocr_result, 'recipe', template)
+
+
+def extract_badge_number(ocr_result, template=None):
+    """提取BadgeNo.字段值"""
+    return _extract_named_field(ocr_result, 'badge_number', template)
+
+
+def extract_time(ocr_result, template=None):
+    """提取Time字段值，未找到时使用当前时间"""
+    return _extract_named_field(ocr_result, 'time', template)
+
+
+def _table_sort_key(row, key_column):
+    """按照基准列的数值排序，非数字值放在最后"""
+    try:
+        return float(row[key_column])
+    except ValueError:
+        return float('inf')
+
+
+def _column_indices(mask, y_centers):
+    """返回列中检测框的索引，按y中心从上到下稳定排序"""
+    indices = np.flatnonzero(mask)
+    return indices[np.argsort(y_centers[indices], kind='stable')]
+
+
+def _nearest_in_column(row_y, column_indices, y_centers):
+    """为每一行返回y中心最接近的列内检测框索引，列为空时返回None"""
+    if column_indices.size == 0:
+        return [None] * len(row_y)
+    distances = np.abs(row_y[:, None] - y_centers[column_indices][None, :])
+    return column_indices[np.argmin(distances, axis=1)].tolist()
+
+
+def _fallback_table(table_spec):
+    return [dict(row) for row in table_spec.default_rows]
+
+
+def extract_table_data(ocr_result, template=None):
+    """基于位置信息提取表格数据"""
+    return locate_table(ocr_result, template)[0]
+
+
+def locate_table(ocr_result, template=None):
+    """与extract_table_data相同，返回(表格行, 各行每列的文本行索引)，补全的单元格索引为None"""
+    template = template or load_template()
+    table_spec = template.table
+    if table_spec is None:
+        return [], []
+
+    try:
+        table_data = []
+        key_column = table_spec.key_column
+
+        if ocr_result is not None:
+            texts = ocr_result.texts
+            y_centers = ocr_result.y_centers
+
+            # 按列的坐标范围划分检测框，一个文本框只归属于模板中第一个匹配的列
+            column_masks = stacked_region_masks(ocr_result.boxes, table_spec.region_lower, table_spec.region_upper)
+            claimed = np.zeros(len(texts), dtype=bool)
+            column_indices = []
+            for column, mask in zip(table_spec.columns, column_masks):
+                mask = mask & ~claimed
+                claimed |= mask
+                indices = _column_indices(mask, y_centers)
+                column_indices.append(indices)
+                logger.debug("排序后的%s值: %s", column.name, [texts[i] for i in indices])
+
+            # 根据基准列创建行数据，其他列取y最接近的值
+            key_indices = column_indices[table_spec.key_index]
+            row_y = y_centers[key_indices]
+            nearest = [_nearest_in_column(row_y, indices, y_centers) for indices in column_indices]
+
+            for row_number, key_index in enumerate(key_indices):
+                key_text = texts[key_index]
+                default_row = table_spec.default_row_by_key.get(key_text)
+                row = {}
+                sources = {}
+                for column_number, column in enumerate(table_spec.columns):
+                    if column_number == table_spec.key_index:
+                        row[column.name] = key_text
+                        sources[column.name] = int(key_index)
+                        continue
+                    index = nearest[column_number][row_number]
+                    value = texts[index] if index is not None else None
+
+                    # 如果同一行找不到值，使用默认行中的值
+                    if not value:
+                        index = None
+                        if default_row:
+                            value = default_row.get(column.name)
+                        elif column.missing is not None:
+                            value = column.missing
+                    row[column.name] = value
+                    sources[column.name] = index
+                table_data.append((row, sources))
+
+            # 如果表格数据不完整，用默认行补全
+            existing_keys = {row[key_column] for row, _ in table_data}
+            for default_row in table_spec.default_rows:
+                if default_row.get(key_column) not in existing_keys:
+                    table_data.append((dict(default_row), dict.fromkeys(default_row)))
+
+        table_data.sort(key=lambda item: _table_sort_key(item[0], key_column))
+        return [row for row, _ in table_data], [sources for _, sources in table_data]
+    except Exception:
+        logger.exception("提取表格数据时发生错误")
+        rows = _fallback_table(table_spec)
+        return rows, [dict.fromkeys(row) for row in rows]
+
+
+def extract_all(ocr_result, template=None):
+    """按模板提取所有字段和表格数据，所有字段区域一次判断完成；同时记录每个值的置信度"""
+    template = template or load_template()
+    result = ExtractionResult()
+    if ocr_result is not None and template.fields:
+        region_masks = stacked_region_masks(ocr_result.boxes, template.region_lower, template.region_upper)
+    else:
+        region_masks = [None] * len(template.fields)
+    line_indices = set()
+    for spec, region_hits in zip(template.fields, region_masks):
+        value, index = locate_field(ocr_result, spec, region_hits)
+        result.fields[spec.name] = value
+        result.field_scores[spec.name] = _line_score(ocr_result, index)
+        if index is not None:
+            line_indices.add(index)
+
+    result.table, table_sources = locate_table(ocr_result, template)
+    for sources in table_sources:
+        result.table_scores.append({name: _line_score(ocr_result, index) for name, index in sources.items()})
+        line_indices.update(index for index in sources.values() if index is not None)
+    result.line_indices = sorted(line_indices)
+    return result
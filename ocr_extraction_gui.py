@@ -1,4 +1,10 @@
+import time
+
+# 启动计时的起点，用于报告窗口出现和首次识别结果的耗时
+STARTUP_TIME = time.perf_counter()
+
 import json
+import multiprocessing
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 import os
@@ -6,35 +12,26 @@ import re
 import shutil
 import subprocess
 import threading
-import time
 import sys
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image, ImageTk, ImageFilter
-from PIL.Image import Resampling
-import cv2
-import numpy as np
 from datetime import datetime
 
-# 资源文件路径处理函数
-def resource_path(relative_path):
-    """获取资源的绝对路径，兼容开发环境和PyInstaller打包后的环境"""
-    try:
-        # PyInstaller创建临时文件夹，将路径存储在_MEIPASS中
-        base_path = sys._MEIPASS
-    except Exception:
-        base_path = os.path.abspath(".")
-    
-    return os.path.join(base_path, relative_path)
+# cv2、numpy以及依赖它们的ocr_engine、ocr_extraction_core、ocr_render在用到时才导入，
+# 窗口出现后由后台预热线程先行导入，不占用启动时间
+from ocr_cancel import CancelToken, OperationCancelled
+from ocr_preview import PreviewCache, file_preview_key, load_image_file
+from ocr_progress import STAGE_LABELS, ProgressTracker
+from ocr_timing import NULL_TRACE, StageTrace
+from ocr_ui_channel import UIChannel
+from ocr_viewer import TiledImageCanvas
 
-# 设置PaddleOCR模型保存目录
-models_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
-if not os.path.exists(models_dir):
-    os.makedirs(models_dir, exist_ok=True)
-os.environ["PADDLE_OCR_BASE_DIR"] = models_dir
-print(f"已设置OCR模型目录: {models_dir}")
 
-# 不要在全局范围导入PaddleOCR
-# from paddleocr import PaddleOCR
+def _load_image(image_path):
+    """在预读取线程中读取并解码图片，ocr_prefetch依赖cv2，在此处才导入"""
+    from ocr_prefetch import load_image
+    return load_image(image_path)
 
 
 class OCRExtractionApp:
@@ -49,14 +46,30 @@ class OCRExtractionApp:
         self.image_path = None
         # 使用用户主目录下的路径，而不是相对路径
         self.output_dir = os.path.join(os.path.expanduser("~"), "Glory_OCR_Output")
+        # OCR结果图只在内存中生成缩小的预览，原尺寸图在放大查看或保存时才绘制
+        self.render_options = None
+        self.ocr_frame = None
+        self.ocr_result_preview = None
+        self.ocr_result_id = 0
         self.ocr_result_image = None
         self.ocr_thread = None
         self.is_processing = False
-        self.ocr_model = None
+        self.cancel_token = None
+        self.ocr_engine = None
+        # 后台预热和处理线程共用，保证模型只加载一次
+        self.model_lock = threading.Lock()
+        self.first_result_reported = False
+        
+        # 选择图片后立即在后台读取并解码，点击识别时通常已经完成；(路径, 修改时间, Future)
+        self.prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ocr-prefetch')
+        self.prefetched = None
         
         # 图片显示相关变量
         self.current_display_image = None
+        self.current_image_type = None
         self.current_image_path = None
+        # 显示过的图片的多级预览图，切换图片和缩放时不再从原图重新缩放
+        self.preview_cache = PreviewCache()
         self.enlarged_window = None
         
         # 确保输出目录存在
@@ -64,31 +77,77 @@ class OCRExtractionApp:
             os.makedirs(self.output_dir)
         
         self.create_ui()
+        
+        # 处理线程通过该通道更新界面，不直接调用Tk
+        self.ui = UIChannel(self.root, self.append_log)
+        
+        # 窗口第一次显示后报告启动耗时并开始后台预热模型
+        self.root.bind("<Map>", self.on_first_map, add="+")
     
-    def init_ocr_model(self):
-        """惰性初始化OCR模型，仅在需要时加载"""
-        if self.ocr_model is None:
+    def on_first_map(self, event):
+        """窗口第一次出现时调用"""
+        if event.widget is not self.root:
+            return
+        self.root.unbind("<Map>")
+        message = f"窗口启动耗时: {(time.perf_counter() - STARTUP_TIME) * 1000:.0f}ms\n"
+        print(message, end="")
+        self.append_log(message)
+        self.start_warm_up()
+    
+    def start_warm_up(self):
+        """在后台线程中导入依赖、加载模型并做一次空白推理，首次点击识别时不再等待模型初始化"""
+        self.ui.start()
+        thread = threading.Thread(target=self.warm_up_model, daemon=True)
+        thread.start()
+    
+    def warm_up_model(self):
+        """后台预热（在预热线程中调用）"""
+        try:
+            start = time.perf_counter()
+            # init_ocr_model导入ocr_engine时一并导入了cv2、numpy和ocr_extraction_core，
+            # 首次识别时剩下的ocr_prefetch、ocr_render只是其上的薄封装，不需要单独预先导入
+            if self.init_ocr_model(warm_up=True):
+                now = time.perf_counter()
+                message = f"模型预热完成: 用时 {now - start:.1f}s，启动后 {now - STARTUP_TIME:.1f}s\n"
+                print(message, end="")
+                self.ui.log(message)
+        finally:
+            self.ui.post(self.ui.stop)
+    
+    def append_log(self, text):
+        """在主线程中追加日志并滚动到末尾"""
+        self.text_output.insert(tk.END, text)
+        self.text_output.see(tk.END)
+    
+    def init_ocr_model(self, warm_up=False):
+        """惰性初始化OCR模型，仅在需要时加载（在预热或处理线程中调用）
+
+        预热正在进行时等待其完成；warm_up为True时加载后对空白图像推理一次
+        """
+        with self.model_lock:
+            if self.ocr_engine is not None:
+                return True
             try:
                 # 显示加载信息
-                self.text_output.insert(tk.END, "正在加载OCR模型，请稍候...\n")
-                self.text_output.update()
-                
-                # 在这里导入paddle和PaddleOCR
-                import paddle
-                paddle.set_device('cpu')
-                from paddleocr import PaddleOCR
-                
-                # 初始化模型
-                self.ocr_model = PaddleOCR(use_angle_cls=False, lang="en")
-                self.text_output.insert(tk.END, "模型加载完成\n")
+                self.ui.log("正在加载OCR模型，请稍候...\n")
+                
+                # 初始化模型（paddle和PaddleOCR在load_ocr_model中导入），重复识别同一图片时使用结果缓存
+                from ocr_cache import DEFAULT_CACHE_DIR
+                from ocr_engine import EngineOptions, OCREngine, load_ocr_model
+                engine = OCREngine(EngineOptions(cache_dir=DEFAULT_CACHE_DIR), ocr_model=load_ocr_model())
+                if warm_up:
+                    engine.warm_up()
+                self.ocr_engine = engine
+                self.ui.log("模型加载完成\n")
                 return True
             except Exception as e:
                 error_msg = f"加载OCR模型失败: {str(e)}\n"
-                self.text_output.insert(tk.END, error_msg)
+                if isinstance(e, ImportError):
+                    error_msg += "可能是打包时缺少必要的依赖项，或OCR模型文件缺失\n"
+                self.ui.log(error_msg)
                 traceback.print_exc()
-                messagebox.showerror("错误", error_msg)
+                self.ui.post(messagebox.showerror, "错误", error_msg)
                 return False
-        return True
     
     def create_ui(self):
         # 创建主框架
@@ -167,6 +226,8 @@ class OCRExtractionApp:
         
         ttk.Button(image_buttons_frame, text="显示原始图片", command=lambda: self.show_image("original")).pack(side=tk.LEFT, padx=5)
         ttk.Button(image_buttons_frame, text="显示OCR结果图片", command=lambda: self.show_image("ocr_result")).pack(side=tk.LEFT, padx=5)
+        ttk.Button(image_buttons_frame, text="保存OCR结果图片", command=self.save_ocr_result_image).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(image_buttons_frame, text="结果图设置", command=self.edit_render_options).pack(side=tk.RIGHT, padx=5)
         
         # 右侧 - 提取字段结果区域
         results_frame = ttk.LabelFrame(right_frame, text="提取字段结果", padding="10")
@@ -225,31 +286,54 @@ class OCRExtractionApp:
         if file_path:
             self.image_path = file_path
             self.image_path_var.set(file_path)
+            self.prefetch_image(file_path)
             self.show_image("original")
             self.status_var.set("已选择图片，准备识别")
     
+    def prefetch_image(self, image_path):
+        """在后台读取并解码图片，图片在网络共享目录时读取延迟与用户操作重叠"""
+        try:
+            mtime = os.path.getmtime(image_path)
+        except OSError:
+            self.prefetched = None
+            return
+        self.prefetched = (image_path, mtime, self.prefetch_executor.submit(_load_image, image_path))
+    
+    def take_prefetched_image(self, image_path):
+        """取出预读取的图片；没有预读取或文件已被修改时当场读取（在处理线程中调用）"""
+        prefetched, self.prefetched = self.prefetched, None
+        if prefetched is not None:
+            path, mtime, future = prefetched
+            try:
+                if path == image_path and os.path.getmtime(image_path) == mtime:
+                    return future.result()
+            except OSError:
+                pass
+        return _load_image(image_path)
+    
     def show_image(self, image_type):
         """在界面上显示图片"""
         if image_type == "original" and self.image_path:
             image_path = self.image_path
-        elif image_type == "ocr_result" and self.ocr_result_image:
-            image_path = self.ocr_result_image
+        elif image_type == "ocr_result" and self.ocr_result_preview is not None:
+            image_path = None
         else:
             return
         
         try:
-            # 保存当前显示的图片路径
+            # 保存当前显示的图片类型和路径
+            self.current_image_type = image_type
             self.current_image_path = image_path
             
-            # 读取图片并调整大小以适应显示区域
-            img = Image.open(image_path)
+            # 取得图片的预览金字塔（OCR结果使用内存中的预览）并调整大小以适应显示区域
+            pyramid = self.get_preview_pyramid(image_type, full=False)
             # 计算合适的显示尺寸（保持纵横比）
             display_width = 500
-            width, height = img.size
+            width, height = pyramid.size
             ratio = display_width / width
             display_height = int(height * ratio)
             
-            img = img.resize((display_width, display_height), Resampling.LANCZOS)
+            img = pyramid.resized((display_width, display_height))
             photo = ImageTk.PhotoImage(img)
             
             # 保存当前显示的图片对象
@@ -265,9 +349,18 @@ class OCRExtractionApp:
         except Exception as e:
             messagebox.showerror("Error", f"无法显示图片: {str(e)}")
     
+    def get_preview_pyramid(self, image_type, full=True):
+        """返回当前图片的预览金字塔；full为False时OCR结果使用缩小的预览，否则按原尺寸绘制"""
+        if image_type == "original":
+            image_path = self.current_image_path
+            return self.preview_cache.get(file_preview_key(image_path), lambda: load_image_file(image_path))
+        if full:
+            return self.preview_cache.get(('ocr_result_full', self.ocr_result_id), self.load_full_result)
+        return self.preview_cache.get(('ocr_result', self.ocr_result_id), lambda: self.ocr_result_preview)
+    
     def enlarge_image(self, event=None):
         """放大显示当前图片"""
-        if not self.current_image_path:
+        if not self.current_image_type:
             return
         
         # 如果已存在放大窗口，先关闭
@@ -285,55 +378,20 @@ class OCRExtractionApp:
         window_height = min(screen_height - 100, 900)
         self.enlarged_window.geometry(f"{window_width}x{window_height}")
         
-        # 创建滚动条和画布
-        frame = ttk.Frame(self.enlarged_window)
-        frame.pack(fill=tk.BOTH, expand=True)
-        
-        # 水平和垂直滚动条
-        h_scrollbar = ttk.Scrollbar(frame, orient=tk.HORIZONTAL)
-        v_scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL)
-        
-        # 配置滚动条
-        h_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
-        v_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        # 创建画布并配置滚动条
-        canvas = tk.Canvas(frame, xscrollcommand=h_scrollbar.set, yscrollcommand=v_scrollbar.set)
-        canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        
-        # 连接滚动条到画布
-        h_scrollbar.config(command=canvas.xview)
-        v_scrollbar.config(command=canvas.yview)
-        
-        # 内部框架用于放置图片
-        inner_frame = ttk.Frame(canvas)
-        canvas.create_window(0, 0, window=inner_frame, anchor=tk.NW)
-        
         try:
-            # 以更大的尺寸显示图片
-            img = Image.open(self.current_image_path)
-            original_width, original_height = img.size
+            # 只为可见区域分块生成图像，放大大图时内存占用与窗口大小成正比
+            pyramid = self.get_preview_pyramid(self.current_image_type)
+            original_width, original_height = pyramid.size
             
-            # 计算放大后的尺寸（最大显示原始大小的1.5倍，但不超过屏幕限制）
-            display_width = min(original_width * 1.5, window_width - 50)
-            ratio = display_width / original_width
-            display_height = min(int(original_height * ratio), window_height - 50)
-            
-            img = img.resize((int(display_width), int(display_height)), Resampling.LANCZOS)
-            photo = ImageTk.PhotoImage(img)
-            
-            # 创建图片标签
-            label = ttk.Label(inner_frame, image=photo)
-            label.image = photo  # 保持引用
-            label.pack()
-            
-            # 更新画布滚动区域
-            inner_frame.update_idletasks()
-            canvas.config(scrollregion=canvas.bbox("all"))
+            # 计算放大比例（最大显示原始大小的1.5倍，但不超过窗口宽度）
+            ratio = min(1.5, (window_width - 50) / original_width)
+            viewer = TiledImageCanvas(self.enlarged_window, pyramid, ratio)
             
             # 显示图片信息
-            info_text = f"图片大小: {original_width}x{original_height}像素  显示大小: {int(display_width)}x{int(display_height)}像素"
-            info_label = ttk.Label(self.enlarged_window, text=info_text, font=("Arial", 10))
+            def info_text():
+                display_width, display_height = viewer.display_size
+                return f"图片大小: {original_width}x{original_height}像素  显示大小: {display_width}x{display_height}像素"
+            info_label = ttk.Label(self.enlarged_window, text=info_text(), font=("Arial", 10))
             info_label.pack(side=tk.BOTTOM, pady=5)
             
             # 添加关闭按钮
@@ -346,34 +404,24 @@ class OCRExtractionApp:
             
             ttk.Label(scale_frame, text="缩放:").pack(side=tk.LEFT)
             
-            # 缩放功能
-            def change_zoom(val):
-                zoom_factor = float(val)
-                new_width = int(original_width * zoom_factor)
-                new_height = int(original_height * zoom_factor)
-                
-                resized_img = img.resize((new_width, new_height), Resampling.LANCZOS)
-                new_photo = ImageTk.PhotoImage(resized_img)
-                
-                label.config(image=new_photo)
-                label.image = new_photo
-                
-                # 更新图片信息
-                info_label.config(text=f"图片大小: {original_width}x{original_height}像素  显示大小: {new_width}x{new_height}像素")
-                
-                # 更新画布滚动区域
-                inner_frame.update_idletasks()
-                canvas.config(scrollregion=canvas.bbox("all"))
+            # 缩放功能：拖动时用快速插值生成可见的块，松开滑块后再高质量生成
+            def change_zoom(val, fast=True):
+                viewer.set_zoom(float(val), fast)
+                info_label.config(text=info_text())
             
             zoom_scale = ttk.Scale(scale_frame, from_=0.5, to=2.0, value=ratio, 
                                    command=change_zoom, length=200, orient=tk.HORIZONTAL)
             zoom_scale.pack(side=tk.LEFT, padx=5)
+            zoom_scale.bind("<ButtonRelease-1>", lambda event: change_zoom(zoom_scale.get(), fast=False))
             
             ttk.Label(scale_frame, text="0.5x").pack(side=tk.LEFT)
             ttk.Label(scale_frame, text="2.0x").pack(side=tk.RIGHT)
             
+            # 画布最后布局，占用其余空间
+            viewer.frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+            
         except Exception as e:
-            label = ttk.Label(inner_frame, text=f"无法加载图片: {str(e)}")
+            label = ttk.Label(self.enlarged_window, text=f"无法加载图片: {str(e)}")
             label.pack(padx=20, pady=20)
     
     def start_ocr_process(self):
@@ -386,107 +434,125 @@ class OCRExtractionApp:
             messagebox.showinfo("Info", "正在处理中，请等待...")
             return
         
+        # 已取消的上一次识别仍在完成当前阶段（模型推理无法中途打断），不能与新的识别同时使用模型
+        if self.ocr_thread and self.ocr_thread.is_alive():
+            messagebox.showinfo("Info", "正在停止上一次识别，请稍候...")
+            return
+        
         # 开始处理
         self.is_processing = True
+        self.cancel_token = CancelToken()
         self.progress_var.set(0)
         self.status_var.set("正在进行OCR识别...")
         
-        # 启动OCR处理线程
-        self.ocr_thread = threading.Thread(target=self.run_ocr_process)
+        # 启动OCR处理线程，进度条由处理过程中的事件驱动
+        self.ui.start()
+        self.ocr_thread = threading.Thread(target=self.run_ocr_process, args=(self.cancel_token,))
         self.ocr_thread.daemon = True
         self.ocr_thread.start()
-        
-        # 启动进度条更新
-        self.update_progress()
     
-    def update_progress(self):
-        """更新进度条"""
-        if self.is_processing:
-            if self.progress_var.get() < 90:
-                # 在处理过程中，逐渐增加进度条的值
-                self.progress_var.set(self.progress_var.get() + 1)
-            
-            # 继续更新进度条
-            self.root.after(200, self.update_progress)
+    def on_progress(self, event):
+        """处理线程的进度事件，转到主线程更新进度条和状态栏"""
+        def update():
+            if not self.is_processing:
+                return
+            self.progress_var.set(event.fraction * 100)
+            self.status_var.set(f"正在进行OCR识别... {STAGE_LABELS[event.stage]}")
+        self.ui.post(update)
     
-    def run_ocr_process(self):
-        """运行OCR处理流程"""
+    def run_ocr_process(self, cancel_token=None):
+        """运行OCR处理流程（处理线程），cancel_token被取消后在下一个阶段开始前停止
+
+        本方法及其调用的方法不直接操作Tk控件，界面更新都通过self.ui交给主线程
+        """
+        started = time.perf_counter()
         try:
             # 检查文件是否存在
             if not os.path.exists(self.image_path):
-                messagebox.showerror("错误", f"文件不存在: {self.image_path}")
+                self.ui.post(messagebox.showerror, "错误", f"文件不存在: {self.image_path}")
                 return
 
-            # 读取图像文件
-            image = cv2.imread(self.image_path)
-            if image is None:
-                messagebox.showerror("错误", f"无法读取图像: {self.image_path}")
+            # 读取图像文件（通常在选择图片时已预读取），各阶段耗时记入trace，阶段结束时更新进度条
+            progress = ProgressTracker(1, self.on_progress)
+            trace = StageTrace(self.image_path, progress.trace_callback, cancel_token)
+            prefetched = self.take_prefetched_image(self.image_path)
+            prefetched.record_to(trace)
+            from ocr_engine import ImageReadError
+            if isinstance(prefetched.error, ImageReadError):
+                self.ui.post(messagebox.showerror, "错误", str(prefetched.error))
                 return
+            if prefetched.error is not None:
+                raise prefetched.error
+            image_bytes, image = prefetched.image_bytes, prefetched.image
 
             # 添加输出内容
-            self.text_output.delete(1.0, tk.END)
-            self.text_output.insert(tk.END, f"正在处理图像: {self.image_path}\n")
+            self.ui.post(self.text_output.delete, 1.0, tk.END)
+            self.ui.log(f"正在处理图像: {self.image_path}\n")
 
             # 设置OCR信息
             self.ocr_data = {}
             self.extracted_data = {}
+            self.ocr_frame = None
+            self.ocr_result_preview = None
+            self.ocr_result_id += 1
+            self.ocr_result_image = None
             
             # 初始化OCR模型
-            if not self.init_ocr_model():
-                self.is_processing = False
-                self.status_var.set("OCR模型加载失败")
+            with trace.stage('load_model'):
+                model_ready = self.init_ocr_model()
+            if not model_ready:
+                self.ui.post(self.status_var.set, "OCR模型加载失败")
                 return
 
             # 运行OCR识别
-            result = self.ocr_model.ocr(image, cls=True)
-            
-            if not result or len(result) == 0 or len(result[0]) == 0:
-                self.text_output.insert(tk.END, "未检测到任何文本\n")
+            ocr_result = self.ocr_engine.recognize(image, self.image_path, image_bytes, trace)
+            if ocr_result is None:
+                self.ui.log("未检测到任何文本\n")
+                progress.image_finished(trace, 'empty')
                 return
-                
-            dt_boxes = []
-            rec_res = []
-            
-            # 提取检测框和识别结果
-            for line in result[0]:
-                dt_boxes.append(np.array(line[0]))
-                rec_res.append(line[1])
-                
-            texts = [text[0] for text in rec_res]
-            scores = [text[1] for text in rec_res]
-            
-            # 将四点坐标转换为矩形边界框格式 [x_min, y_min, x_max, y_max]
-            rect_boxes = []
-            for box in dt_boxes:
-                x_min = min(box[:, 0])
-                y_min = min(box[:, 1])
-                x_max = max(box[:, 0])
-                y_max = max(box[:, 1])
-                rect_boxes.append([x_min, y_min, x_max, y_max])
             
             # 保存OCR结果
-            self.ocr_data = {
-                'image_path': self.image_path,
-                'image_size': image.shape,
-                'rec_texts': texts,
-                'rec_scores': scores,
-                'rec_boxes': rect_boxes  # 使用转换后的矩形边界框
-            }
+            self.ocr_data = ocr_result.to_ocr_data()
             
-            # 提取数据
-            self.extract_all_data()
+            # 提取数据，结果图直接在已解码的图像上绘制
+            if not self.extract_all_data(image, trace):
+                return
             
             # 显示结果
-            self.show_results()
+            if cancel_token is not None:
+                cancel_token.check()
+            progress.image_finished(trace, 'ok')
+            self.ui.post(self.show_results)
             
             # 添加日志输出
-            self.text_output.insert(tk.END, "OCR处理完成\n")
-            
+            timings = "，".join(f"{name} {total['wall_ms']:.0f}ms" for name, total in trace.totals().items())
+            self.ui.log(f"各阶段耗时: {timings}\n")
+            self.ui.log("OCR处理完成\n")
+            if not self.first_result_reported:
+                self.first_result_reported = True
+                now = time.perf_counter()
+                message = f"首次识别结果耗时: 点击识别后 {now - started:.2f}s，启动后 {now - STARTUP_TIME:.1f}s\n"
+                print(message, end="")
+                self.ui.log(message)
+            self.ui.post(self.update_ui_after_ocr)
+            
+        except OperationCancelled:
+            self.ui.log("OCR处理已取消\n")
         except Exception as e:
             error_message = f"OCR处理出错: {str(e)}"
-            self.text_output.insert(tk.END, error_message + "\n")
+            self.ui.log(error_message + "\n")
             traceback.print_exc()
-            messagebox.showerror("错误", error_message)
+            self.ui.post(messagebox.showerror, "错误", error_message)
+        finally:
+            self.ui.post(self.finish_ocr_process)
+    
+    def finish_ocr_process(self):
+        """处理线程结束后在主线程中复位状态（包括未检测到文本、出错等提前结束的情况）"""
+        if self.is_processing:
+            self.is_processing = False
+            if self.progress_var.get() < 100:
+                self.status_var.set("就绪")
+        self.ui.stop()
     
     def show_results(self):
         """显示OCR结果并更新UI"""
@@ -502,7 +568,7 @@ class OCRExtractionApp:
             self.update_ui()
             
             # 显示OCR结果图像
-            if self.ocr_result_image and os.path.exists(self.ocr_result_image):
+            if self.ocr_result_preview is not None:
                 self.show_image("ocr_result")
             
             # 日志输出
@@ -523,420 +589,176 @@ class OCRExtractionApp:
     def cancel_ocr_process(self):
         """取消OCR处理过程"""
         if self.is_processing and self.ocr_thread:
+            # 处理线程在下一个阶段开始前停止，不再继续提取和生成结果图
+            self.cancel_token.cancel()
             self.is_processing = False
             self.status_var.set("已取消")
             self.progress_var.set(0)
             messagebox.showinfo("Info", "OCR处理已取消")
     
-    def extract_recipe(self):
-        """提取Recipe字段值"""
-        try:
-            # 使用坐标位置查找Recipe值
-            if self.ocr_data:
-                texts = self.ocr_data.get('rec_texts', [])
-                boxes = self.ocr_data.get('rec_boxes', [])
-                
-                # Recipe字段值的位置约为[193, 71, 297, 95]
-                recipe_val = ""
-                
-                # 打印所有文本框的位置，用于调试
-                print("所有文本框位置:")
-                for i, (text, box) in enumerate(zip(texts, boxes)):
-                    print(f"{i}: {text} - {box}")
-                
-                # 查找位于Recipe值位置附近的文本
-                for i, (text, box) in enumerate(zip(texts, boxes)):
-                    if box and len(box) == 4:
-                        # 边界框已经是[x_min, y_min, x_max, y_max]格式
-                        x_min = box[0]
-                        y_min = box[1]
-                        x_max = box[2]
-                        y_max = box[3]
-                        
-                        # 检查位置是否接近[193, 71, 297, 95]
-                        if (190 <= x_min <= 200 and 65 <= y_min <= 75 and 
-                            240 <= x_max <= 280 and 90 <= y_max <= 100):
-                            recipe_val = text
-                            print(f"找到Recipe值: {text}, 位置: {box}")
-                            break
-                
-                # 如果找到了值，保存它
-                if recipe_val:
-                    self.extracted_data['recipe'] = recipe_val
-                    return
-                
-                # 更直接的方法：直接查找NOMAL_CR
-                for i, (text, box) in enumerate(zip(texts, boxes)):
-                    if text == "NOMAL_CR":
-                        recipe_val = text
-                        print(f"直接找到Recipe值: {text}, 位置: {box}")
-                        self.extracted_data['recipe'] = recipe_val
-                        return
-                    
-                # 备选方法：查找Recipe标签，然后获取附近的文本
-                recipe_index = -1
-                for i, text in enumerate(texts):
-                    if text == "Recipe":
-                        recipe_index = i
-                        print(f"找到Recipe标签，索引: {recipe_index}")
-                        if i+1 < len(texts) and len(boxes) > i+1:
-                            # 获取标签右侧文本的x坐标
-                            x_min = boxes[i+1][0]  # 矩形边界框的x_min位于索引0
-                            if 180 <= x_min <= 200:  # 检查下一个文本是否在正确位置
-                                recipe_val = texts[i+1]
-                                print(f"通过标签找到Recipe值: {recipe_val}")
-                                self.extracted_data['recipe'] = recipe_val
-                                return
-                
-            # 未找到，使用用户提供的值
-            self.extracted_data['recipe'] = "NOMAL_CR"
-            print("使用默认值NOMAL_CR")
-        except Exception as e:
-            print(f"提取Recipe时发生错误: {str(e)}")
-            self.extracted_data['recipe'] = "NOMAL_CR"
-    
-    def extract_badge_number(self):
-        """提取BadgeNo.字段值"""
+    def extract_all_data(self, image, trace=NULL_TRACE):
+        """提取所有字段数据，包括Recipe、BadgeNo.和表格数据，成功时返回True"""
         try:
-            # 使用坐标位置查找BadgeNo.值
-            if self.ocr_data:
-                texts = self.ocr_data.get('rec_texts', [])
-                boxes = self.ocr_data.get('rec_boxes', [])
-                
-                # BadgeNo.字段值的位置约为[192,110,345,132]
-                badge_val = ""
-                
-                # 查找位于BadgeNo.值位置附近的文本
-                for i, (text, box) in enumerate(zip(texts, boxes)):
-                    if box and len(box) == 4:
-                        # 边界框已经是[x_min, y_min, x_max, y_max]格式
-                        x_min = box[0]
-                        y_min = box[1]
-                        x_max = box[2]
-                        y_max = box[3]
-                        
-                        # 检查位置是否接近[192,110,345,132]
-                        if (185 <= x_min <= 200 and 105 <= y_min <= 115 and 
-                            340 <= x_max <= 350 and 125 <= y_max <= 135):
-                            badge_val = text
-                            print(f"找到BadgeNo.值: {text}, 位置: {box}")
-                            break
-                
-                # 如果找到了值，保存它
-                if badge_val:
-                    self.extracted_data['badge_number'] = badge_val
-                    return
-            
-                # 备选方法：查找BadgeNo.标签，然后获取附近的文本
-                badge_index = -1
-                for i, text in enumerate(texts):
-                    if text == "BadgeNo.":
-                        badge_index = i
-                        print(f"找到BadgeNo.标签，索引: {badge_index}")
-                        break
-                
-                if badge_index >= 0 and badge_index + 1 < len(texts):
-                    # 找到BadgeNo.标签右侧的文本
-                    badge_val = texts[badge_index + 1]
-                    print(f"通过标签找到BadgeNo.值: {badge_val}")
-                    self.extracted_data['badge_number'] = badge_val
-                    return
-            
-            # 未找到，设为固定值，确保程序不会出错
-            self.extracted_data['badge_number'] = "SV2-250113-0370"
-            print("无法找到BadgeNo.值，使用默认值")
-        except Exception as e:
-            print(f"提取BadgeNo.时发生错误: {str(e)}")
-            self.extracted_data['badge_number'] = "SV2-250113-0370"
-    
-    def extract_table_data(self):
-        """基于位置信息提取表格数据"""
-        try:
-            table_data = []
-            
-            if self.ocr_data:
-                texts = self.ocr_data.get('rec_texts', [])
-                boxes = self.ocr_data.get('rec_boxes', [])
-                
-                print("所有OCR识别文本:")
-                for i, (text, box) in enumerate(zip(texts, boxes)):
-                    print(f"{i}: {text} - {box}")
-                
-                # 定义表格列的精确坐标范围
-                min_col_range = {
-                    'x_min': (998, 1002),
-                    'x_max': (1030, 1039),
-                    'y_min': (214, 335),
-                    'y_max': (236, 354)
-                }
-                
-                max_col_range = {
-                    'x_min': (1047, 1056),
-                    'x_max': (1080, 1090),
-                    'y_min': (213, 333),
-                    'y_max': (230, 356)
-                }
-                
-                count_col_range = {
-                    'x_min': (1119, 1131),
-                    'x_max': (1139, 1149),
-                    'y_min': (214, 335),
-                    'y_max': (230, 355)
-                }
-                
-                # 查找表格中的所有值（基于精确的坐标范围）
-                min_values = []
-                max_values = []
-                count_values = []
-                
-                # 收集所有列的值
-                for i, (text, box) in enumerate(zip(texts, boxes)):
-                    if not box or len(box) != 4:
-                        continue
-                        
-                    # 直接使用边界框，因为已经是[x_min, y_min, x_max, y_max]格式
-                    x_min = box[0]
-                    y_min = box[1]
-                    x_max = box[2]
-                    y_max = box[3]
-                    
-                    # 检查是否在Min列范围内
-                    if (min_col_range['x_min'][0] <= x_min <= min_col_range['x_min'][1] and
-                        min_col_range['x_max'][0] <= x_max <= min_col_range['x_max'][1] and
-                        min_col_range['y_min'][0] <= y_min <= min_col_range['y_min'][1] and
-                        min_col_range['y_max'][0] <= y_max <= min_col_range['y_max'][1]):
-                        min_values.append((text, (y_min + y_max) / 2, i))
-                        print(f"找到Min值: {text}, 位置: {box}, y_center: {(y_min + y_max) / 2}")
-                    
-                    # 检查是否在Max列范围内
-                    elif (max_col_range['x_min'][0] <= x_min <= max_col_range['x_min'][1] and
-                          min(max_col_range['x_max'][0], max_col_range['x_max'][1]) <= x_max <= max(max_col_range['x_max'][0], max_col_range['x_max'][1]) and
-                          max_col_range['y_min'][0] <= y_min <= max_col_range['y_min'][1] and
-                          max_col_range['y_max'][0] <= y_max <= max_col_range['y_max'][1]):
-                        max_values.append((text, (y_min + y_max) / 2, i))
-                        print(f"找到Max值: {text}, 位置: {box}, y_center: {(y_min + y_max) / 2}")
-                    
-                    # 检查是否在Count列范围内
-                    elif (count_col_range['x_min'][0] <= x_min <= count_col_range['x_min'][1] and
-                          count_col_range['x_max'][0] <= x_max <= count_col_range['x_max'][1] and
-                          count_col_range['y_min'][0] <= y_min <= count_col_range['y_min'][1] and
-                          count_col_range['y_max'][0] <= y_max <= count_col_range['y_max'][1]):
-                        count_values.append((text, (y_min + y_max) / 2, i))
-                        print(f"找到Count值: {text}, 位置: {box}, y_center: {(y_min + y_max) / 2}")
-                
-                # 按y坐标排序
-                min_values.sort(key=lambda x: x[1])
-                max_values.sort(key=lambda x: x[1])
-                count_values.sort(key=lambda x: x[1])
-                
-                print(f"排序后的Min值: {min_values}")
-                print(f"排序后的Max值: {max_values}")
-                print(f"排序后的Count值: {count_values}")
-                
-                # 根据Min值创建行数据（因为Min值通常是完整的）
-                for min_text, min_y, min_idx in min_values:
-                    # 查找最接近的Max值
-                    closest_max = None
-                    min_max_distance = float('inf')
-                    for max_text, max_y, max_idx in max_values:
-                        distance = abs(min_y - max_y)
-                        if distance < min_max_distance:
-                            min_max_distance = distance
-                            closest_max = max_text
-                    
-                    # 查找最接近的Count值
-                    closest_count = None
-                    min_count_distance = float('inf')
-                    for count_text, count_y, count_idx in count_values:
-                        distance = abs(min_y - count_y)
-                        if distance < min_count_distance:
-                            min_count_distance = distance
-                            closest_count = count_text
-                    
-                    # 如果同一行找不到值，使用合理的默认值
-                    if not closest_max:
-                        if min_text == "0.100":
-                            closest_max = "0.200"
-                        elif min_text == "0.200":
-                            closest_max = "0.300"
-                        elif min_text == "0.300":
-                            closest_max = "1.000"
-                        elif min_text == "1.000":
-                            closest_max = "2.000"
-                        elif min_text == "2.000":
-                            closest_max = "3.000"
-                        elif min_text == "3.000":
-                            closest_max = "Max"
-                    
-                    if not closest_count:
-                        closest_count = "0"  # 默认值
-                        
-                        # 根据Min值设置合理的Count值
-                        if min_text == "0.100":
-                            closest_count = "0"  # 第1行
-                        elif min_text == "0.200":
-                            closest_count = "6"  # 第2行
-                        elif min_text == "0.300":
-                            closest_count = "12"  # 第3行
-                        elif min_text == "1.000":
-                            closest_count = "3"  # 第4行
-                        elif min_text == "2.000":
-                            closest_count = "0"  # 第5行
-                        elif min_text == "3.000":
-                            closest_count = "1"  # 第6行
-                    
-                    # 添加到表格数据
-                    table_data.append({
-                        "min": min_text,
-                        "max": closest_max,
-                        "count": closest_count
-                    })
-                
-                # 如果表格数据不完整，确保有6行数据
-                expected_mins = ["0.100", "0.200", "0.300", "1.000", "2.000", "3.000"]
-                existing_mins = [row["min"] for row in table_data]
-                
-                for expected_min in expected_mins:
-                    if expected_min not in existing_mins:
-                        # 为缺失的行添加合理的数据
-                        if expected_min == "0.100":
-                            table_data.append({"min": "0.100", "max": "0.200", "count": "0"})
-                        elif expected_min == "0.200":
-                            table_data.append({"min": "0.200", "max": "0.300", "count": "6"})
-                        elif expected_min == "0.300":
-                            table_data.append({"min": "0.300", "max": "1.000", "count": "12"})
-                        elif expected_min == "1.000":
-                            table_data.append({"min": "1.000", "max": "2.000", "count": "3"})
-                        elif expected_min == "2.000":
-                            table_data.append({"min": "2.000", "max": "3.000", "count": "0"})
-                        elif expected_min == "3.000":
-                            table_data.append({"min": "3.000", "max": "Max", "count": "1"})
-            
-            # 按照Min值排序表格数据
-            def sort_key(row):
-                min_val = row["min"]
-                try:
-                    return float(min_val)
-                except ValueError:
-                    return float('inf')  # 非数字值放在最后
-                
-            table_data.sort(key=sort_key)
-            
-            # 打印最终提取的表格数据
-            print("最终提取的表格数据:")
-            for row in table_data:
-                print(f"Min: {row['min']}, Max: {row['max']}, Count: {row['count']}")
-            
-            # 更新提取的数据
-            self.extracted_data['table'] = table_data
-            
-        except Exception as e:
-            import traceback
-            print(f"提取表格数据时发生错误: {str(e)}")
-            print(traceback.format_exc())  # 打印完整的堆栈跟踪
-            
-            # 使用样例中的表格数据
-            self.extracted_data['table'] = [
-            {"min": "0.100", "max": "0.200", "count": "0"},
-            {"min": "0.200", "max": "0.300", "count": "6"},
-                {"min": "0.300", "max": "1.000", "count": "12"},
-                {"min": "1.000", "max": "2.000", "count": "3"},
-            {"min": "2.000", "max": "3.000", "count": "0"},
-            {"min": "3.000", "max": "Max", "count": "1"}
-        ]
-    
-    def extract_all_data(self):
-        """提取所有字段数据，包括Recipe、BadgeNo.和表格数据"""
-        try:
-            self.text_output.insert(tk.END, "开始提取数据字段...\n")
-            
-            # 提取Recipe值
-            self.extract_recipe()
-            self.text_output.insert(tk.END, f"提取Recipe: {self.extracted_data.get('recipe', '未找到')}\n")
-            
-            # 提取BadgeNo.值
-            self.extract_badge_number()
-            self.text_output.insert(tk.END, f"提取BadgeNo.: {self.extracted_data.get('badge_number', '未找到')}\n")
-            
-            # 提取Time值（如果有实现此方法）
-            if hasattr(self, 'extract_time') and callable(getattr(self, 'extract_time')):
-                self.extract_time()
-                self.text_output.insert(tk.END, f"提取Time: {self.extracted_data.get('time', '未找到')}\n")
-            
-            # 提取表格数据
-            self.extract_table_data()
-            self.text_output.insert(tk.END, f"提取表格数据: {len(self.extracted_data.get('table', []))}行\n")
+            self.ui.log("开始提取数据字段...\n")
+            
+            # 提取Recipe、BadgeNo.、Time和表格数据
+            with trace.stage('extract'):
+                from ocr_extraction_core import OCRResult, extract_all
+                result = extract_all(OCRResult.from_ocr_data(self.ocr_data))
+                self.extracted_data = result.to_dict()
+            self.ui.log(f"提取Recipe: {self.extracted_data.get('recipe', '未找到')}\n")
+            self.ui.log(f"提取BadgeNo.: {self.extracted_data.get('badge_number', '未找到')}\n")
+            self.ui.log(f"提取Time: {self.extracted_data.get('time', '未找到')}\n")
+            self.ui.log(f"提取表格数据: {len(self.extracted_data.get('table', []))}行\n")
+            
+            # 重新识别后置信度仍然偏低的值需要人工核对
+            threshold = self.ocr_engine.options.refine_threshold
+            low_confidence = result.low_confidence(threshold) if threshold else []
+            if low_confidence:
+                self.ui.log(f"以下值的识别置信度低于{threshold}，请核对: {', '.join(low_confidence)}\n")
             
             # 生成OCR结果图像
-            self.generate_ocr_result_image()
-            
-            # 更新UI
-            self.root.after(0, self.update_ui_after_ocr)
+            with trace.stage('render'):
+                self.generate_ocr_result_image(image)
+            return True
             
         except Exception as e:
             error_message = f"提取数据时发生错误: {str(e)}"
-            self.text_output.insert(tk.END, error_message + "\n")
+            self.ui.log(error_message + "\n")
             traceback.print_exc()
-            messagebox.showerror("错误", error_message)
+            self.ui.post(messagebox.showerror, "错误", error_message)
+            return False
     
-    def generate_ocr_result_image(self):
-        """生成OCR结果图像，显示检测到的文本框和识别的文字"""
+    def generate_ocr_result_image(self, image):
+        """生成OCR结果预览图，显示检测到的文本框和识别的文字
+
+        在识别时已解码的图像上先缩小再绘制，不复制原图也不写文件；保留该图像，
+        放大查看或保存时再按原尺寸绘制
+        """
         try:
-            if not self.ocr_data or not self.image_path:
+            if not self.ocr_data or image is None:
                 return
             
-            # 读取原始图像
-            image = cv2.imread(self.image_path)
-            if image is None:
-                print(f"无法读取图像文件: {self.image_path}")
-                return
-            
-            # 创建图像副本
-            result_image = image.copy()
-            
-            # 获取OCR结果
-            texts = self.ocr_data.get('rec_texts', [])
-            boxes = self.ocr_data.get('rec_boxes', [])
-            
-            # 在图像上绘制检测框和文本
-            for text, box in zip(texts, boxes):
-                if box and len(box) == 4:
-                    # 使用矩形边界框 [x_min, y_min, x_max, y_max]
-                    x_min, y_min, x_max, y_max = map(int, box)
-                    
-                    # 绘制矩形框
-                    cv2.rectangle(result_image, (x_min, y_min), (x_max, y_max), (0, 0, 255), 2)
-                    
-                    # 设置文字显示位置和参数
-                    text_position = (x_min, y_min - 10)
-                    font = cv2.FONT_HERSHEY_SIMPLEX
-                    font_scale = 0.5
-                    font_thickness = 1
-                    
-                    # 绘制文字底色（提高可读性）
-                    text_size, _ = cv2.getTextSize(text, font, font_scale, font_thickness)
-                    cv2.rectangle(result_image, 
-                                 (text_position[0], text_position[1] - text_size[1]),
-                                 (text_position[0] + text_size[0], text_position[1] + 5),
-                                 (255, 255, 255), -1)
-                    
-                    # 显示文字
-                    cv2.putText(result_image, text, text_position, font, font_scale, (0, 0, 255), font_thickness)
-            
-            # 保存结果图像
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            filename = f"ocr_result_{timestamp}.jpg"
-            output_path = os.path.join(self.output_dir, filename)
-            cv2.imwrite(output_path, result_image)
-            
-            # 保存路径用于显示
-            self.ocr_result_image = output_path
-            self.text_output.insert(tk.END, f"OCR结果图像已保存: {output_path}\n")
+            import cv2
+            from ocr_render import render_preview
+            self.ocr_frame = image
+            preview = render_preview(image, self.ocr_data.get('rec_texts', []),
+                                     self.ocr_data.get('rec_boxes', []), self.get_render_options().preview_max_side)
+            self.ocr_result_preview = Image.fromarray(cv2.cvtColor(preview, cv2.COLOR_BGR2RGB))
             
         except Exception as e:
             print(f"生成OCR结果图像时出错: {str(e)}")
             traceback.print_exc()
     
+    def get_render_options(self):
+        """结果图参数，第一次使用时从输出目录读取保存的设置（ocr_render依赖cv2，在此处才导入）"""
+        if self.render_options is None:
+            from ocr_render import RENDER_SETTINGS_FILE, load_render_options
+            self.render_options = load_render_options(os.path.join(self.output_dir, RENDER_SETTINGS_FILE))
+        return self.render_options
+    
+    def edit_render_options(self):
+        """打开设置窗口，修改预览图尺寸和保存结果图的格式、质量，保存后下次启动仍然有效"""
+        from ocr_render import RENDER_FORMATS, RENDER_SETTINGS_FILE, RenderOptions, save_render_options
+        current = self.get_render_options()
+        
+        settings_window = tk.Toplevel(self.root)
+        settings_window.title("结果图设置")
+        settings_window.resizable(False, False)
+        settings_window.grab_set()  # 模态窗口
+        
+        settings_frame = ttk.Frame(settings_window, padding="10")
+        settings_frame.pack(fill=tk.BOTH, expand=True)
+        
+        side_var = tk.StringVar(value=str(current.preview_max_side))
+        format_var = tk.StringVar(value=current.format)
+        quality_var = tk.StringVar(value=str(current.quality))
+        
+        ttk.Label(settings_frame, text="预览图长边（像素，0为原尺寸）").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Spinbox(settings_frame, textvariable=side_var, from_=0, to=10000, increment=100,
+                    width=10).grid(row=0, column=1, padx=5, pady=5)
+        ttk.Label(settings_frame, text="保存格式").grid(row=1, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Combobox(settings_frame, textvariable=format_var, values=list(RENDER_FORMATS), state="readonly",
+                     width=8).grid(row=1, column=1, padx=5, pady=5)
+        ttk.Label(settings_frame, text="JPEG/WebP质量（1-100）").grid(row=2, column=0, sticky=tk.W, padx=5, pady=5)
+        ttk.Spinbox(settings_frame, textvariable=quality_var, from_=1, to=100, increment=5,
+                    width=10).grid(row=2, column=1, padx=5, pady=5)
+        
+        buttons_frame = ttk.Frame(settings_window)
+        buttons_frame.pack(fill=tk.X, pady=10)
+        
+        def save_settings():
+            try:
+                options = RenderOptions(int(side_var.get()), format_var.get(), int(quality_var.get()))
+            except ValueError as e:
+                messagebox.showerror("Error", f"设置无效: {str(e)}", parent=settings_window)
+                return
+            preview_changed = options.preview_max_side != current.preview_max_side
+            self.render_options = options
+            try:
+                os.makedirs(self.output_dir, exist_ok=True)
+                save_render_options(options, os.path.join(self.output_dir, RENDER_SETTINGS_FILE))
+            except OSError as e:
+                self.append_log(f"结果图设置未能保存，仅本次运行有效: {str(e)}\n")
+            settings_window.destroy()
+            # 预览尺寸变化时按新尺寸重新绘制当前结果
+            if preview_changed and self.ocr_frame is not None:
+                self.generate_ocr_result_image(self.ocr_frame)
+                self.ocr_result_id += 1
+                if self.current_image_type == "ocr_result":
+                    self.show_image("ocr_result")
+        
+        def reset_to_default():
+            defaults = RenderOptions()
+            side_var.set(str(defaults.preview_max_side))
+            format_var.set(defaults.format)
+            quality_var.set(str(defaults.quality))
+        
+        ttk.Button(buttons_frame, text="保存", command=save_settings).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(buttons_frame, text="重置为默认值", command=reset_to_default).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(buttons_frame, text="取消", command=settings_window.destroy).pack(side=tk.RIGHT, padx=5)
+    
+    def render_full_result(self):
+        """按原尺寸绘制OCR结果图，返回BGR数组"""
+        from ocr_render import draw_ocr_boxes
+        return draw_ocr_boxes(self.ocr_frame, self.ocr_data.get('rec_texts', []),
+                              self.ocr_data.get('rec_boxes', []))
+    
+    def load_full_result(self):
+        """返回原尺寸的OCR结果PIL图像，用于放大查看"""
+        import cv2
+        return Image.fromarray(cv2.cvtColor(self.render_full_result(), cv2.COLOR_BGR2RGB))
+    
+    def save_ocr_result_image(self):
+        """按原尺寸绘制OCR结果图并保存，格式由文件扩展名决定，质量取自render_options"""
+        if self.ocr_frame is None or not self.ocr_data:
+            messagebox.showerror("Error", "没有OCR结果图片可保存。请先进行识别。")
+            return
+        
+        from ocr_render import RENDER_FORMATS, save_image
+        render_options = self.get_render_options()
+        default_format = render_options.format
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        file_path = filedialog.asksaveasfilename(
+            initialdir=self.output_dir,
+            initialfile=f"ocr_result_{timestamp}.{default_format}",
+            defaultextension=f".{default_format}",
+            filetypes=[("JPEG", "*.jpg *.jpeg"), ("PNG", "*.png"), ("WebP", "*.webp")]
+        )
+        if not file_path:
+            return
+        
+        extension = os.path.splitext(file_path)[1].lower().lstrip('.')
+        image_format = 'jpg' if extension == 'jpeg' else extension
+        if image_format not in RENDER_FORMATS:
+            image_format = default_format
+        try:
+            save_image(file_path, self.render_full_result(), image_format, render_options.quality)
+            self.ocr_result_image = file_path
+            self.append_log(f"OCR结果图像已保存: {file_path}\n")
+        except Exception as e:
+            messagebox.showerror("Error", f"保存结果图片时发生错误: {str(e)}")
+    
     def edit_table_data(self):
         """打开一个编辑窗口让用户手动修改表格数据"""
         if not self.extracted_data or 'table' not in self.extracted_data:
@@ -1049,6 +871,7 @@ class OCRExtractionApp:
 
     def convert_to_rect_box(self, quad_box):
         """将四点坐标转换为矩形边界框格式 [x_min, y_min, x_max, y_max]"""
+        import numpy as np
         points = np.array(quad_box)
         x_min = np.min(points[:, 0])
         y_min = np.min(points[:, 1])
@@ -1056,61 +879,6 @@ class OCRExtractionApp:
         y_max = np.max(points[:, 1])
         return [x_min, y_min, x_max, y_max]
 
-    def extract_time(self):
-        """提取Time字段值"""
-        try:
-            # 使用坐标位置查找Time值
-            if self.ocr_data:
-                texts = self.ocr_data.get('rec_texts', [])
-                boxes = self.ocr_data.get('rec_boxes', [])
-                
-                # Time字段值的位置约为[150, 40, 270, 60]
-                time_val = ""
-                
-                # 查找位于Time值位置附近的文本
-                for i, (text, box) in enumerate(zip(texts, boxes)):
-                    if box and len(box) == 4:  
-                        # 边界框已经是[x_min, y_min, x_max, y_max]格式
-                        x_min = box[0]
-                        y_min = box[1]
-                        x_max = box[2] 
-                        y_max = box[3]
-                        
-                        # 检查是否是看起来像时间的文本（包含:的文本）
-                        if ":" in text and 130 <= x_min <= 170 and 30 <= y_min <= 50:
-                            time_val = text
-                            print(f"找到Time值: {text}, 位置: {box}")
-                            break
-                
-                # 如果找到了值，保存它
-                if time_val:
-                    self.extracted_data['time'] = time_val
-                    return
-                
-                # 备选方法：查找Time标签，然后获取附近的文本
-                time_index = -1
-                for i, text in enumerate(texts):
-                    if text == "Time":
-                        time_index = i
-                        print(f"找到Time标签，索引: {time_index}")
-                        if i+1 < len(texts) and len(boxes) > i+1:
-                            # 获取可能的时间值
-                            next_text = texts[i+1]
-                            if ":" in next_text:
-                                time_val = next_text
-                                print(f"通过标签找到Time值: {time_val}")
-                                self.extracted_data['time'] = time_val
-                                return
-            
-            # 未找到，设为固定值
-            current_time = datetime.now().strftime("%H:%M")
-            self.extracted_data['time'] = current_time
-            print(f"无法找到Time值，使用当前时间: {current_time}")
-        except Exception as e:
-            print(f"提取Time时发生错误: {str(e)}")
-            current_time = datetime.now().strftime("%H:%M")
-            self.extracted_data['time'] = current_time
-
 
 def create_standalone_app():
     """创建一个不依赖PaddleOCR的独立应用，用于显示错误信息"""
@@ -1137,12 +905,17 @@ def create_standalone_app():
 
 
 if __name__ == "__main__":
+    # 打包后的程序在Windows上启动进程池需要此调用
+    multiprocessing.freeze_support()
+
+    # 带参数运行时进入无界面的批量模式
+    if len(sys.argv) > 1:
+        from ocr_batch import run_cli
+        sys.exit(run_cli())
+
     try:
-        # 尝试导入paddle，测试是否能正常工作
-        import paddle
-        paddle.set_device('cpu')
-        
-        # 如果导入成功，启动完整应用
+        # 窗口立即出现，paddle和模型在窗口出现后由后台线程加载（见OCRExtractionApp.start_warm_up），
+        # 加载失败时在界面中提示
         root = tk.Tk()
         app = OCRExtractionApp(root)
         root.mainloop()
@@ -0,0 +1,165 @@
+"""固定版面截图的版面指纹
+
+截图都来自同一台设备的HMI界面，版面相同的截图中文本框的位置几乎不变，对每张图都做整页文本检测是重复劳动，
+而检测是CPU上最耗时的阶段。LayoutCache用缩小灰度图的差值哈希（dHash）识别已经见过的版面，
+命中时直接在记录的文本框位置裁剪文本行送去识别，跳过检测。
+
+界面上的数值、缺陷分布图和柱状图每张都不同，只有静态区域的哈希位可以比较：两张图整页检测出的文本框
+基本重合时认为是同一版面，两者哈希不同的位标记为非静态，之后只比较静态位。
+记录的文本框是该版面第一次整页检测的结果，之后不再扩大，避免框的范围逐渐超出模板的坐标范围。
+文本延伸到记录的框外（例如值变长了）、识别结果中缺少模板要求的标签，或同一版面每命中redetect_every次时，
+回退到整页检测；重新检测的文本框与记录不再重合时丢弃该版面，按新的检测结果重新记录。
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+# dHash的网格边长，哈希共HASH_SIZE*HASH_SIZE位
+HASH_SIZE = 32
+
+# 静态位中不同的位数不超过该比例时认为是同一版面
+MAX_HASH_DISTANCE = 0.05
+
+# 静态位少于该数量时哈希已不足以区分版面，该版面不再直接使用
+MIN_STATIC_BITS = 128
+
+# 两次检测的文本框中能在对方找到重合框的比例都不低于该值时，认为是同一版面
+MIN_BOX_AGREEMENT = 0.7
+
+# 同一版面每命中多少次重新做一次整页检测，确认记录的文本框仍与检测结果重合
+REDETECT_EVERY = 50
+
+# 最多记录的版面数，超过时淘汰最久未使用的
+MAX_LAYOUTS = 16
+
+# 与背景灰度相差超过该值的像素视为文字
+INK_CONTRAST = 64
+
+# 检查文本是否超出框时看框左右外侧各几列像素
+EDGE_COLUMNS = 3
+
+
+def to_gray(image):
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+
+def layout_hash(gray):
+    """返回灰度图的差值哈希（HASH_SIZE*HASH_SIZE的布尔数组），缩小到(HASH_SIZE+1)×HASH_SIZE后比较相邻像素"""
+    small = cv2.resize(gray, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    return (small[:, 1:] > small[:, :-1]).reshape(-1)
+
+
+def text_beyond_box(gray, box):
+    """记录的框左右外侧紧邻的几列中有文字像素时返回True，说明文本比记录的框更长
+
+    只看框高度中间的一半，避免把上下的边框线当作文字
+    """
+    height, width = gray.shape[:2]
+    x0, y0, x1, y1 = (int(round(value)) for value in box)
+    quarter = max(0, (y1 - y0) // 4)
+    top, bottom = max(0, y0 + quarter), min(height, y1 - quarter)
+    inside = gray[max(0, y0):min(height, y1), max(0, x0):min(width, x1)]
+    if inside.size == 0 or bottom <= top:
+        return True
+    background = int(np.median(inside))
+    strips = (gray[top:bottom, max(0, x0 - EDGE_COLUMNS - 1):max(0, x0 - 1)],
+              gray[top:bottom, min(width, x1 + 1):min(width, x1 + EDGE_COLUMNS + 1)])
+    return any(strip.size and np.any(np.abs(strip.astype(np.int16) - background) > INK_CONTRAST)
+               for strip in strips)
+
+
+def _overlap_matrix(first, second):
+    """(K,M)布尔矩阵：first[k]与second[m]在同一行上且水平重叠"""
+    a, b = first[:, None, :], second[None, :, :]
+    overlap = np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1])
+    same_line = overlap >= 0.5 * np.minimum(a[..., 3] - a[..., 1], b[..., 3] - b[..., 1])
+    return same_line & (a[..., 0] <= b[..., 2]) & (b[..., 0] <= a[..., 2])
+
+
+def box_agreement(first, second):
+    """两组框中能在对方找到重合框的比例，取两个方向中较小的一个"""
+    if len(first) == 0 or len(second) == 0:
+        return 0.0
+    matrix = _overlap_matrix(first, second)
+    return min(matrix.any(axis=1).mean(), matrix.any(axis=0).mean())
+
+
+@dataclass
+class Layout:
+    """一个已知版面：图像尺寸、哈希、静态位掩码和记录的文本框(K,4)"""
+    image_size: tuple
+    image_hash: np.ndarray
+    static: np.ndarray
+    boxes: np.ndarray
+    hits: int = 0
+
+    def distance(self, image_hash):
+        """静态位中不同的位所占的比例，静态位太少时返回1"""
+        static_bits = int(np.count_nonzero(self.static))
+        if static_bits < MIN_STATIC_BITS:
+            return 1.0
+        return np.count_nonzero((self.image_hash != image_hash) & self.static) / static_bits
+
+
+class LayoutCache:
+    """进程内的版面记录，只在持有它的OCREngine所在线程中使用"""
+
+    def __init__(self, max_distance=MAX_HASH_DISTANCE, redetect_every=REDETECT_EVERY, max_layouts=MAX_LAYOUTS):
+        self.max_distance = max_distance
+        self.redetect_every = redetect_every
+        self.max_layouts = max_layouts
+        self._layouts = OrderedDict()
+        self._next_id = 0
+
+    def _find(self, image_hash, image_size):
+        best_id, best_distance = None, None
+        for layout_id, layout in self._layouts.items():
+            if layout.image_size != image_size:
+                continue
+            distance = layout.distance(image_hash)
+            if distance <= self.max_distance and (best_distance is None or distance < best_distance):
+                best_id, best_distance = layout_id, distance
+        return best_id
+
+    def match(self, image_hash, image_size):
+        """返回可以直接使用的已知版面；版面未知或到了重新检测的时候返回None"""
+        layout_id = self._find(image_hash, tuple(image_size))
+        if layout_id is None:
+            return None
+        self._layouts.move_to_end(layout_id)
+        layout = self._layouts[layout_id]
+        layout.hits += 1
+        if self.redetect_every and layout.hits % self.redetect_every == 0:
+            return None
+        return layout
+
+    def learn(self, image_hash, image_size, boxes):
+        """记录一次整页检测的文本框(N,4)，已知版面保留第一次记录的框
+
+        哈希不匹配但文本框与某个版面基本重合时，是同一版面上变化的区域使哈希不同，把这些位标记为非静态；
+        哈希匹配但文本框不再重合时，记录已不可信，丢弃后按这次的结果重新记录
+        """
+        image_size = tuple(image_size)
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        if len(boxes) == 0:
+            return
+        layout_id = self._find(image_hash, image_size)
+        if layout_id is not None and box_agreement(self._layouts[layout_id].boxes, boxes) < MIN_BOX_AGREEMENT:
+            del self._layouts[layout_id]
+            layout_id = None
+        elif layout_id is None:
+            for candidate_id, layout in self._layouts.items():
+                if layout.image_size == image_size and box_agreement(layout.boxes, boxes) >= MIN_BOX_AGREEMENT:
+                    layout.static &= layout.image_hash == image_hash
+                    layout_id = candidate_id
+                    break
+        if layout_id is not None:
+            self._layouts.move_to_end(layout_id)
+            return
+        static = np.ones_like(image_hash, dtype=bool)
+        self._layouts[self._next_id] = Layout(image_size, image_hash, static, boxes)
+        self._next_id += 1
+        while len(self._layouts) > self.max_layouts:
+            self._layouts.popitem(last=False)
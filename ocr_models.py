@@ -0,0 +1,140 @@
+"""OCR模型文件的定位和校验
+
+仓库和打包后的程序都在models/whl下带有检测、识别和方向分类模型。resolve_models按OCR语言找到对应的目录，
+校验推理文件齐全后把目录直接交给PaddleOCR，PaddleOCR不再按下载地址查找或下载模型。
+打包后的程序从PyInstaller的_MEIPASS目录读取，不依赖当前工作目录。
+"""
+import hashlib
+import logging
+import os
+import sys
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from importlib import metadata
+
+logger = logging.getLogger(__name__)
+
+# 每个模型目录必须包含的推理文件
+MODEL_FILES = ('inference.pdmodel', 'inference.pdiparams')
+
+# 版本会影响推理结果的库，参与OCR结果缓存键的计算
+INFERENCE_PACKAGES = ('paddleocr', 'paddlepaddle')
+
+# 各语言使用的模型目录（相对models/），与PaddleOCR按lang选择的默认模型一致
+MODEL_LAYOUT = {
+    'en': {
+        'det': 'whl/det/en/en_PP-OCRv3_det_infer',
+        'rec': 'whl/rec/en/en_PP-OCRv4_rec_infer',
+        'cls': 'whl/cls/ch_ppocr_mobile_v2.0_cls_infer',
+    },
+    'ch': {
+        'det': 'whl/det/ch/ch_PP-OCRv4_det_infer',
+        'rec': 'whl/rec/ch/ch_PP-OCRv4_rec_infer',
+        'cls': 'whl/cls/ch_ppocr_mobile_v2.0_cls_infer',
+    },
+}
+
+
+class ModelNotFoundError(ValueError):
+    """本地模型目录不存在或缺少推理文件"""
+
+
+def resource_path(relative_path):
+    """获取资源的绝对路径，兼容开发环境和PyInstaller打包后的环境"""
+    # PyInstaller创建临时文件夹，将路径存储在_MEIPASS中；开发环境使用源码所在目录
+    base_path = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(base_path, relative_path)
+
+
+def models_root():
+    """模型根目录，同时作为PaddleOCR的PADDLE_OCR_BASE_DIR"""
+    return resource_path("models")
+
+
+@dataclass(frozen=True)
+class ModelPaths:
+    """一组本地模型目录，不使用或本地不完整的模型为None（由PaddleOCR自行查找）"""
+    det: str = None
+    rec: str = None
+    cls: str = None
+
+    def as_kwargs(self):
+        """转换为PaddleOCR的构造参数"""
+        kwargs = {'det_model_dir': self.det, 'rec_model_dir': self.rec, 'cls_model_dir': self.cls}
+        return {key: value for key, value in kwargs.items() if value}
+
+
+def missing_model_files(model_dir):
+    """返回模型目录中缺少的推理文件路径"""
+    return [os.path.join(model_dir, name) for name in MODEL_FILES
+            if not os.path.isfile(os.path.join(model_dir, name))]
+
+
+@lru_cache(maxsize=8)
+def resolve_models(lang='en', use_angle_cls=False, root=None):
+    """返回(ModelPaths, 缺少的文件列表)，结果在进程内缓存，每个进程只检查一次文件
+
+    use_angle_cls为False时不需要方向分类模型；缺少推理文件的模型在ModelPaths中为None
+    """
+    if lang not in MODEL_LAYOUT:
+        raise ModelNotFoundError(f"没有语言 {lang} 的本地模型，可用: {', '.join(sorted(MODEL_LAYOUT))}")
+    root = root or models_root()
+    layout = MODEL_LAYOUT[lang]
+    kinds = ('det', 'rec', 'cls') if use_angle_cls else ('det', 'rec')
+
+    paths = {}
+    missing = []
+    for kind in kinds:
+        model_dir = os.path.join(root, layout[kind])
+        missing_files = missing_model_files(model_dir)
+        if missing_files:
+            missing.extend(missing_files)
+        else:
+            paths[kind] = model_dir
+    if missing:
+        logger.warning("本地模型文件不完整，缺少:\n%s", "\n".join(missing))
+    return ModelPaths(**paths), tuple(missing)
+
+
+def local_model_kwargs(lang='en', use_angle_cls=False):
+    """返回指向本地模型的PaddleOCR构造参数
+
+    本地模型不完整时，打包后的程序直接抛出ModelNotFoundError（不应联网下载）；
+    开发环境只传入完整的模型目录，其余由PaddleOCR下载到models目录
+    """
+    paths, missing = resolve_models(lang, use_angle_cls)
+    if missing and getattr(sys, 'frozen', False):
+        raise ModelNotFoundError("本地模型文件不完整，缺少:\n" + "\n".join(missing))
+    return paths.as_kwargs()
+
+
+@lru_cache(maxsize=8)
+def model_digest(model_dir):
+    """模型目录中推理文件内容的sha256摘要，结果在进程内缓存"""
+    digest = hashlib.sha256()
+    for name in MODEL_FILES:
+        with open(os.path.join(model_dir, name), 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def package_version(name):
+    """已安装包的版本，未安装或打包时未带元数据时返回None"""
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def model_fingerprint(lang='en', use_angle_cls=False):
+    """实际使用的模型及推理库的摘要：各本地模型推理文件的内容摘要和paddleocr、paddlepaddle版本
+
+    打包后的程序每次启动可能解压到不同的临时目录、文件修改时间也会变，所以按文件内容而不是路径和时间计算；
+    本地不完整的模型（由PaddleOCR下载）记为None
+    """
+    paths, _ = resolve_models(lang, use_angle_cls)
+    return {
+        'models': {kind: model_digest(path) if path else None for kind, path in asdict(paths).items()},
+        'packages': {name: package_version(name) for name in INFERENCE_PACKAGES},
+    }
@@ -0,0 +1,77 @@
+"""图片的预读取和预解码
+
+图片放在网络共享目录时，读取一张图片的延迟可能和推理相当。iter_prefetched在后台线程中
+提前读取并解码后面的若干张图片，与当前图片的推理重叠；已提交但未取走的图片数不超过depth，
+内存占用有上限。解码后的数组随结果一起交给调用方，后续绘制结果图时直接复用，不再从磁盘读取。
+"""
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from ocr_engine import decode_image, read_image_bytes
+
+# 默认预读取的图片数和读取线程数
+DEFAULT_PREFETCH_DEPTH = 4
+DEFAULT_PREFETCH_THREADS = 2
+
+
+class PrefetchedImage:
+    """预读取的一张图片：文件内容、解码后的数组（未解码时为None）和读取或解码时的异常
+
+    spans为在读取线程中测得的(阶段名, 开始时间戳, 墙钟秒数, CPU秒数)，由record_to记入调用方的trace
+    """
+    __slots__ = ('image_path', 'image_bytes', 'image', 'error', 'spans')
+
+    def __init__(self, image_path):
+        self.image_path = image_path
+        self.image_bytes = None
+        self.image = None
+        self.error = None
+        self.spans = []
+
+    def record_to(self, trace):
+        for span in self.spans:
+            trace.add(*span)
+
+
+def _timed(item, name, func, *args):
+    start_time = time.time()
+    start_wall = time.perf_counter()
+    start_cpu = time.thread_time()
+    result = func(*args)
+    item.spans.append((name, start_time, time.perf_counter() - start_wall, time.thread_time() - start_cpu))
+    return result
+
+
+def load_image(image_path, should_decode=None):
+    """读取并解码一张图片，返回PrefetchedImage，异常放在error中
+
+    should_decode(image_bytes)返回False时只读取不解码，例如结果已在缓存中
+    """
+    item = PrefetchedImage(image_path)
+    try:
+        item.image_bytes = _timed(item, 'read', read_image_bytes, image_path)
+        if should_decode is None or should_decode(item.image_bytes):
+            item.image = _timed(item, 'decode', decode_image, item.image_bytes, image_path)
+    except Exception as e:
+        item.error = e
+    return item
+
+
+def iter_prefetched(image_paths, depth=DEFAULT_PREFETCH_DEPTH, threads=DEFAULT_PREFETCH_THREADS,
+                    should_decode=None):
+    """按输入顺序产出PrefetchedImage，同时在后台读取后面最多depth张图片
+
+    生成器提前关闭（取消或出错）时丢弃排队的读取，不等待正在读取的文件
+    """
+    executor = ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix='ocr-prefetch')
+    pending = deque()
+    try:
+        for image_path in image_paths:
+            pending.append(executor.submit(load_image, image_path, should_decode))
+            if len(pending) > depth:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
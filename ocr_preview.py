@@ -0,0 +1,135 @@
+"""图片查看器使用的多级预览图
+
+大图每次显示或缩放都从原图做LANCZOS缩放会明显卡顿。ImagePyramid把原图逐级减半（Image.reduce，
+按需生成），缩放时从不小于目标尺寸的最近一级开始，只需缩小不到一半；拖动缩放滑块时用快速插值，
+松开后再用高质量插值。PreviewCache按最近使用顺序缓存多张图片的金字塔，总大小超过上限时淘汰最旧的。
+"""
+import os
+from collections import OrderedDict
+
+from PIL import Image
+from PIL.Image import Resampling
+
+# 金字塔最小一级的长边像素数，更小的尺寸直接从这一级缩放
+MIN_LEVEL_SIDE = 256
+
+# 每个金字塔缓存的高质量缩放结果数（界面缩略图、放大窗口的当前缩放等）
+SIZED_CACHE_ENTRIES = 4
+
+# 预览缓存的默认容量
+DEFAULT_PREVIEW_CACHE_BYTES = 384 * 1024 * 1024
+
+
+def image_nbytes(image):
+    """PIL图像解码后占用的内存估计值"""
+    return image.width * image.height * len(image.getbands())
+
+
+class ImagePyramid:
+    """一张图片的多级缩小图，第0级为原图，之后每级边长减半，第一次用到时才生成"""
+
+    def __init__(self, image):
+        if image.mode not in ('RGB', 'RGBA', 'L'):
+            image = image.convert('RGB')
+        self.levels = [image]
+        self._sized = OrderedDict()
+
+    @property
+    def size(self):
+        return self.levels[0].size
+
+    @property
+    def nbytes(self):
+        levels = sum(image_nbytes(level) for level in self.levels)
+        return levels + sum(image_nbytes(image) for image in self._sized.values())
+
+    def level(self, scale):
+        """返回(图像, 该级相对原图的比例)：比例不小于scale的最小一级，scale不小于1时为原图"""
+        index = 0
+        level_scale = 1.0
+        while level_scale / 2 >= scale:
+            if index + 1 >= len(self.levels):
+                current = self.levels[index]
+                if max(current.size) // 2 < MIN_LEVEL_SIDE:
+                    break
+                self.levels.append(current.reduce(2))
+            index += 1
+            level_scale /= 2
+        return self.levels[index], level_scale
+
+    def resized(self, size, fast=False):
+        """缩放到size=(宽, 高)；fast为True时用快速插值且不缓存结果，用于拖动滑块等连续缩放"""
+        width, height = max(1, int(size[0])), max(1, int(size[1]))
+        key = (width, height)
+        if not fast and key in self._sized:
+            self._sized.move_to_end(key)
+            return self._sized[key]
+
+        source, _ = self.level(width / self.size[0])
+        if source.size == key:
+            return source
+        if not fast:
+            resample = Resampling.LANCZOS
+        elif width > source.width:
+            # 放大时插值开销与输出像素数成正比，拖动时直接取最近像素
+            resample = Resampling.NEAREST
+        else:
+            resample = Resampling.BILINEAR
+        result = source.resize(key, resample)
+        if not fast:
+            self._sized[key] = result
+            while len(self._sized) > SIZED_CACHE_ENTRIES:
+                self._sized.popitem(last=False)
+        return result
+
+    def region(self, scale, box, fast=False):
+        """返回按scale缩放后的图像中box=(左, 上, 右, 下)区域，只缩放对应的那部分源图像，用于分块显示"""
+        left, top, right, bottom = box
+        source, level_scale = self.level(scale)
+        factor = level_scale / scale
+        source_box = (left * factor, top * factor,
+                      min(right * factor, source.width), min(bottom * factor, source.height))
+        resample = Resampling.BILINEAR if fast else Resampling.LANCZOS
+        return source.resize((max(1, right - left), max(1, bottom - top)), resample, box=source_box)
+
+
+class PreviewCache:
+    """按键缓存ImagePyramid，总内存超过max_bytes时按最近使用顺序淘汰；只在界面主线程中使用"""
+
+    def __init__(self, max_bytes=DEFAULT_PREVIEW_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._pyramids = OrderedDict()
+
+    def get(self, key, load):
+        """返回key对应的金字塔，未缓存时调用load()取得PIL图像并建立金字塔"""
+        pyramid = self._pyramids.get(key)
+        if pyramid is not None:
+            self._pyramids.move_to_end(key)
+        else:
+            pyramid = ImagePyramid(load())
+            self._pyramids[key] = pyramid
+        self.trim()
+        return pyramid
+
+    def discard(self, key):
+        self._pyramids.pop(key, None)
+
+    def trim(self):
+        """淘汰最久未使用的金字塔，直到总大小不超过上限（最近使用的一个始终保留）"""
+        total = sum(pyramid.nbytes for pyramid in self._pyramids.values())
+        while total > self.max_bytes and len(self._pyramids) > 1:
+            _, pyramid = self._pyramids.popitem(last=False)
+            total -= pyramid.nbytes
+
+
+def file_preview_key(image_path):
+    """图片文件的缓存键，文件被修改后键随之改变"""
+    stat = os.stat(image_path)
+    return ('file', os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size)
+
+
+def load_image_file(image_path):
+    """读取图片文件并完成解码，之后不再持有文件句柄"""
+    with Image.open(image_path) as image:
+        image.load()
+        return image.copy() if image.mode in ('RGB', 'RGBA', 'L') else image.convert('RGB')
@@ -0,0 +1,124 @@
+"""由流程事件驱动的进度报告
+
+每张图片依次经过 decoded -> detected -> recognized -> extracted -> exported 五个事件，
+ProgressTracker根据StageTrace记录的阶段产生这些事件，并计算完成数、吞吐量和预计剩余时间。
+命中缓存的图片跳过解码和推理，在exported时补齐缺少的事件，进度不会停在中途。
+界面进度条和命令行的CliProgressReporter都只是事件的订阅者。
+"""
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+
+# 进度事件，顺序即单张图片的处理顺序
+PROGRESS_STAGES = ('decoded', 'detected', 'recognized', 'extracted', 'exported')
+
+# StageTrace中的阶段名与进度事件的对应关系
+TRACE_STAGE_EVENTS = {
+    'decode': ('decoded',),
+    'detect': ('detected',),
+    'recognize': ('recognized',),
+    'ocr': ('detected', 'recognized'),
+    'roi_ocr': ('detected', 'recognized'),
+    'extract': ('extracted',),
+}
+
+# 界面状态栏中显示的事件名称
+STAGE_LABELS = {
+    'decoded': "已解码",
+    'detected': "已检测文本",
+    'recognized': "已识别文本",
+    'extracted': "已提取字段",
+    'exported': "已完成",
+}
+
+
+@dataclass
+class ProgressEvent:
+    """一次进度更新，throughput单位为张/秒，eta为预计剩余秒数，尚无法估计时为None"""
+    stage: str
+    image_path: str
+    completed: int
+    total: int
+    elapsed: float
+    throughput: float
+    eta: float
+    fraction: float
+    status: str = None
+    counts: dict = field(default_factory=dict)
+
+
+def format_eta(seconds):
+    """将剩余秒数格式化为 mm:ss 或 h:mm:ss"""
+    if seconds is None:
+        return "--:--"
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+class ProgressTracker:
+    """统计各事件的计数并把ProgressEvent交给回调，可在多个线程中调用"""
+
+    def __init__(self, total, callback):
+        self.total = total
+        self.callback = callback
+        self.counts = {stage: 0 for stage in PROGRESS_STAGES}
+        self._reached = {}
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+
+    def trace_callback(self, trace, name):
+        """作为StageTrace的on_stage回调，把完成的阶段转换为进度事件"""
+        for stage in TRACE_STAGE_EVENTS.get(name, ()):
+            self._emit(trace, stage)
+
+    def image_finished(self, trace, status=None):
+        """一张图片的结果已写出：补齐跳过的事件（例如命中缓存）并产生exported事件"""
+        with self._lock:
+            reached = self._reached.get(id(trace), set())
+            missing = [stage for stage in PROGRESS_STAGES[:-1] if stage not in reached]
+        for stage in missing:
+            self._emit(trace, stage)
+        self._emit(trace, 'exported', status)
+
+    def _emit(self, trace, stage, status=None):
+        with self._lock:
+            key = id(trace)
+            reached = self._reached.setdefault(key, set())
+            if stage in reached:
+                return
+            reached.add(stage)
+            self.counts[stage] += 1
+            if stage == 'exported':
+                del self._reached[key]
+
+            completed = self.counts['exported']
+            elapsed = time.perf_counter() - self._start
+            throughput = completed / elapsed if completed and elapsed > 0 else 0.0
+            eta = (self.total - completed) / throughput if throughput else None
+            done_steps = sum(self.counts.values())
+            fraction = min(1.0, done_steps / (len(PROGRESS_STAGES) * self.total)) if self.total else 1.0
+            event = ProgressEvent(stage, trace.image_path, completed, self.total, elapsed,
+                                  throughput, eta, fraction, status, dict(self.counts))
+        self.callback(event)
+
+
+class CliProgressReporter:
+    """命令行进度输出：每写出一张图片打印一行，带吞吐量和预计剩余时间
+
+    打包为窗口程序（--windowed）后以命令行方式运行时sys.stdout为None，此时不输出
+    """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def __call__(self, event):
+        if event.stage != 'exported' or self.stream is None:
+            return
+        self.stream.write(f"[{event.completed}/{event.total}] {event.status}: {event.image_path}"
+                          f"  {event.throughput:.2f} 张/秒，剩余 {format_eta(event.eta)}\n")
+        self.stream.flush()
@@ -0,0 +1,125 @@
+"""在图像上绘制OCR检测框和识别文本，不依赖Tk，界面和基准测试共用
+
+结果图只在需要查看或保存时生成：预览先缩小再绘制，不复制原图；
+保存时按RenderOptions的格式和质量编码。界面中的设置保存在输出目录的render_settings.json中。
+"""
+import json
+from dataclasses import asdict, dataclass, fields
+
+import cv2
+
+# 支持的输出格式及对应的质量参数；PNG为无损格式，不使用quality
+RENDER_FORMATS = {
+    'jpg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY),
+    'png': ('.png', None),
+    'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY),
+}
+
+# PNG使用较快的压缩级别，结果图主要是截图，更高的级别收益很小
+PNG_COMPRESSION = 1
+
+
+# 界面保存结果图参数的文件名（位于输出目录）
+RENDER_SETTINGS_FILE = "render_settings.json"
+
+
+@dataclass
+class RenderOptions:
+    """结果图参数：preview_max_side为预览图长边的像素上限（0为原尺寸），format和quality用于保存"""
+    preview_max_side: int = 1000
+    format: str = 'jpg'
+    quality: int = 90
+
+    def __post_init__(self):
+        if self.preview_max_side < 0:
+            raise ValueError("预览图长边不能为负数")
+        if self.format not in RENDER_FORMATS:
+            raise ValueError(f"不支持的图片格式: {self.format}，可用: {', '.join(RENDER_FORMATS)}")
+        if not 1 <= self.quality <= 100:
+            raise ValueError("图片质量应在1到100之间")
+
+
+def load_render_options(path):
+    """读取保存的结果图参数，文件不存在或内容无效时返回默认值"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        names = {field.name for field in fields(RenderOptions)}
+        return RenderOptions(**{key: value for key, value in data.items() if key in names})
+    except (OSError, ValueError, TypeError, AttributeError):
+        return RenderOptions()
+
+
+def save_render_options(options, path):
+    """把结果图参数写入JSON文件"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(asdict(options), f, indent=2)
+
+
+def draw_ocr_boxes(image, texts, boxes, scale=1.0, copy=True):
+    """绘制检测框和识别文字，boxes为原图坐标的[x_min, y_min, x_max, y_max]列表
+
+    scale为image相对原图的缩放比例；copy为False时直接在image上绘制（image已是缩小后的副本时使用）
+    """
+    result_image = image.copy() if copy else image
+
+    # 文字参数对所有检测框相同
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    font_scale = 0.5
+    font_thickness = 1
+
+    # 在图像上绘制检测框和文本
+    for text, box in zip(texts, boxes):
+        if box is not None and len(box) == 4:
+            # 使用矩形边界框 [x_min, y_min, x_max, y_max]
+            x_min, y_min, x_max, y_max = (int(value * scale) for value in box)
+
+            # 绘制矩形框
+            cv2.rectangle(result_image, (x_min, y_min), (x_max, y_max), (0, 0, 255), 2)
+
+            # 设置文字显示位置
+            text_position = (x_min, y_min - 10)
+
+            # 绘制文字底色（提高可读性）
+            text_size, _ = cv2.getTextSize(text, font, font_scale, font_thickness)
+            cv2.rectangle(result_image,
+                          (text_position[0], text_position[1] - text_size[1]),
+                          (text_position[0] + text_size[0], text_position[1] + 5),
+                          (255, 255, 255), -1)
+
+            # 显示文字
+            cv2.putText(result_image, text, text_position, font, font_scale, (0, 0, 255), font_thickness)
+
+    return result_image
+
+
+def render_preview(image, texts, boxes, max_side=None):
+    """先把图像缩小到长边不超过max_side再绘制，原图不会被修改；max_side为None或图像更小时按原尺寸绘制"""
+    height, width = image.shape[:2]
+    if not max_side or max(height, width) <= max_side:
+        return draw_ocr_boxes(image, texts, boxes)
+    scale = max_side / max(height, width)
+    preview = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                         interpolation=cv2.INTER_AREA)
+    return draw_ocr_boxes(preview, texts, boxes, scale, copy=False)
+
+
+def encode_image(image, image_format='jpg', quality=90):
+    """将图像编码为指定格式的文件内容"""
+    if image_format not in RENDER_FORMATS:
+        raise ValueError(f"不支持的图片格式: {image_format}")
+    extension, quality_flag = RENDER_FORMATS[image_format]
+    if quality_flag is None:
+        params = [cv2.IMWRITE_PNG_COMPRESSION, PNG_COMPRESSION]
+    else:
+        params = [quality_flag, int(quality)]
+    ok, data = cv2.imencode(extension, image, params)
+    if not ok:
+        raise ValueError(f"图片编码失败: {image_format}")
+    return data.tobytes()
+
+
+def save_image(path, image, image_format='jpg', quality=90):
+    """编码后写入文件；不使用cv2.imwrite，路径中含中文时在Windows上也能保存"""
+    with open(path, 'wb') as f:
+        f.write(encode_image(image, image_format, quality))
@@ -0,0 +1,237 @@
+"""本地HTTP字段提取服务
+
+启动时创建进程池并在每个工作进程中加载、预热一次模型，请求延迟不包含任何模型加载开销。
+接口：
+    POST /extract  请求体为图片文件内容；或Content-Type为application/json、
+                   内容为{"image_path": "..."}（需启动时加--allow-local-paths）
+    GET  /health   返回服务状态和当前处理中的请求数
+处理中和排队的请求数超过--max-pending时直接返回503，由调用方稍后重试。
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import sys
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import replace
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from ocr_batch import (add_recognition_arguments, create_worker_pool, process_in_worker, recognition_options,
+                       resolve_parallelism, worker_ready)
+from ocr_cache import DEFAULT_CACHE_DIR
+from ocr_engine import EngineOptions
+from ocr_template import load_template
+
+logger = logging.getLogger(__name__)
+
+# 上传图片的大小上限
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+
+
+class ExtractionService:
+    """常驻的进程池，每个工作进程持有一份已预热的模型"""
+
+    def __init__(self, workers=1, options=None, max_pending=None, allow_local_paths=False):
+        options = options or EngineOptions()
+        # 启动前先编译模板，模板有误时直接报错而不是在每个工作进程里失败
+        load_template(options.template_path)
+        workers, cpu_threads = resolve_parallelism(workers, options.cpu_threads)
+        self.workers = workers
+        self.options = replace(options, cpu_threads=cpu_threads)
+        self.max_pending = max_pending or workers * 2
+        self.allow_local_paths = allow_local_paths
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _create_executor(self):
+        return create_worker_pool(self.workers, self.options, warm_up=True)
+
+    def start(self):
+        """创建进程池并等待所有工作进程完成模型加载和预热"""
+        self._executor = self._create_executor()
+        # 先完成初始化的进程可能连续领走多个worker_pid任务，用屏障确保每个工作进程各执行一个
+        with multiprocessing.Manager() as manager:
+            barrier = manager.Barrier(self.workers)
+            futures = [self._executor.submit(worker_ready, barrier) for _ in range(self.workers)]
+            pids = sorted(future.result() for future in futures)
+        logger.info("已启动%d个工作进程: %s", len(pids), pids)
+
+    def _replace_broken_pool(self, executor):
+        """工作进程异常退出后进程池不再接受任务，关闭它并新建一个；多个请求同时发现时只重建一次"""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            logger.warning("工作进程异常退出，重建进程池")
+            executor.shutdown(wait=False, cancel_futures=True)
+            # 新的工作进程立即启动并开始加载模型，这里不等待完成
+            self._executor = self._create_executor()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def try_submit(self, image_path, image_bytes=None):
+        """提交一张图片，队列已满时返回None；否则返回结果记录（阻塞到处理完成）"""
+        if not self._slots.acquire(blocking=False):
+            return None
+        with self._lock:
+            self._in_flight += 1
+        executor = self._executor
+        try:
+            record, _ = executor.submit(process_in_worker, image_path, image_bytes).result()
+            return record
+        except BrokenProcessPool:
+            self._replace_broken_pool(executor)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+            self._slots.release()
+
+
+class ExtractionRequestHandler(BaseHTTPRequestHandler):
+    """处理/extract和/health请求，server.service为ExtractionService"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send_json(HTTPStatus.NOT_FOUND, {'error': "未知的接口"})
+            return
+        service = self.server.service
+        self._send_json(HTTPStatus.OK, {
+            'status': 'ok',
+            'workers': service.workers,
+            'in_flight': service.in_flight,
+            'max_pending': service.max_pending,
+        })
+
+    def do_POST(self):
+        if self.path != "/extract":
+            self._send_json(HTTPStatus.NOT_FOUND, {'error': "未知的接口"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._send_json(HTTPStatus.BAD_REQUEST, {'error': "Content-Length无效"})
+            self.close_connection = True
+            return
+        if length == 0:
+            self._send_json(HTTPStatus.BAD_REQUEST, {'error': "请求体为空"})
+            return
+        if length > MAX_UPLOAD_BYTES:
+            self._send_json(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': "图片过大"})
+            self.close_connection = True
+            return
+        body = self.rfile.read(length)
+
+        service = self.server.service
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip()
+        if content_type == "application/json":
+            if not service.allow_local_paths:
+                self._send_json(HTTPStatus.FORBIDDEN, {'error': "服务未开启本地路径模式（--allow-local-paths）"})
+                return
+            try:
+                image_path = json.loads(body)['image_path']
+            except (ValueError, KeyError, TypeError):
+                self._send_json(HTTPStatus.BAD_REQUEST, {'error': "JSON请求体需要包含image_path"})
+                return
+            image_bytes = None
+        else:
+            image_path = self.headers.get("X-Image-Name", "upload")
+            image_bytes = body
+
+        try:
+            record = service.try_submit(image_path, image_bytes)
+        except BrokenProcessPool:
+            logger.exception("工作进程异常退出")
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {'error': "工作进程异常退出，进程池已重建，请重试"})
+            return
+        if record is None:
+            self._send_json(HTTPStatus.SERVICE_UNAVAILABLE, {'error': "服务繁忙，请稍后重试"},
+                            headers={"Retry-After": "1"})
+            return
+
+        status = HTTPStatus.OK if record['status'] in ('ok', 'empty') else HTTPStatus.UNPROCESSABLE_ENTITY
+        self._send_json(status, record)
+
+
+def serve(host, port, service):
+    """启动服务并阻塞直到收到Ctrl+C"""
+    service.start()
+    server = ThreadingHTTPServer((host, port), ExtractionRequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    print(f"OCR提取服务已启动: http://{host}:{port}/extract （{service.workers}个工作进程）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+def run_cli(argv=None):
+    """命令行服务模式入口"""
+    parser = argparse.ArgumentParser(description="Glory OCR 字段提取HTTP服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址，默认只接受本机连接")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="工作进程数，每个进程常驻一份模型；0表示按CPU核数自动选择")
+    parser.add_argument("--cpu-threads", type=int, default=None,
+                        help="每个进程的Paddle推理线程数，默认按 CPU核数/进程数 分配")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="处理中和排队的请求上限，超过时返回503，默认为进程数的2倍")
+    parser.add_argument("--template", help="表单模板文件（YAML/JSON），默认使用form_template.yaml")
+    parser.add_argument("--roi", action="store_true", help="只识别模板中声明的ROI区域")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="OCR结果缓存目录")
+    parser.add_argument("--cache-size-mb", type=int, default=512, help="OCR结果缓存的容量上限（MB）")
+    parser.add_argument("--no-cache", action="store_true", help="不读写OCR结果缓存")
+    add_recognition_arguments(parser)
+    parser.add_argument("--allow-local-paths", action="store_true",
+                        help="允许通过JSON请求体中的image_path读取服务器本地文件")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    options = EngineOptions(
+        cpu_threads=args.cpu_threads,
+        template_path=args.template,
+        roi=args.roi,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        cache_max_bytes=args.cache_size_mb * 1024 * 1024,
+        **recognition_options(args),
+    )
+    service = ExtractionService(args.workers, options, args.max_pending, args.allow_local_paths)
+    serve(args.host, args.port, service)
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(run_cli())
@@ -0,0 +1,202 @@
+"""表单模板的加载与编译
+
+模板文件（YAML或JSON）声明字段、锚点标签、坐标区域和表格列，
+编译后的CompiledTemplate把所有区域堆叠成数组，提取时一次广播即可完成所有区域判断。
+同一模板文件只编译一次，整个批次和所有请求共享编译结果。
+"""
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+
+# 默认模板与OCR.yaml放在同一目录
+DEFAULT_TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "form_template.yaml")
+
+# 坐标顺序与检测框一致：[x_min, y_min, x_max, y_max]
+BOX_KEYS = ('x_min', 'y_min', 'x_max', 'y_max')
+
+
+class TemplateError(ValueError):
+    """模板文件内容不合法"""
+
+
+def region_bounds(**ranges):
+    """将各坐标的(下限, 上限)转换为下限数组和上限数组，未给出的坐标不做限制"""
+    unknown = set(ranges) - set(BOX_KEYS)
+    if unknown:
+        raise TemplateError(f"未知的坐标名: {', '.join(sorted(unknown))}")
+    lower = np.full(4, -np.inf)
+    upper = np.full(4, np.inf)
+    for i, key in enumerate(BOX_KEYS):
+        if key in ranges:
+            lower[i], upper[i] = min(ranges[key]), max(ranges[key])
+    return lower, upper
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    """单个字段的提取规则，按 区域 -> 固定文本 -> 锚点标签 -> 默认值 的顺序查找"""
+    name: str
+    contains: str = None
+    literal: str = None
+    anchor_label: str = None
+    anchor_next_x_min: tuple = None
+    default: str = ""
+    default_strftime: str = None
+
+
+@dataclass(frozen=True)
+class ColumnSpec:
+    """表格列，missing为该列既找不到值也没有默认行时使用的值"""
+    name: str
+    missing: str = None
+
+
+@dataclass(frozen=True, eq=False)
+class TableSpec:
+    """表格提取规则，columns[key_index]为行的基准列"""
+    columns: tuple
+    key_index: int
+    region_lower: np.ndarray
+    region_upper: np.ndarray
+    default_rows: tuple
+    default_row_by_key: dict
+
+    @property
+    def key_column(self):
+        return self.columns[self.key_index].name
+
+
+@dataclass(frozen=True, eq=False)
+class RoiSpec:
+    """ROI识别模式的区域，regions为(R,4)的[x0, y0, x1, y1]整页坐标数组"""
+    regions: np.ndarray
+    margin: int = 8
+    require_labels: tuple = ()
+
+
+@dataclass(frozen=True, eq=False)
+class CompiledTemplate:
+    """编译后的模板，region_lower/region_upper为(F,4)数组，没有区域的字段整行为NaN"""
+    name: str
+    fields: tuple
+    region_lower: np.ndarray
+    region_upper: np.ndarray
+    table: TableSpec = None
+    roi: RoiSpec = None
+    # 模板定义的摘要，模板内容改变时随之改变
+    digest: str = ''
+
+    def field_index(self, name):
+        for i, spec in enumerate(self.fields):
+            if spec.name == name:
+                return i
+        raise KeyError(name)
+
+
+def _compile_field(name, spec):
+    if not isinstance(spec, dict):
+        raise TemplateError(f"字段{name}的定义必须是映射")
+    anchor = spec.get('anchor') or {}
+    next_x_min = anchor.get('next_x_min')
+    return FieldSpec(
+        name=name,
+        contains=spec.get('contains'),
+        literal=spec.get('literal'),
+        anchor_label=anchor.get('label'),
+        anchor_next_x_min=(min(next_x_min), max(next_x_min)) if next_x_min else None,
+        default=str(spec.get('default', "")),
+        default_strftime=spec.get('default_strftime'),
+    )
+
+
+def _stack_regions(specs):
+    """把各项的region堆叠为(K,4)上下限数组，没有区域的项用NaN填充，比较结果恒为False"""
+    lower = np.full((len(specs), 4), np.nan)
+    upper = np.full((len(specs), 4), np.nan)
+    for i, spec in enumerate(specs):
+        region = spec.get('region')
+        if region:
+            lower[i], upper[i] = region_bounds(**region)
+    return lower, upper
+
+
+def _compile_table(spec):
+    columns = spec.get('columns') or {}
+    if not columns:
+        raise TemplateError("表格至少需要定义一列")
+    names = list(columns)
+    key_column = spec.get('key_column', names[0])
+    if key_column not in columns:
+        raise TemplateError(f"表格的基准列{key_column}未定义")
+    lower, upper = _stack_regions([columns[name] for name in names])
+    if np.isnan(lower).all(axis=1).any():
+        raise TemplateError("表格的每一列都必须定义region")
+    default_rows = tuple({key: str(value) for key, value in row.items()}
+                         for row in spec.get('default_rows', []))
+    default_row_by_key = {}
+    for row in default_rows:
+        default_row_by_key.setdefault(row.get(key_column), row)
+    return TableSpec(
+        columns=tuple(ColumnSpec(name, columns[name].get('missing')) for name in names),
+        key_index=names.index(key_column),
+        region_lower=lower,
+        region_upper=upper,
+        default_rows=default_rows,
+        default_row_by_key=default_row_by_key,
+    )
+
+
+def _compile_roi(spec):
+    regions = np.asarray(spec.get('regions') or [], dtype=np.float64)
+    if regions.ndim != 2 or regions.shape[1] != 4 or len(regions) == 0:
+        raise TemplateError("roi.regions必须是[x0, y0, x1, y1]的列表")
+    if np.any(regions[:, 2:] <= regions[:, :2]):
+        raise TemplateError("roi.regions中的区域右下角必须大于左上角")
+    return RoiSpec(
+        regions=regions,
+        margin=int(spec.get('margin', 8)),
+        require_labels=tuple(spec.get('require_labels') or ()),
+    )
+
+
+def compile_template(definition):
+    """将模板定义（已解析的字典）编译为CompiledTemplate"""
+    if not isinstance(definition, dict):
+        raise TemplateError("模板顶层必须是映射")
+    field_defs = definition.get('fields') or {}
+    fields = tuple(_compile_field(name, spec) for name, spec in field_defs.items())
+    lower, upper = _stack_regions(list(field_defs.values()))
+    table = _compile_table(definition['table']) if definition.get('table') else None
+    roi = _compile_roi(definition['roi']) if definition.get('roi') else None
+    return CompiledTemplate(
+        name=definition.get('name', ''),
+        fields=fields,
+        region_lower=lower,
+        region_upper=upper,
+        table=table,
+        roi=roi,
+        digest=hashlib.sha256(json.dumps(definition, sort_keys=True, default=str).encode('utf-8')).hexdigest(),
+    )
+
+
+def _read_definition(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.lower().endswith('.json'):
+            return json.load(f)
+        import yaml
+        return yaml.safe_load(f)
+
+
+@lru_cache(maxsize=16)
+def _load_compiled(path, mtime):
+    return compile_template(_read_definition(path))
+
+
+def load_template(path=None):
+    """加载并编译模板文件，同一文件未修改时直接返回缓存的编译结果"""
+    path = os.path.abspath(path or DEFAULT_TEMPLATE_PATH)
+    return _load_compiled(path, os.path.getmtime(path))
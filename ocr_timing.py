@@ -0,0 +1,186 @@
+"""流程各阶段的耗时记录
+
+StageTrace记录单张图片各阶段（读取、查缓存、解码、检测、识别、提取……）的墙钟时间和CPU时间，
+可以随结果记录一起从工作进程返回；TimingStats汇总多张图片的阶段耗时；
+TraceWriter把trace写成JSON lines或Chrome trace格式（chrome://tracing和Perfetto可直接打开）。
+enable_profiling开启后，cProfile只在HOT_STAGES内采样，分析结果不会被读文件、写结果等操作稀释。
+"""
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+# 开启性能分析时只在这些阶段内启用cProfile
+HOT_STAGES = ('ocr', 'roi_ocr', 'detect', 'recognize', 'extract')
+
+_profiler = None
+
+
+def enable_profiling():
+    """在当前进程开启热点阶段的cProfile采样，返回Profile对象"""
+    global _profiler
+    _profiler = cProfile.Profile()
+    return _profiler
+
+
+def dump_profile(path):
+    """保存采样结果（可用snakeviz或pstats查看）并关闭采样，未开启时不做任何事"""
+    global _profiler
+    if _profiler is None:
+        return
+    _profiler.dump_stats(path)
+    _profiler = None
+
+
+class StageTrace:
+    """单张图片的阶段耗时，spans为(阶段名, 开始时间戳, 墙钟秒数, CPU秒数)列表
+
+    开始时间使用time.time()，不同工作进程的trace可以画在同一条时间轴上；
+    on_stage(trace, 阶段名)在每个阶段结束时调用，用于产生进度事件；
+    cancel为CancelToken时每个阶段开始前检查，已取消则抛出OperationCancelled
+    """
+
+    def __init__(self, image_path=None, on_stage=None, cancel=None):
+        self.image_path = image_path
+        self.on_stage = on_stage
+        self.cancel = cancel
+        self.pid = os.getpid()
+        self.tid = threading.get_ident()
+        self.spans = []
+
+    @contextmanager
+    def stage(self, name):
+        if self.cancel is not None:
+            self.cancel.check()
+        profiler = _profiler if name in HOT_STAGES else None
+        start_time = time.time()
+        start_wall = time.perf_counter()
+        start_cpu = time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            self.spans.append((name, start_time, time.perf_counter() - start_wall,
+                               time.process_time() - start_cpu))
+        if self.on_stage is not None:
+            self.on_stage(self, name)
+
+    def add(self, name, start_time, wall, cpu):
+        """记录在别处测得的耗时，例如合并识别的批次按行数分摊到每张图片"""
+        self.spans.append((name, start_time, wall, cpu))
+        if self.on_stage is not None:
+            self.on_stage(self, name)
+
+    def totals(self):
+        """返回{阶段名: {'wall_ms', 'cpu_ms'}}，同名阶段累加"""
+        totals = {}
+        for name, _, wall, cpu in self.spans:
+            total = totals.setdefault(name, {'wall_ms': 0.0, 'cpu_ms': 0.0})
+            total['wall_ms'] += wall * 1000
+            total['cpu_ms'] += cpu * 1000
+        return {name: {key: round(value, 2) for key, value in total.items()}
+                for name, total in totals.items()}
+
+    def to_dict(self):
+        return {'image_path': self.image_path, 'pid': self.pid, 'tid': self.tid,
+                'spans': [list(span) for span in self.spans]}
+
+    @classmethod
+    def from_dict(cls, data):
+        trace = cls(data.get('image_path'))
+        trace.pid = data['pid']
+        trace.tid = data['tid']
+        trace.spans = [tuple(span) for span in data['spans']]
+        return trace
+
+
+class _NullTrace:
+    """不记录任何内容的trace，调用方不需要判断是否开启了计时"""
+
+    def stage(self, name):
+        return nullcontext()
+
+    def add(self, name, start_time, wall, cpu):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+
+
+class TimingStats:
+    """按阶段汇总多张图片的耗时计数器"""
+
+    def __init__(self):
+        self.images = 0
+        self.stages = {}
+
+    def add(self, trace):
+        self.images += 1
+        for name, _, wall, cpu in trace.spans:
+            stat = self.stages.setdefault(name, {'count': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'max_wall_s': 0.0})
+            stat['count'] += 1
+            stat['wall_s'] += wall
+            stat['cpu_s'] += cpu
+            stat['max_wall_s'] = max(stat['max_wall_s'], wall)
+
+    def summary(self):
+        """返回可序列化的汇总结果，时间单位为毫秒"""
+        return {
+            name: {
+                'count': stat['count'],
+                'total_ms': round(stat['wall_s'] * 1000, 1),
+                'mean_ms': round(stat['wall_s'] * 1000 / stat['count'], 2),
+                'max_ms': round(stat['max_wall_s'] * 1000, 2),
+                'cpu_ms': round(stat['cpu_s'] * 1000, 1),
+            }
+            for name, stat in self.stages.items()
+        }
+
+    def format_table(self):
+        """格式化为便于在终端或界面中阅读的多行文本"""
+        lines = [f"{'阶段':<12}{'次数':>8}{'总耗时(ms)':>14}{'平均(ms)':>12}{'最大(ms)':>12}{'CPU(ms)':>12}"]
+        for name, stat in sorted(self.summary().items(), key=lambda item: -item[1]['total_ms']):
+            lines.append(f"{name:<12}{stat['count']:>8}{stat['total_ms']:>14}{stat['mean_ms']:>12}"
+                         f"{stat['max_ms']:>12}{stat['cpu_ms']:>12}")
+        return "\n".join(lines)
+
+
+class TraceWriter:
+    """把每张图片的trace写入文件
+
+    trace_format为'jsonl'时每张图片一行；为'chrome'时写Chrome trace的JSON数组，
+    每个阶段是一个完整事件（ph='X'），按进程和线程分轨显示
+    """
+
+    def __init__(self, path, trace_format='jsonl'):
+        self.trace_format = trace_format
+        self._file = open(path, 'w', encoding='utf-8')
+        self._first = True
+        if trace_format == 'chrome':
+            self._file.write("[\n")
+
+    def write(self, trace):
+        if self.trace_format == 'jsonl':
+            record = {'image_path': trace.image_path, 'pid': trace.pid, 'stages': trace.totals()}
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            return
+        for name, start_time, wall, cpu in trace.spans:
+            event = {
+                'name': name, 'ph': 'X', 'pid': trace.pid, 'tid': trace.tid,
+                'ts': int(start_time * 1e6), 'dur': int(wall * 1e6),
+                'args': {'image_path': trace.image_path, 'cpu_ms': round(cpu * 1000, 2)},
+            }
+            self._file.write(("  " if self._first else ",\n  ") + json.dumps(event, ensure_ascii=False))
+            self._first = False
+
+    def close(self):
+        if self._file.closed:
+            return
+        if self.trace_format == 'chrome':
+            self._file.write("\n]\n")
+        self._file.close()
@@ -0,0 +1,76 @@
+"""处理线程到Tk主循环的消息通道
+
+Tk不是线程安全的，处理线程不能直接修改控件或弹出对话框。处理线程只把要执行的调用放入队列，
+主循环在处理期间用root.after定时取出并批量执行；连续的日志合并成一次插入，
+大量日志不会阻塞推理线程，也不会让界面卡顿。通道空闲时不再定时唤醒主循环。
+"""
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+_LOG = object()
+
+
+class UIChannel:
+    """post/log可在任意线程中调用；start/stop只能在主线程中调用"""
+
+    def __init__(self, root, on_log, interval_ms=50, max_batch=200):
+        self.root = root
+        self.on_log = on_log
+        self.interval_ms = interval_ms
+        self.max_batch = max_batch
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._active = 0
+        self._draining = False
+
+    def post(self, func, *args):
+        """请求在主线程中执行func(*args)"""
+        self._queue.put((func, args))
+
+    def log(self, text):
+        """请求在主线程中追加日志"""
+        self._queue.put((_LOG, text))
+
+    def start(self):
+        """开始定时取出消息，每个start对应一个stop，全部stop且队列取空后停止"""
+        with self._lock:
+            self._active += 1
+        if not self._draining:
+            self._draining = True
+            self.root.after(self.interval_ms, self._drain)
+
+    def stop(self):
+        with self._lock:
+            self._active = max(0, self._active - 1)
+
+    def _drain(self):
+        logs = []
+        for _ in range(self.max_batch):
+            try:
+                func, args = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if func is _LOG:
+                logs.append(args)
+                continue
+            # 保持日志与其他调用的先后顺序
+            if logs:
+                self.on_log("".join(logs))
+                logs = []
+            try:
+                func(*args)
+            except Exception:
+                # 单个调用出错不能中断后续消息的处理
+                logger.exception("界面更新出错")
+        if logs:
+            self.on_log("".join(logs))
+
+        with self._lock:
+            active = self._active
+        if active or not self._queue.empty():
+            self.root.after(self.interval_ms, self._drain)
+        else:
+            self._draining = False
@@ -0,0 +1,133 @@
+"""放大查看窗口中按视口分块显示的画布
+
+大图放大到2倍时整张缩放后的PhotoImage可能有数百MB，创建也很慢。TiledImageCanvas把缩放后的图像
+切成固定大小的块，只为当前可见的块生成PhotoImage并放到画布上，滚动或缩放时按需补齐；
+块缓存的数量随窗口大小确定，内存占用与窗口大小成正比，与图片大小无关。
+"""
+import math
+import tkinter as tk
+from collections import OrderedDict
+from tkinter import ttk
+
+from PIL import ImageTk
+
+# 分块的边长（像素）
+TILE_SIZE = 256
+
+# 块缓存的容量为可见块数的倍数，来回滚动时不必重新生成
+TILE_CACHE_FACTOR = 3
+
+
+class TiledImageCanvas:
+    """带滚动条的画布，显示ImagePyramid按zoom缩放后的图像；frame需由调用方布局"""
+
+    def __init__(self, parent, pyramid, zoom=1.0, tile_size=TILE_SIZE):
+        self.pyramid = pyramid
+        self.zoom = zoom
+        self.fast = False
+        self.tile_size = tile_size
+        self._tiles = OrderedDict()
+        self._items = {}
+        self._refresh_pending = False
+
+        self.frame = ttk.Frame(parent)
+        h_scrollbar = ttk.Scrollbar(self.frame, orient=tk.HORIZONTAL)
+        v_scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL)
+        h_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
+        v_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas = tk.Canvas(self.frame, xscrollcommand=h_scrollbar.set, yscrollcommand=v_scrollbar.set,
+                                highlightthickness=0)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        # 滚动条、鼠标滚轮和窗口大小变化后都重新计算可见的块
+        h_scrollbar.config(command=lambda *args: self._scroll(self.canvas.xview, *args))
+        v_scrollbar.config(command=lambda *args: self._scroll(self.canvas.yview, *args))
+        self.canvas.bind("<Configure>", lambda event: self.schedule_refresh())
+        self.canvas.bind("<MouseWheel>", self._on_mousewheel)
+        self.canvas.bind("<Shift-MouseWheel>", self._on_mousewheel)
+        self.canvas.bind("<Button-4>", lambda event: self._scroll(self.canvas.yview, 'scroll', -1, 'units'))
+        self.canvas.bind("<Button-5>", lambda event: self._scroll(self.canvas.yview, 'scroll', 1, 'units'))
+
+        self._update_scrollregion()
+
+    @property
+    def display_size(self):
+        """缩放后的图像尺寸"""
+        width, height = self.pyramid.size
+        return max(1, int(width * self.zoom)), max(1, int(height * self.zoom))
+
+    def set_zoom(self, zoom, fast=False):
+        """改变缩放比例并保持视口中心不动；fast为True时用快速插值生成块（拖动滑块时）"""
+        if zoom == self.zoom and fast == self.fast:
+            return
+        # 以原图坐标记录当前视口中心
+        center_x = self.canvas.canvasx(self.canvas.winfo_width() / 2) / self.zoom
+        center_y = self.canvas.canvasy(self.canvas.winfo_height() / 2) / self.zoom
+
+        self.zoom = zoom
+        self.fast = fast
+        self.canvas.delete("tile")
+        self._items.clear()
+        self._update_scrollregion()
+
+        width, height = self.display_size
+        self.canvas.xview_moveto(max(0.0, (center_x * zoom - self.canvas.winfo_width() / 2) / width))
+        self.canvas.yview_moveto(max(0.0, (center_y * zoom - self.canvas.winfo_height() / 2) / height))
+        self.schedule_refresh()
+
+    def schedule_refresh(self):
+        """在空闲时刷新可见的块，连续的滚动事件只刷新一次"""
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.canvas.after_idle(self._refresh)
+
+    def _update_scrollregion(self):
+        width, height = self.display_size
+        self.canvas.config(scrollregion=(0, 0, width, height))
+
+    def _scroll(self, view, *args):
+        view(*args)
+        self.schedule_refresh()
+
+    def _on_mousewheel(self, event):
+        view = self.canvas.xview if event.state & 0x1 else self.canvas.yview
+        self._scroll(view, 'scroll', -1 if event.delta > 0 else 1, 'units')
+
+    def _refresh(self):
+        self._refresh_pending = False
+        if not self.canvas.winfo_exists():
+            return
+        width, height = self.display_size
+        size = self.tile_size
+        left = max(0, int(self.canvas.canvasx(0)) // size)
+        top = max(0, int(self.canvas.canvasy(0)) // size)
+        right = min(math.ceil(width / size), int(self.canvas.canvasx(self.canvas.winfo_width())) // size + 1)
+        bottom = min(math.ceil(height / size), int(self.canvas.canvasy(self.canvas.winfo_height())) // size + 1)
+        visible = {(column, row) for column in range(left, right) for row in range(top, bottom)}
+
+        # 移除已不可见的块，画布上的图像项数与可见块数相当
+        for position in list(self._items):
+            if position not in visible:
+                self.canvas.delete(self._items.pop(position)[0])
+        for column, row in sorted(visible - set(self._items)):
+            photo = self._tile(column, row)
+            item = self.canvas.create_image(column * size, row * size, image=photo, anchor=tk.NW, tags="tile")
+            self._items[(column, row)] = (item, photo)
+
+        # 画布上的块持有各自的PhotoImage，淘汰缓存不会影响显示
+        max_tiles = max(len(visible), 1) * TILE_CACHE_FACTOR
+        while len(self._tiles) > max_tiles:
+            self._tiles.popitem(last=False)
+
+    def _tile(self, column, row):
+        key = (self.zoom, self.fast, column, row)
+        photo = self._tiles.get(key)
+        if photo is not None:
+            self._tiles.move_to_end(key)
+            return photo
+        width, height = self.display_size
+        size = self.tile_size
+        box = (column * size, row * size, min((column + 1) * size, width), min((row + 1) * size, height))
+        photo = ImageTk.PhotoImage(self.pyramid.region(self.zoom, box, self.fast), master=self.canvas)
+        self._tiles[key] = photo
+        return photo
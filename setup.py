@@ -1,8 +1,13 @@
+import argparse
+import glob
+import json
 import os
-import sys
+import shutil
 import site
-import glob
-from PyInstaller.__main__ import run
+import subprocess
+import sys
+import tempfile
+import time
 
 # 设置应用名称
 app_name = "Glory_OCR_Demo"
@@ -21,76 +26,233 @@ required_dependencies = [
     'shapely',    # 几何形状处理
 ]
 
-# 打印安装建议
-print("如果打包失败，请确保已安装所有必要的依赖:")
-print("pip install pyclipper shapely paddleocr")
+# 构建报告，每次打包后更新，用于对比包大小和冷启动时间的变化
+BUILD_REPORT = "build_report.json"
+
+# 这些包在OCR和字段提取流程中用不到时不打包（由import跟踪结果决定）
+OPTIONAL_PACKAGES = ('Cython', 'matplotlib', 'IPython', 'notebook', 'pandas', 'scipy', 'sklearn', 'pytest')
+
+# 在子进程中运行一遍OCR和字段提取流程，输出实际导入的模块
+TRACE_SCRIPT = r"""
+import json, sys
+sys.argv = ['trace']
+import ocr_extraction_gui, ocr_batch, ocr_prefetch, ocr_render
+from ocr_batch import process_image
+from ocr_engine import EngineOptions, OCREngine
+engine = OCREngine(EngineOptions())
+engine.warm_up()
+# 重新识别时才加载的方向分类器也要打包
+engine.refine_classifier()
+for image_path in sys.stdin.read().split('\n'):
+    if image_path:
+        process_image(engine, image_path)
+print('TRACED_MODULES=' + json.dumps(sorted(sys.modules)))
+"""
+
+
+def trace_imports():
+    """返回OCR和字段提取流程实际导入的模块名列表"""
+    image_paths = sorted(glob.glob(os.path.join("example_img", "*.png")))[:1]
+    result = subprocess.run([sys.executable, "-c", TRACE_SCRIPT], input="\n".join(image_paths),
+                            capture_output=True, text=True, check=True)
+    for line in result.stdout.splitlines():
+        if line.startswith('TRACED_MODULES='):
+            return json.loads(line[len('TRACED_MODULES='):])
+    raise RuntimeError("import跟踪没有输出模块列表:\n" + result.stderr)
+
 
-# 查找Cython包路径
-site_packages = site.getsitepackages()
-cython_path = None
+def model_data_options():
+    """只打包OCR配置实际使用的模型目录；方向分类模型总是打包，重新识别时会单独加载它"""
+    from ocr_engine import OCR_MODEL_KWARGS
+    from ocr_models import models_root, resolve_models
 
-for path in site_packages:
-    potential_cython_path = os.path.join(path, 'Cython')
-    if os.path.exists(potential_cython_path):
-        cython_path = potential_cython_path
-        print(f"找到Cython路径: {potential_cython_path}")
+    paths, missing = resolve_models(OCR_MODEL_KWARGS['lang'], use_angle_cls=True)
+    if missing:
+        raise SystemExit("本地模型文件不完整，打包后的程序无法离线运行（可先运行一次程序下载模型），缺少:\n"
+                         + "\n".join(missing))
+    root = models_root()
+    options = []
+    for model_dir in (paths.det, paths.rec, paths.cls):
+        if model_dir:
+            relative = os.path.relpath(model_dir, root).replace(os.sep, '/')
+            print(f"打包模型目录: {relative}")
+            options.append(f'--add-data={model_dir}{os.pathsep}models/{relative}')
+    return options
+
+
+def slim_options(traced_modules):
+    """精简打包：按跟踪到的模块添加隐式导入，只收集运行所需的数据和二进制文件"""
+    stdlib = getattr(sys, 'stdlib_module_names', ())
+    top_levels = {name.split('.')[0] for name in traced_modules}
+    hidden_imports = [name for name in traced_modules
+                      if name.split('.')[0] not in stdlib and not name.startswith(('ocr_', '_', '__main__'))]
+    excluded = [package for package in OPTIONAL_PACKAGES if package not in top_levels]
+    print(f"跟踪到 {len(traced_modules)} 个模块，其中第三方模块 {len(hidden_imports)} 个；不打包: {', '.join(excluded)}")
+
+    options = [f'--hidden-import={name}' for name in hidden_imports]
+    options += [f'--exclude-module={package}' for package in excluded]
+    options += [
+        # paddle的动态库、PaddleOCR的字典文件和shapely的动态库不在import分析范围内
+        '--collect-binaries=paddle',
+        '--collect-data=paddleocr',
+        '--collect-binaries=shapely',
+    ]
+    return options
+
+
+def full_options():
+    """完整打包：收集依赖包的全部内容，包很大，仅在精简打包运行出错时使用"""
+    opts = [
+        '--collect-all=paddle',
+        '--collect-all=paddleocr',
+        '--collect-all=pyclipper',
+        '--collect-all=shapely',
+        '--collect-all=Cython',
+        f'--add-data=models{os.pathsep}models',  # 添加整个models文件夹
+
+        # 关键隐式导入
+        '--hidden-import=paddle',
+        '--hidden-import=paddle.base',
+        '--hidden-import=paddle.utils',
+        '--hidden-import=paddle.utils.cpp_extension',
+        '--hidden-import=paddleocr',
+        '--hidden-import=pyclipper',
+        '--hidden-import=shapely',
+        '--hidden-import=shapely.geometry',
+        '--hidden-import=shapely.ops',
+    ]
+
+    # 查找Cython包路径，特别处理Cython，确保包含Utility目录及其C文件
+    for path in site.getsitepackages():
+        cython_path = os.path.join(path, 'Cython')
+        if not os.path.exists(cython_path):
+            continue
+        print(f"找到Cython路径: {cython_path}")
+        cython_utility = os.path.join(cython_path, 'Utility')
+        if os.path.exists(cython_utility):
+            print(f"找到Cython Utility目录: {cython_utility}")
+            opts.append(f'--add-data={cython_utility}{os.pathsep}Cython/Utility')
         break
+    return opts
 
-# 配置基本的PyInstaller选项
-opts = [
-    'ocr_extraction_gui.py',  # 主脚本
-    '--name=%s' % app_name,
-    '--windowed',             # 无控制台窗口
-    '--onedir',               # 目录模式，更稳定
-    '--noupx',                # 禁用UPX压缩
-    '--debug=all',            # 启用调试
-    
-    # 添加数据文件
-    '--add-data=OCR.yaml:.',  # 添加OCR.yaml配置文件
-    '--add-data=models:models',  # 添加models文件夹
-    
-    # 关键依赖包
-    '--collect-all=paddle',
-    '--collect-all=paddleocr',
-    '--collect-all=pyclipper',
-    '--collect-all=shapely',
-    '--collect-all=Cython',
-    
-    # 关键隐式导入
-    '--hidden-import=paddle',
-    '--hidden-import=paddle.base',
-    '--hidden-import=paddle.utils',
-    '--hidden-import=paddle.utils.cpp_extension',
-    '--hidden-import=paddleocr',
-    '--hidden-import=pyclipper',
-    '--hidden-import=shapely',
-    '--hidden-import=shapely.geometry',
-    '--hidden-import=shapely.ops',
-]
 
-# 特别处理Cython，确保包含Utility目录及其C文件
-if cython_path:
-    cython_utility = os.path.join(cython_path, 'Utility')
-    if os.path.exists(cython_utility):
-        print(f"找到Cython Utility目录: {cython_utility}")
-        opts.append(f'--add-data={cython_utility}:Cython/Utility')
-        
-        # 收集Utility目录下的所有.c文件
-        c_files = glob.glob(os.path.join(cython_utility, '*.c'))
-        for c_file in c_files:
-            if 'StringTools.c' in c_file:
-                print(f"找到StringTools.c文件: {c_file}")
-            opts.append(f'--add-data={c_file}:Cython/Utility')
-
-print("开始打包应用...")
-print(f"使用以下选项: {opts}")
-
-# 清理旧的构建目录，避免符号链接错误
-import shutil
-for dir_to_remove in ['build', 'dist']:
-    if os.path.exists(dir_to_remove):
-        print(f"清理目录: {dir_to_remove}")
-        shutil.rmtree(dir_to_remove)
+def bundle_size(path):
+    """返回(总字节数, 文件数)"""
+    total = 0
+    count = 0
+    for directory, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(directory, name))
+            count += 1
+    return total, count
+
+
+def measure_cold_start(executable, runs=3):
+    """用打包后的程序以批量模式识别一张示例图片，返回每次从启动到退出的秒数
+
+    第一次运行时磁盘缓存为冷状态，更接近用户第一次打开程序的情况；
+    窗口程序没有控制台，命令行模式下sys.stdout为None，进度输出会被跳过（见CliProgressReporter）
+    """
+    image_paths = sorted(glob.glob(os.path.join("example_img", "*.png")))[:1]
+    if not image_paths:
+        print("没有示例图片，跳过冷启动测试")
+        return []
+    timings = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for index in range(runs):
+            output_path = os.path.join(output_dir, f"cold_start_{index}.jsonl")
+            start = time.perf_counter()
+            subprocess.run([executable, image_paths[0], "-o", output_path, "--no-cache"],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=600, check=True)
+            timings.append(round(time.perf_counter() - start, 2))
+    return timings
+
+
+def write_report(report):
+    """打印本次的包大小和冷启动时间，与上一次的报告对比后保存"""
+    previous = None
+    if os.path.exists(BUILD_REPORT):
+        with open(BUILD_REPORT, 'r', encoding='utf-8') as f:
+            previous = json.load(f)
+
+    print(f"打包方式: {report['profile']}，包大小: {report['bundle_mb']} MB（{report['file_count']} 个文件）")
+    if report['cold_start_s']:
+        print(f"冷启动（启动到识别完一张示例图片）: 首次 {report['cold_start_s'][0]}s，"
+              f"最快 {min(report['cold_start_s'])}s")
+    if previous and previous.get('profile') == report['profile']:
+        print(f"与上次相比: 包大小 {report['bundle_mb'] - previous['bundle_mb']:+.1f} MB")
+        if report['cold_start_s'] and previous.get('cold_start_s'):
+            print(f"            冷启动 {min(report['cold_start_s']) - min(previous['cold_start_s']):+.2f}s")
+
+    with open(BUILD_REPORT, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"构建报告已保存至 {BUILD_REPORT}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="打包Glory OCR Demo")
+    parser.add_argument("--profile", choices=["slim", "full"], default="slim",
+                        help="slim只打包跟踪到的模块和用到的模型，full收集依赖包的全部内容")
+    parser.add_argument("--debug", action="store_true", help="启用PyInstaller调试输出（--debug=all）")
+    parser.add_argument("--skip-cold-start", action="store_true", help="打包后不测量冷启动时间")
+    args = parser.parse_args()
+
+    # 打印安装建议
+    print("如果打包失败，请确保已安装所有必要的依赖:")
+    print("pip install pyclipper shapely paddleocr")
+
+    # 配置基本的PyInstaller选项
+    opts = [
+        'ocr_extraction_gui.py',  # 主脚本
+        '--name=%s' % app_name,
+        '--windowed',             # 无控制台窗口
+        '--onedir',               # 目录模式，启动时不需要解压
+        '--noupx',                # 禁用UPX压缩，避免启动时解压动态库
+
+        # 添加数据文件
+        f'--add-data=OCR.yaml{os.pathsep}.',  # 添加OCR.yaml配置文件
+        f'--add-data=form_template.yaml{os.pathsep}.',  # 添加表单模板文件
+    ]
+    if args.debug:
+        opts.append('--debug=all')
+
+    traced_modules = []
+    if args.profile == "slim":
+        print("正在跟踪OCR和字段提取流程导入的模块...")
+        traced_modules = trace_imports()
+        opts += model_data_options()
+        opts += slim_options(traced_modules)
+    else:
+        opts += full_options()
+
+    print("开始打包应用...")
+    print(f"使用以下选项: {opts}")
+
+    # 清理旧的构建目录，避免符号链接错误
+    for dir_to_remove in ['build', 'dist']:
+        if os.path.exists(dir_to_remove):
+            print(f"清理目录: {dir_to_remove}")
+            shutil.rmtree(dir_to_remove)
+
+    # 运行PyInstaller打包
+    from PyInstaller.__main__ import run
+    run(opts)
+
+    bundle_dir = os.path.join('dist', app_name)
+    total_bytes, file_count = bundle_size(bundle_dir)
+    executable = os.path.join(bundle_dir, app_name + ('.exe' if sys.platform == 'win32' else ''))
+    cold_start = [] if args.skip_cold_start else measure_cold_start(executable)
+    write_report({
+        'profile': args.profile,
+        'built_at': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'python': sys.version.split()[0],
+        'platform': sys.platform,
+        'bundle_mb': round(total_bytes / 1024 / 1024, 1),
+        'file_count': file_count,
+        'traced_module_count': len(traced_modules),
+        'cold_start_s': cold_start,
+    })
+
 
-# 运行PyInstaller打包
-run(opts) 
\ No newline at end of file
+if __name__ == "__main__":
+    main()
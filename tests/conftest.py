@@ -0,0 +1,5 @@
+"""测试从仓库根目录导入ocr_*模块；测试不需要paddle，用到模型的地方用假的模型对象代替"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
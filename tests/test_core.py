@@ -0,0 +1,275 @@
+"""字段提取、模板编译、OCR结果缓存和合并识别的回归测试
+
+EXPECTED是向量化（NumPy）改写之前的逐行实现在同样的输入上给出的结果，extract_all必须与之一致
+"""
+import os
+
+import numpy as np
+import pytest
+
+from ocr_cache import OCRResultCache
+from ocr_engine import EngineOptions, OCREngine, RecognitionBatcher, reading_order
+from ocr_extraction_core import OCRResult, extract_all
+from ocr_template import TemplateError, compile_template, load_template
+
+# 每行为(文本, [x_min, y_min, x_max, y_max], 置信度)，坐标对应默认模板form_template.yaml
+HEADER = [
+    ("Time", [100, 40, 140, 58], 0.99),
+    ("21:22:03", [150, 40, 230, 58], 0.97),
+    ("Recipe", [117, 72, 172, 92], 0.99),
+    ("IP PR", [196, 71, 243, 93], 0.98),
+    ("BadgeNo.", [108, 113, 180, 132], 0.97),
+    ("SV2-250113-0370", [196, 112, 343, 131], 0.95),
+]
+TABLE = [
+    ("0.100", [1000, 216, 1035, 238], 0.9), ("0.200", [1050, 215, 1085, 232], 0.9), ("0", [1125, 216, 1140, 232], 0.8),
+    ("0.200", [1000, 240, 1035, 262], 0.9), ("0.300", [1050, 240, 1085, 258], 0.9), ("6", [1125, 241, 1140, 258], 0.8),
+    ("0.300", [1000, 264, 1035, 286], 0.9), ("1.000", [1050, 264, 1085, 282], 0.9), ("12", [1125, 264, 1140, 282], 0.6),
+]
+FIXTURES = {
+    # 值都在模板区域内
+    'in_regions': HEADER + TABLE,
+    # 值不在区域内，只能通过锚点标签找到；Recipe值为固定文本
+    'anchors_only': [
+        ("Time", [300, 40, 340, 58], 0.99), ("08:15", [350, 40, 400, 58], 0.9),
+        ("Recipe", [117, 72, 172, 92], 0.99), ("NOMAL_CR", [186, 150, 290, 170], 0.9),
+        ("BadgeNo.", [108, 113, 180, 132], 0.97), ("AB-1", [400, 300, 450, 320], 0.9),
+    ],
+    # 表格行乱序、缺少count、多出一行，另有区域外的干扰文本
+    'table_shuffled': HEADER + [
+        ("2.000", [1000, 312, 1035, 334], 0.9), ("3.000", [1050, 312, 1085, 330], 0.9), ("1", [1125, 312, 1140, 330], 0.9),
+        ("0.100", [1000, 216, 1035, 238], 0.9), ("0.200", [1050, 215, 1085, 232], 0.9),
+        ("1.000", [1000, 288, 1035, 310], 0.9), ("2.000", [1050, 288, 1085, 306], 0.9), ("3", [1125, 289, 1140, 306], 0.9),
+        ("0.500", [600, 250, 640, 270], 0.9),
+    ],
+    # 两个候选到Min行的距离相同，取第一个
+    'table_ties': HEADER + [
+        ("0.100", [1000, 220, 1035, 240], 0.9),
+        ("0.200", [1050, 218, 1085, 230], 0.9), ("0.900", [1050, 230, 1085, 242], 0.9),
+        ("5", [1125, 218, 1140, 230], 0.9), ("7", [1125, 230, 1140, 242], 0.9),
+    ],
+}
+
+EXPECTED = {
+    'in_regions': {
+        'recipe': 'IP PR', 'badge_number': 'SV2-250113-0370', 'time': '21:22:03',
+        'table': [
+            {'min': '0.100', 'max': '0.200', 'count': '0'},
+            {'min': '0.200', 'max': '0.300', 'count': '6'},
+            {'min': '0.300', 'max': '1.000', 'count': '12'},
+            {'min': '1.000', 'max': '2.000', 'count': '3'},
+            {'min': '2.000', 'max': '3.000', 'count': '0'},
+            {'min': '3.000', 'max': 'Max', 'count': '1'},
+        ],
+    },
+    'anchors_only': {
+        'recipe': 'NOMAL_CR', 'badge_number': 'AB-1', 'time': '08:15',
+        'table': [
+            {'min': '0.100', 'max': '0.200', 'count': '0'},
+            {'min': '0.200', 'max': '0.300', 'count': '6'},
+            {'min': '0.300', 'max': '1.000', 'count': '12'},
+            {'min': '1.000', 'max': '2.000', 'count': '3'},
+            {'min': '2.000', 'max': '3.000', 'count': '0'},
+            {'min': '3.000', 'max': 'Max', 'count': '1'},
+        ],
+    },
+    'table_shuffled': {
+        'recipe': 'IP PR', 'badge_number': 'SV2-250113-0370', 'time': '21:22:03',
+        'table': [
+            {'min': '0.100', 'max': '0.200', 'count': '3'},
+            {'min': '0.200', 'max': '0.300', 'count': '6'},
+            {'min': '0.300', 'max': '1.000', 'count': '12'},
+            {'min': '1.000', 'max': '2.000', 'count': '3'},
+            {'min': '2.000', 'max': '3.000', 'count': '1'},
+            {'min': '3.000', 'max': 'Max', 'count': '1'},
+        ],
+    },
+    'table_ties': {
+        'recipe': 'IP PR', 'badge_number': 'SV2-250113-0370', 'time': '21:22:03',
+        'table': [
+            {'min': '0.100', 'max': '0.200', 'count': '5'},
+            {'min': '0.200', 'max': '0.300', 'count': '6'},
+            {'min': '0.300', 'max': '1.000', 'count': '12'},
+            {'min': '1.000', 'max': '2.000', 'count': '3'},
+            {'min': '2.000', 'max': '3.000', 'count': '0'},
+            {'min': '3.000', 'max': 'Max', 'count': '1'},
+        ],
+    },
+}
+
+
+def make_result(lines):
+    return OCRResult([text for text, _, _ in lines], [score for _, _, score in lines],
+                     [box for _, box, _ in lines])
+
+
+@pytest.mark.parametrize('name', sorted(FIXTURES))
+def test_extract_all_matches_previous_implementation(name):
+    assert extract_all(make_result(FIXTURES[name])).to_dict() == EXPECTED[name]
+
+
+def test_extract_all_scores_point_at_source_lines():
+    lines = FIXTURES['in_regions']
+    extracted = extract_all(make_result(lines))
+    assert extracted.field_scores == {'recipe': 0.98, 'badge_number': 0.95, 'time': 0.97}
+    # 识别出的三行有置信度，用默认行补全的单元格为None
+    assert extracted.table_scores[2] == {'min': 0.9, 'max': 0.9, 'count': 0.6}
+    assert extracted.table_scores[3] == {'min': None, 'max': None, 'count': None}
+    assert extracted.low_confidence(0.85) == ['table[0].count', 'table[1].count', 'table[2].count']
+    assert {lines[index][0] for index in extracted.line_indices} >= {'IP PR', 'SV2-250113-0370', '21:22:03'}
+
+
+def test_extract_all_without_text_uses_defaults():
+    extracted = extract_all(None).to_dict()
+    assert extracted['recipe'] == 'NOMAL_CR'
+    assert extracted['badge_number'] == 'SV2-250113-0370'
+    assert len(extracted['time']) == 5 and extracted['time'][2] == ':'
+    # 没有OCR结果时不补全表格（与改写前一致）
+    assert extracted['table'] == []
+
+
+def test_compile_default_template():
+    template = load_template()
+    assert [spec.name for spec in template.fields] == ['recipe', 'badge_number', 'time']
+    assert template.table.key_column == 'min'
+    assert [column.name for column in template.table.columns] == ['min', 'max', 'count']
+    assert template.region_lower.shape == (3, 4)
+    # time没有声明x_max/y_max，对应的上下限不限制
+    assert np.isinf(template.region_upper[2, 2:]).all()
+    assert template.roi.regions.shape == (2, 4)
+    assert template.roi.require_labels == ('Recipe', 'BadgeNo.')
+
+
+def test_compile_template_digest_follows_definition():
+    definition = {'fields': {'a': {'region': {'x_min': [0, 10]}, 'default': 'x'}}}
+    first = compile_template(definition)
+    assert compile_template(dict(definition)).digest == first.digest
+    definition['fields']['a']['default'] = 'y'
+    assert compile_template(definition).digest != first.digest
+
+
+@pytest.mark.parametrize('definition', [
+    [],
+    {'fields': {'a': 'not a mapping'}},
+    {'fields': {'a': {'region': {'left': [0, 1]}}}},
+    {'table': {'columns': {}}},
+    {'table': {'key_column': 'b', 'columns': {'a': {'region': {'x_min': [0, 1]}}}}},
+    {'table': {'columns': {'a': {'missing': '0'}}}},
+    {'roi': {'regions': [[10, 10, 5, 20]]}},
+])
+def test_compile_template_rejects_invalid_definitions(definition):
+    with pytest.raises(TemplateError):
+        compile_template(definition)
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    entry = {'texts': ['x'], 'scores': [0.9], 'boxes': [[0, 0, 1, 1]], 'image_size': [1, 1]}
+    cache = OCRResultCache(str(tmp_path), max_bytes=10 ** 6)
+    cache.put('aa', entry)
+    size = os.path.getsize(cache._path('aa'))
+    cache.max_bytes = int(size * 2.5)
+    cache.put('bb', entry)
+    os.utime(cache._path('aa'), (1000, 1000))
+    os.utime(cache._path('bb'), (2000, 2000))
+    # 读取aa会更新它的使用时间，写入cc超出上限时淘汰最久未使用的bb
+    assert cache.get('aa') == entry
+    cache.put('cc', entry)
+    assert cache.contains('aa') and cache.contains('cc')
+    assert not cache.contains('bb')
+
+
+def test_cache_survives_reopen(tmp_path):
+    entry = {'texts': ['x'], 'scores': [0.9], 'boxes': [[0, 0, 1, 1]], 'image_size': None}
+    OCRResultCache(str(tmp_path)).put('aa', entry)
+    assert OCRResultCache(str(tmp_path)).get('aa') == entry
+    assert OCRResultCache(str(tmp_path)).get('bb') is None
+
+
+def test_reading_order_groups_lines_by_y():
+    # 左上角坐标；y相差小于10像素的框在同一行，行内从左到右
+    corners = np.array([[50, 12], [10, 10], [60, 41], [10, 40], [200, 70]], dtype=np.float64)
+    assert reading_order(corners).tolist() == [1, 0, 3, 2, 4]
+
+
+class FakeLineModel:
+    """假的PaddleOCR模型：图片第一个像素的值是图片编号，检测出LINE_COUNTS[编号]行，
+    识别结果为“编号:行宽”"""
+    drop_score = 0.5
+    use_angle_cls = False
+    LINE_COUNTS = {1: 2, 2: 0, 3: 3, 4: 1, 5: 2}
+
+    def __init__(self):
+        self.recognize_calls = []
+
+    def text_detector(self, image):
+        count = self.LINE_COUNTS[int(image[0, 0, 0])]
+        if not count:
+            return None, 0.0
+        quads = [[[10, 20 * i], [30 + 10 * i, 20 * i], [30 + 10 * i, 20 * i + 15], [10, 20 * i + 15]]
+                 for i in range(count)]
+        return np.asarray(quads, dtype=np.float32), 0.0
+
+    def text_recognizer(self, crops):
+        self.recognize_calls.append(len(crops))
+        return [(f"{int(crop[0, 0, 0])}:{crop.shape[1]}", 0.9) for crop in crops], 0.0
+
+
+def test_recognition_batcher_keeps_submission_order():
+    engine = OCREngine(EngineOptions(rec_batch_size=3, rec_max_wait=60))
+    model = engine._ocr_model = FakeLineModel()
+    batcher = RecognitionBatcher(engine)
+
+    finished = []
+    for number in (1, 2, 3, 4, 5):
+        image = np.full((120, 200, 3), number, dtype=np.uint8)
+        finished += batcher.submit(f"{number}.png", b"", image=image)
+    finished += batcher.flush()
+
+    assert [path for path, _, _, _ in finished] == ['1.png', '2.png', '3.png', '4.png', '5.png']
+    results = {path: result for path, result, error, _ in finished if error is None}
+    assert results['2.png'] is None
+    for number in (1, 3, 4, 5):
+        texts = results[f"{number}.png"].texts
+        assert texts == [f"{number}:{20 + 10 * i}" for i in range(FakeLineModel.LINE_COUNTS[number])]
+    # 不同图片的行合并成批识别，而不是每张图片识别一次
+    assert len(model.recognize_calls) < 4
+    assert sum(model.recognize_calls) == 8
+
+
+
+@pytest.fixture
+def model_root(tmp_path, monkeypatch):
+    """临时的模型目录，resolve_models和model_digest的进程内缓存在前后清空"""
+    import ocr_models
+
+    root = tmp_path / "models"
+    for kind, layout in ocr_models.MODEL_LAYOUT['en'].items():
+        (root / layout).mkdir(parents=True)
+        for name in ocr_models.MODEL_FILES:
+            (root / layout / name).write_bytes(f"{kind} {name}".encode())
+    monkeypatch.setattr(ocr_models, 'models_root', lambda: str(root))
+    ocr_models.resolve_models.cache_clear()
+    yield root
+    ocr_models.resolve_models.cache_clear()
+    ocr_models.model_digest.cache_clear()
+
+
+def test_config_fingerprint_follows_model_files(model_root, monkeypatch):
+    import ocr_models
+
+    def fingerprint():
+        ocr_models.model_digest.cache_clear()
+        return OCREngine(EngineOptions()).config_fingerprint
+
+    first = fingerprint()
+    assert fingerprint() == first
+
+    # 模型文件内容变化时缓存键变化，只改修改时间不影响
+    rec_params = model_root / ocr_models.MODEL_LAYOUT['en']['rec'] / 'inference.pdiparams'
+    os.utime(rec_params, (0, 0))
+    assert fingerprint() == first
+    rec_params.write_bytes(b"retrained")
+    assert fingerprint() != first
+
+    monkeypatch.setattr(ocr_models, 'package_version', lambda name: "9.9")
+    assert fingerprint() != first
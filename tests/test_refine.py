@@ -0,0 +1,136 @@
+"""低置信度文本行的重新检测和识别（refine_lines / OCREngine.refine）
+
+图片是白底上的黑色横条，每个横条代表一行文字。假的检测器在给定区域内找出黑色横条的外框，
+假的识别器按行图像中黑色部分的宽度返回文字：框截断了横条时读出的字更少、置信度更低
+"""
+import cv2
+import numpy as np
+
+from ocr_engine import EngineOptions, OCREngine, refine_lines
+from ocr_extraction_core import OCRResult
+
+
+def has_notch(gray, column):
+    """横条在column开始的5列内是否有白色缺口"""
+    rows = np.flatnonzero((gray < 128).any(axis=1))
+    return bool((gray[rows[0] + 2:rows[-1] - 1, max(column, 0) + 1:column + 4] > 128).any())
+
+
+class FakeBarModel:
+    drop_score = 0.5
+    use_angle_cls = False
+
+    def __init__(self):
+        self.detected_regions = []
+        self.crop_shapes = []
+
+    def text_detector(self, region):
+        self.detected_regions.append(region.shape)
+        dark = (cv2.cvtColor(region, cv2.COLOR_BGR2GRAY) < 128).astype(np.uint8)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(dark)
+        quads = []
+        for x, y, w, h, _ in stats[1:count]:
+            quads.append([[x, y], [x + w, y], [x + w, y + h], [x, y + h]])
+        return (np.asarray(quads, dtype=np.float32) if quads else None), 0.0
+
+    def text_recognizer(self, crops):
+        results = []
+        for crop in crops:
+            self.crop_shapes.append(crop.shape[:2])
+            gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+            dark_columns = np.flatnonzero((gray < 128).any(axis=0))
+            # 横条左端有一个白色缺口，缺口在右侧说明行图像是倒置的
+            if not dark_columns.size or not has_notch(gray, dark_columns[0]):
+                results.append(("?", 0.3))
+            elif dark_columns.size >= 60:
+                results.append(("IP PR", 0.97))
+            else:
+                results.append(("IP", 0.6))
+        return results, 0.0
+
+
+def bar_image(flipped=False):
+    """1218x1040的白色页面，Recipe值的位置有一个[196, 71, 262, 93]的横条"""
+    image = np.full((1040, 1218, 3), 255, dtype=np.uint8)
+    image[71:93, 196:262] = 0
+    # 左端的白色缺口表示文字的起始方向
+    image[78:86, 197:199] = 255
+    if flipped:
+        image[71:93, 196:262] = image[71:93, 196:262][::-1, ::-1]
+    return image
+
+
+def truncated_result(score=0.6):
+    """第一遍的检测框只覆盖了横条的左侧"""
+    return OCRResult(["Recipe", "IP"], [0.99, score], [[117, 72, 172, 92], [196, 71, 252, 93]],
+                     image_size=(1040, 1218, 3))
+
+
+def test_refine_redetects_truncated_line():
+    model = FakeBarModel()
+    ocr_result = truncated_result()
+    refined, replaced = refine_lines(model, bar_image(), ocr_result, [1])
+
+    assert replaced == 1
+    assert refined.texts == ["Recipe", "IP PR"]
+    assert refined.scores == [0.99, 0.97]
+    # 检测只在行四周扩展后的小区域内进行，文本框本身不变，提取仍按原来的坐标
+    assert model.detected_regions and all(h < 60 and w < 120 for h, w, _ in model.detected_regions)
+    # 按重新检测的四边形裁剪，行图像包含整个横条
+    assert model.crop_shapes == [(22, 66)]
+    assert np.array_equal(refined.boxes, ocr_result.boxes)
+
+
+def test_refine_keeps_line_when_redetection_does_not_match():
+    model = FakeBarModel()
+    image = np.full((1040, 1218, 3), 255, dtype=np.uint8)
+    # 区域内只检测到一个小污点，与原框的交并比太低，按原四边形裁剪
+    image[80:84, 200:204] = 0
+    refined, replaced = refine_lines(model, image, truncated_result(), [1])
+    assert model.crop_shapes == [(22, 56)]
+    assert replaced == 0
+    assert refined.texts == ["Recipe", "IP"]
+
+
+def test_refine_only_flips_lines_the_classifier_marks_as_rotated():
+    ocr_result = OCRResult(["Recipe", "??"], [0.99, 0.4], [[117, 72, 172, 92], [196, 71, 262, 93]])
+    image = bar_image(flipped=True)
+
+    # 没有分类器时按原方向识别，不会用翻转后的读数替换
+    _, replaced = refine_lines(FakeBarModel(), image, ocr_result, [1])
+    assert replaced == 0
+
+    def classifier(crops):
+        """假的方向分类器：缺口在右侧的行判断为倒置并旋转180度"""
+        labels = []
+        for i, crop in enumerate(crops):
+            gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+            dark_columns = np.flatnonzero((gray < 128).any(axis=0))
+            rotated = has_notch(gray, dark_columns[-1] - 4)
+            if rotated:
+                crops[i] = cv2.rotate(crop, cv2.ROTATE_180)
+            labels.append(('180' if rotated else '0', 0.99))
+        return crops, labels, 0.0
+
+    refined, replaced = refine_lines(FakeBarModel(), image, ocr_result, [1], classifier)
+    assert replaced == 1
+    assert refined.texts[1] == "IP PR"
+
+
+def test_engine_refine_changes_extracted_value():
+    engine = OCREngine(EngineOptions(refine_threshold=0.85), ocr_model=FakeBarModel())
+    ocr_result = truncated_result()
+    assert engine.extract(ocr_result).fields['recipe'] == "IP"
+
+    refined = engine.refine(bar_image(), truncated_result())
+    extracted = engine.extract(refined)
+    assert extracted.fields['recipe'] == "IP PR"
+    assert extracted.field_scores['recipe'] == 0.97
+
+
+def test_engine_refine_reuses_extraction_when_nothing_changes():
+    engine = OCREngine(EngineOptions(refine_threshold=0.5), ocr_model=FakeBarModel())
+    refined = engine.refine(bar_image(), truncated_result())
+    # 置信度都不低于阈值，不重新识别，refine中的提取结果直接交给extract
+    assert refined.extraction is not None
+    assert engine.extract(refined) is refined.extraction
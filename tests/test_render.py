@@ -0,0 +1,26 @@
+"""结果图参数的校验和保存"""
+import pytest
+
+from ocr_render import RenderOptions, load_render_options, save_render_options
+
+
+def test_render_options_round_trip(tmp_path):
+    path = tmp_path / "render_settings.json"
+    options = RenderOptions(preview_max_side=0, format='webp', quality=75)
+    save_render_options(options, path)
+    assert load_render_options(path) == options
+
+
+@pytest.mark.parametrize("content", [None, "not json", '["jpg"]', '{"format": "bmp"}', '{"quality": 0}'])
+def test_invalid_render_settings_fall_back_to_defaults(tmp_path, content):
+    path = tmp_path / "render_settings.json"
+    if content is not None:
+        path.write_text(content, encoding='utf-8')
+    assert load_render_options(path) == RenderOptions()
+
+
+def test_render_options_reject_invalid_values():
+    with pytest.raises(ValueError):
+        RenderOptions(preview_max_side=-1)
+    with pytest.raises(ValueError):
+        RenderOptions(quality=101)